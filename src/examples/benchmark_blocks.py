@@ -0,0 +1,299 @@
+#!/usr/bin/env python
+
+#
+# Benchmark of the blocks in ucla.i. Every block is driven with
+# synthetic input from a vector source into null sinks, for a range of
+# input lengths, and the results are written as JSON so they can be
+# compared between versions, e.g.
+#
+#   ./benchmark_blocks.py -o before.json
+#   ./benchmark_blocks.py -b delay_cc,qpsk_modulator_cc -s 64k,1M
+#
+# The time of the same vector source -> null sink graph without the
+# block is measured as well and reported as the baseline, ns_per_item
+# is the time of the block alone. The output items are counted in one
+# more run with vector sinks in place of the null sinks, so the timed
+# runs do not pay for storing them.
+#
+# ucla_interleave is not part of ucla.i and is not benchmarked.
+#
+
+from gnuradio import gr, eng_notation
+from gnuradio import ucla
+from gnuradio.ucla_blks import ieee802_15_4_pkt
+from gnuradio.ucla_blks import cc1k_sos_pkt
+from gnuradio.eng_option import eng_option
+from optparse import OptionParser
+import json, platform, random, struct, sys, time
+
+# chip sequences of the 16 symbols as seen by the packet sink after
+# FM demodulation, the same as UCLA_CHIP_MAPPING in ucla_chip_decoder.cc
+CHIP_MAPPING = (1618456172, 1309113062, 1826650030, 1724778362,
+                778887287, 2061946375, 2007919840, 125494990,
+                529027475, 838370585, 320833617, 422705285,
+                1368596360, 85537272, 139563807, 2021988657)
+
+FRAME_GAP = 256         # noise items between two synthetic frames
+CC1K_SAMPLES_PER_CHIP = 8
+CC1K_FRAME_BYTES = 64   # longest frame the correlator passes on
+
+
+def noise_f(n):
+    return [random.uniform(-1, 1) for i in xrange(n)]
+
+def noise_c(n):
+    return [complex(random.uniform(-1, 1), random.uniform(-1, 1)) for i in xrange(n)]
+
+def chip_pairs_c(n):
+    return [complex(random.choice((-1, 1)), random.choice((-1, 1))) for i in xrange(n)]
+
+def bytes_b(n):
+    return [random.randint(0, 255) for i in xrange(n)]
+
+
+def ieee802_15_4_frames_f(n, payload_len=20):
+    """
+    Chips (+/-1) of back to back 802.15.4 frames with some noise in
+    between, as the packet sink sees them after the demodulator.
+    """
+    data = []
+    seqNr = 0
+    while len(data) < n:
+        payload = ''.join([chr(random.randint(0, 255)) for i in range(payload_len)])
+        pkt = ieee802_15_4_pkt.make_ieee802_15_4_packet(ieee802_15_4_pkt.make_FCF(), seqNr,
+                                                        struct.pack("HHHH", 0xFFFF, 0xFFFF, 0x10, 0x10),
+                                                        payload, False)
+        seqNr = (seqNr + 1) & 0xFF
+        for c in map(ord, pkt):
+            for symbol in (c & 0xF, c >> 4):
+                chips = CHIP_MAPPING[symbol]
+                data.extend([(chips >> (31 - k)) & 1 and 1.0 or -1.0 for k in range(32)])
+        data.extend(noise_f(FRAME_GAP))
+    return data[:n]
+
+def sos_frames_f(n, payload_len=20, samples_per_chip=1):
+    """
+    Manchester coded bits (+/-1) of back to back SOS frames, as the
+    SOS packet sink sees them after the demodulator.
+    """
+    data = []
+    one = (1.0,) * samples_per_chip + (-1.0,) * samples_per_chip
+    zero = (-1.0,) * samples_per_chip + (1.0,) * samples_per_chip
+    while len(data) < n:
+        payload = ''.join([chr(random.randint(0, 255)) for i in range(payload_len)])
+        pkt = cc1k_sos_pkt.make_sos_packet(0, 1, 2, 0xFFFF, 1, 32, payload, 8,
+                                           '\x33\xcc', False)
+        for c in map(ord, pkt):
+            for k in range(8):
+                if (c >> (7 - k)) & 1:
+                    data.extend(one)
+                else:
+                    data.extend(zero)
+        data.extend(noise_f(FRAME_GAP))
+    return data[:n]
+
+def cc1k_frames_f(n):
+    """
+    SOS frames as the correlator sees them, 8 samples per Manchester chip.
+    """
+    return sos_frames_f(n, samples_per_chip=CC1K_SAMPLES_PER_CHIP)
+
+
+class block_spec(object):
+    """
+    How to benchmark one block.
+
+    make() returns the block and the message queue it writes to (or
+    None). Each input is a (vector source, item size, data generator)
+    tuple, each output a (vector sink, item size) tuple.
+    """
+    def __init__(self, name, make, inputs, outputs):
+        self.name = name
+        self.make = make
+        self.inputs = inputs
+        self.outputs = outputs
+
+
+def _sink(make):
+    def make_sink():
+        q = gr.msg_queue()
+        return make(q), q
+    return make_sink
+
+def _block(make):
+    def make_block():
+        return make(), None
+    return make_block
+
+BLOCKS = (
+    block_spec('ieee802_15_4_packet_sink.noise',
+               _sink(lambda q: ucla.ieee802_15_4_packet_sink(q, -1)),
+               [(gr.vector_source_f, gr.sizeof_float, noise_f)], []),
+    block_spec('ieee802_15_4_packet_sink.frames',
+               _sink(lambda q: ucla.ieee802_15_4_packet_sink(q, -1)),
+               [(gr.vector_source_f, gr.sizeof_float, ieee802_15_4_frames_f)], []),
+    block_spec('sos_packet_sink.noise',
+               _sink(lambda q: ucla.sos_packet_sink(map(ord, cc1k_sos_pkt.DEFAULT_ACCESS_CODE), q, -1)),
+               [(gr.vector_source_f, gr.sizeof_float, noise_f)], []),
+    block_spec('sos_packet_sink.frames',
+               _sink(lambda q: ucla.sos_packet_sink(map(ord, cc1k_sos_pkt.DEFAULT_ACCESS_CODE), q, -1)),
+               [(gr.vector_source_f, gr.sizeof_float, sos_frames_f)], []),
+    block_spec('cc1k_correlator_cb.noise',
+               _block(lambda: ucla.cc1k_correlator_cb(CC1K_FRAME_BYTES, 0x33, 0xCC, 1)),
+               [(gr.vector_source_f, gr.sizeof_float, noise_f)],
+               [(gr.vector_sink_f, gr.sizeof_float)]),
+    block_spec('cc1k_correlator_cb.frames',
+               _block(lambda: ucla.cc1k_correlator_cb(CC1K_FRAME_BYTES, 0x33, 0xCC, 1)),
+               [(gr.vector_source_f, gr.sizeof_float, cc1k_frames_f)],
+               [(gr.vector_sink_f, gr.sizeof_float)]),
+    block_spec('qpsk_modulator_cc',
+               _block(lambda: ucla.qpsk_modulator_cc(2)),
+               [(gr.vector_source_c, gr.sizeof_gr_complex, chip_pairs_c)],
+               [(gr.vector_sink_c, gr.sizeof_gr_complex)]),
+    block_spec('oqpsk_modulator_bc',
+               _block(lambda: ucla.oqpsk_modulator_bc(2)),
+               [(gr.vector_source_b, gr.sizeof_char, bytes_b)],
+               [(gr.vector_sink_c, gr.sizeof_gr_complex)]),
+    block_spec('symbols_to_chips_bi',
+               _block(ucla.symbols_to_chips_bi),
+               [(gr.vector_source_b, gr.sizeof_char, bytes_b)],
+               [(gr.vector_sink_i, gr.sizeof_int)]),
+    block_spec('symbols_to_chips_bb',
+               _block(ucla.symbols_to_chips_bb),
+               [(gr.vector_source_b, gr.sizeof_char, bytes_b)],
+               [(gr.vector_sink_b, gr.sizeof_char)]),
+    block_spec('manchester_ff',
+               _block(ucla.manchester_ff),
+               [(gr.vector_source_f, gr.sizeof_float, noise_f)],
+               [(gr.vector_sink_f, gr.sizeof_float)]),
+    block_spec('delay_cc',
+               _block(lambda: ucla.delay_cc(2)),
+               [(gr.vector_source_c, gr.sizeof_gr_complex, noise_c)],
+               [(gr.vector_sink_c, gr.sizeof_gr_complex)]),
+    block_spec('multichanneladd_cc',
+               _block(lambda: ucla.multichanneladd_cc(gr.sizeof_gr_complex)),
+               [(gr.vector_source_c, gr.sizeof_gr_complex, noise_c),
+                (gr.vector_source_c, gr.sizeof_gr_complex, noise_c)],
+               [(gr.vector_sink_c, gr.sizeof_gr_complex)]),
+    )
+
+
+def run_graph(spec, data, with_block, count=False):
+    """
+    Run the graph once. With count the outputs of the block go to
+    vector sinks instead of null sinks.
+
+    @returns: (wall time in seconds, cpu time in seconds, number of frames queued,
+               items at the first output of the block)
+    """
+    tb = gr.top_block()
+    sources = [make_source(d, False) for ((make_source, itemsize, gen), d) in zip(spec.inputs, data)]
+    block, q = None, None
+    sinks = []
+    if with_block:
+        block, q = spec.make()
+        for (i, src) in enumerate(sources):
+            tb.connect(src, (block, i))
+        for (i, (make_sink, itemsize)) in enumerate(spec.outputs):
+            if count:
+                sinks.append(make_sink())
+            else:
+                sinks.append(gr.null_sink(itemsize))
+            tb.connect((block, i), sinks[-1])
+    else:
+        for (src, (make_source, itemsize, gen)) in zip(sources, spec.inputs):
+            tb.connect(src, gr.null_sink(itemsize))
+
+    t0 = time.time()
+    c0 = time.clock()
+    tb.run()
+    cpu = time.clock() - c0
+    wall = time.time() - t0
+
+    frames = 0
+    if q is not None:
+        frames = q.count()
+    nout = 0
+    if count and sinks:
+        nout = len(sinks[0].data())
+    return wall, cpu, frames, nout
+
+def benchmark(spec, nitems, repeat):
+    """
+    Benchmark spec with nitems input items. The best of repeat runs
+    is taken.
+    """
+    data = [gen(nitems) for (make_source, itemsize, gen) in spec.inputs]
+    base = min([run_graph(spec, data, False)[0] for i in range(repeat)])
+    runs = [run_graph(spec, data, True) for i in range(repeat)]
+    wall, cpu, frames, nout = min(runs)
+    if spec.outputs:
+        nout = run_graph(spec, data, True, True)[3]
+    block_time = max(wall - base, 0.0)
+    return {'block': spec.name,
+            'input_items': nitems,
+            'output_items': nout,
+            'seconds': wall,
+            'cpu_seconds': cpu,
+            'baseline_seconds': base,
+            'items_per_sec': block_time and nitems / block_time or None,
+            'ns_per_item': block_time * 1e9 / nitems,
+            'frames': frames}
+
+
+def main():
+    parser = OptionParser (option_class=eng_option)
+    parser.add_option ("-b", "--blocks", type="string", default=None,
+                       help="comma separated names of the blocks to run (default=all)")
+    parser.add_option ("-s", "--sizes", type="string", default="4k,64k,1M",
+                       help="comma separated numbers of input items [default=%default]")
+    parser.add_option ("-r", "--repeat", type="int", default=3,
+                       help="runs per block and size, the fastest is reported [default=%default]")
+    parser.add_option ("-o", "--output", type="string", default=None,
+                       help="write the JSON results to FILE (default=stdout)", metavar="FILE")
+    parser.add_option ("", "--seed", type="int", default=4711)
+    parser.add_option ("-l", "--list", action="store_true", default=False,
+                       help="list the blocks and exit")
+    (options, args) = parser.parse_args ()
+
+    if options.list:
+        for spec in BLOCKS:
+            print spec.name
+        return 0
+
+    specs = BLOCKS
+    if options.blocks:
+        names = options.blocks.split(',')
+        specs = [s for s in BLOCKS if s.name in names or s.name.split('.')[0] in names]
+        if not specs:
+            sys.stderr.write("no such block: %s\n" % options.blocks)
+            return 1
+    sizes = [int(eng_notation.str_to_num(s)) for s in options.sizes.split(',')]
+
+    random.seed(options.seed)
+    results = []
+    for spec in specs:
+        for n in sizes:
+            r = benchmark(spec, n, options.repeat)
+            sys.stderr.write("%-36s %9d items %10.1f ns/item %6d frames\n" %
+                             (spec.name, n, r['ns_per_item'], r['frames']))
+            results.append(r)
+
+    report = {'host': platform.node(),
+              'machine': platform.machine(),
+              'python': platform.python_version(),
+              'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'seed': options.seed,
+              'repeat': options.repeat,
+              'results': results}
+    if options.output:
+        f = open(options.output, 'w')
+        json.dump(report, f, indent=1)
+        f.close()
+    else:
+        json.dump(report, sys.stdout, indent=1)
+        print
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+
+#
+# Loopback benchmark without hardware. Frames go through the modulator,
+# a channel with additive white gaussian noise and the demodulator, all
+# in one process. For every SNR and payload size the packet error rate,
+# the decoded frames per second and the CPU time per frame are reported,
+# e.g.
+#
+#   ./benchmark_loopback.py -m ieee802_15_4 -S 0,3,6,10,20 -s 10,100
+#   ./benchmark_loopback.py -m cc1k -n 200 -o cc1k.json
+#
+# The noise source is seeded, so a run can be repeated exactly. This
+# replaces running cc2420_channel_test.py once per point from a shell
+# script.
+#
+
+from gnuradio import gr
+from gnuradio.ucla_blks import ieee802_15_4_pkt
+from gnuradio.ucla_blks import cc1k_sos_pkt
+from gnuradio.eng_option import eng_option
+from optparse import OptionParser
+import json, os, platform, struct, sys, time
+
+IDLE_TIME = 0.2         # seconds without a new frame after which we stop waiting
+
+
+class receiver(object):
+    """
+    Counts the frames the demodulator hands to the callback. The
+    packet number is at offset in the payload.
+    """
+    def __init__(self, offset=0):
+        self.offset = offset
+        self.nrcvd = 0
+        self.nright = 0
+        self.seen = {}
+        self.last = time.time()
+
+    def frame(self, ok, payload):
+        self.nrcvd += 1
+        self.last = time.time()
+        if ok and len(payload) >= self.offset + 2:
+            (pktno,) = struct.unpack('!H', payload[self.offset:self.offset + 2])
+            if pktno not in self.seen:
+                self.seen[pktno] = 1
+                self.nright += 1
+
+    def wait_idle(self, nexpected):
+        # the watcher thread may still be delivering frames
+        while self.nright < nexpected and time.time() - self.last < IDLE_TIME:
+            time.sleep(IDLE_TIME / 10)
+
+
+class ieee802_15_4_loopback(gr.top_block):
+    """
+    ieee802_15_4_mod_pkts -> AWGN -> ieee802_15_4_demod_pkts
+    """
+    PAYLOAD_OFFSET = 2 + 1 + 8  # FCF, sequence number, addresses
+
+    def __init__(self, rx, snr, seed, spb=2, chip_rate=2000000):
+        gr.top_block.__init__(self)
+
+        self.packet_transmitter = ieee802_15_4_pkt.ieee802_15_4_mod_pkts(spb=spb, msgq_limit=2)
+        add = gr.add_cc()
+        noise = gr.noise_source_c(gr.GR_GAUSSIAN, pow(10.0, -snr / 20.0), seed)
+        self.packet_receiver = ieee802_15_4_pkt.ieee802_15_4_demod_pkts(callback=rx.frame,
+                                                                        sps=spb,
+                                                                        symbol_rate=chip_rate,
+                                                                        threshold=-1)
+
+        self.connect(self.packet_transmitter, (add, 0))
+        self.connect(noise, (add, 1))
+        self.connect(add, self.packet_receiver)
+
+    def send_pkt(self, payload='', eof=False):
+        return self.packet_transmitter.send_pkt(0xe5, struct.pack("HHHH", 0xFFFF, 0xFFFF, 0x10, 0x10),
+                                                payload, eof)
+
+
+class cc1k_loopback(gr.flow_graph):
+    """
+    cc1k_mod_pkts -> AWGN -> cc1k_demod_pkts
+    """
+    PAYLOAD_OFFSET = 0
+
+    def __init__(self, rx, snr, seed, spb=8, data_rate=38400):
+        gr.flow_graph.__init__(self)
+
+        def rx_callback(ok, am_group, src_addr, dst_addr, module_src, module_dst, msg_type, payload, crc):
+            rx.frame(ok, payload)
+
+        self.packet_transmitter = cc1k_sos_pkt.cc1k_mod_pkts(self, spb=spb, msgq_limit=2)
+        add = gr.add_cc()
+        noise = gr.noise_source_c(gr.GR_GAUSSIAN, pow(10.0, -snr / 20.0), seed)
+        self.packet_receiver = cc1k_sos_pkt.cc1k_demod_pkts(self,
+                                                            callback=rx_callback,
+                                                            sps=spb,
+                                                            symbol_rate=data_rate,
+                                                            threshold=-1)
+
+        self.connect(self.packet_transmitter, (add, 0))
+        self.connect(noise, (add, 1))
+        self.connect(add, self.packet_receiver)
+
+    def send_pkt(self, payload='', eof=False):
+        return self.packet_transmitter.send_pkt(am_group=1, module_src=128, module_dst=128,
+                                                dst_addr=65535, src_addr=2, msg_type=32,
+                                                payload=payload, eof=eof)
+
+
+GRAPHS = {'ieee802_15_4': ieee802_15_4_loopback,
+          'cc1k': cc1k_loopback}
+
+
+def cpu_time():
+    t = os.times()
+    return t[0] + t[1]
+
+def run_point(graph_class, snr, payload_size, npkts, seed):
+    """
+    Send npkts frames with payload_size bytes of payload at snr dB.
+    """
+    rx = receiver(graph_class.PAYLOAD_OFFSET)
+    tb = graph_class(rx, snr, seed)
+    filler = ''.join([chr(i & 0xFF) for i in range(payload_size - 2)])
+
+    c0 = cpu_time()
+    t0 = time.time()
+    tb.start()
+    for pktno in range(npkts):
+        tb.send_pkt(struct.pack('!H', pktno & 0xFFFF) + filler)
+    tb.send_pkt(eof=True)
+    tb.wait()
+    rx.wait_idle(npkts)
+    wall = time.time() - t0
+    cpu = cpu_time() - c0
+
+    return {'snr': snr,
+            'payload_size': payload_size,
+            'sent': npkts,
+            'received': rx.nrcvd,
+            'right': rx.nright,
+            'per': 1.0 - float(rx.nright) / npkts,
+            'seconds': wall,
+            'frames_per_sec': rx.nright / wall,
+            'cpu_per_frame': cpu / npkts}
+
+
+def main():
+    parser = OptionParser (option_class=eng_option)
+    parser.add_option ("-m", "--modulation", type="choice", choices=GRAPHS.keys(),
+                       default="ieee802_15_4",
+                       help="one of %s [default=%%default]" % (", ".join(GRAPHS.keys()),))
+    parser.add_option ("-S", "--snr", type="string", default="0,2,4,6,8,10,20",
+                       help="comma separated SNRs in dB [default=%default]")
+    parser.add_option ("-s", "--sizes", type="string", default="10,50,100",
+                       help="comma separated payload sizes in bytes [default=%default]")
+    parser.add_option ("-n", "--nrpackets", type="int", default=500,
+                       help="frames per point [default=%default]")
+    parser.add_option ("", "--seed", type="int", default=3021,
+                       help="seed of the noise source [default=%default]")
+    parser.add_option ("-o", "--output", type="string", default=None,
+                       help="also write the results as JSON to FILE", metavar="FILE")
+    (options, args) = parser.parse_args ()
+
+    snrs = [float(s) for s in options.snr.split(',')]
+    sizes = [int(s) for s in options.sizes.split(',')]
+    if min(sizes) < 2:
+        parser.error("payload sizes must be >= 2, the packet number takes two bytes")
+
+    graph_class = GRAPHS[options.modulation]
+    print "%8s %8s %8s %8s %10s %12s" % ("SNR", "size", "right", "PER", "frames/s", "cpu/frame")
+    results = []
+    for size in sizes:
+        for snr in snrs:
+            r = run_point(graph_class, snr, size, options.nrpackets, options.seed)
+            print "%8.1f %8d %8d %8.4f %10.1f %10.1fus" % (snr, size, r['right'], r['per'],
+                                                        r['frames_per_sec'], r['cpu_per_frame'] * 1e6)
+            sys.stdout.flush()
+            results.append(r)
+
+    if options.output:
+        report = {'modulation': options.modulation,
+                  'host': platform.node(),
+                  'machine': platform.machine(),
+                  'python': platform.python_version(),
+                  'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                  'seed': options.seed,
+                  'results': results}
+        f = open(options.output, 'w')
+        json.dump(report, f, indent=1)
+        f.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,16 @@
+#!/usr/bin/env python
+
+#
+# Decode a recorded complex capture as fast as the CPU allows and write
+# the frames as tab separated lines. Use this instead of the live
+# receivers for regression and throughput tests, e.g.
+#
+#   ./capture_decode.py -m ieee802_15_4 -s 4M -o frames.tsv capture.dat
+#   ./capture_decode.py -m cc1k -s 307.2k capture.dat
+#
+
+from gnuradio.ucla_blks import capture_decoder
+import sys
+
+if __name__ == '__main__':
+    sys.exit(capture_decoder.main())
@@ -110,12 +110,9 @@ class fsk_rx_graph (gr.flow_graph):
         print "fs = ", eng_notation.num_to_str(self.fs)
 
 
-        if options.cordic_freq1 < options.cordic_freq2:
-            self.usrp_freq = options.cordic_freq1
-            self.freq_diff = options.cordic_freq1 - options.cordic_freq2
-        else:
-            self.usrp_freq = options.cordic_freq2
-            self.freq_diff = options.cordic_freq2 - options.cordic_freq1
+        # center the band between the two channels, the filterbank picks
+        # the closest bin for each of them
+        self.usrp_freq = (options.cordic_freq1 + options.cordic_freq2) / 2
 
         print "tune USRP to = ", self.usrp_freq
         u = usrp.source_c (0, self.usrp_decim)
@@ -131,47 +128,23 @@ class fsk_rx_graph (gr.flow_graph):
         u.set_pga(0, options.gain)
         u.set_pga(1, options.gain)
 
-        # Create filter to get actual channels we want
-        chan_coeffs = gr.firdes.low_pass (1.0,                # gain
-                                          4e6,                # sampling rate
-                                          150e3,              # low pass cutoff freq
-                                          50e3,                # width of trans. band
-                                          gr.firdes.WIN_HANN) # filter type 
-
-        print "len(rx_chan_coeffs) =", len(chan_coeffs)
-
-        # Decimating Channel filter with frequency translation
-        # complex in and out, float taps
-        self.ddc1 = gr.freq_xlating_fir_filter_ccf(13,       # decimation rate
-                                                   chan_coeffs,    # taps
-                                                   0,              # frequency translation amount
-                                                   4e6)   # input sample rate
-
-        self.ddc2 = gr.freq_xlating_fir_filter_ccf(13,       # decimation rate
-                                                   chan_coeffs,    # taps
-                                                   self.freq_diff,              # frequency translation amount
-                                                   4e6)   # input sample rate
-
-
-        # receiver
-        gain_mu = 0.002*self.samples_per_symbol
-        self.packet_receiver1 = cc1k_sos_pkt.cc1k_demod_pkts(self,
-                                                        callback=self.rx_callback1,
-                                                        sps=self.samples_per_symbol,
-                                                        symbol_rate=self.data_rate,
-                                                        p_size=payload_size,
-                                                        threshold=-1)
-        self.packet_receiver2 = cc1k_sos_pkt.cc1k_demod_pkts(self,
-                                                        callback=self.rx_callback2,
+        # receiver, one polyphase filterbank for all channels
+        self.freq1 = options.cordic_freq1
+        self.freq2 = options.cordic_freq2
+        self.packet_receiver = cc1k_sos_pkt.cc1k_multichannel_demod_pkts(self,
+                                                        4e6,
+                                                        self.usrp_freq,
+                                                        [self.freq1, self.freq2],
+                                                        callback=self.rx_callback,
                                                         sps=self.samples_per_symbol,
                                                         symbol_rate=self.data_rate,
                                                         p_size=payload_size,
                                                         threshold=-1)
-
+        print "bins = %d, samples_per_symbol = %f" % (self.packet_receiver.mpoints,
+                                                      self.packet_receiver.sps)
 
         u = gr.file_source(gr.sizeof_gr_complex, 'tx_test.dat')
-        self.connect(u, self.ddc1, self.packet_receiver1)
-        self.connect(u, self.ddc2, self.packet_receiver2)
+        self.connect(u, self.packet_receiver)
         
             
         self.filesink = gr.file_sink(gr.sizeof_gr_complex, 'rx_test.dat')
@@ -185,6 +158,12 @@ class fsk_rx_graph (gr.flow_graph):
         #send a packet...
 
 
+    def rx_callback(self, freq, ok, *pkt):
+        if freq == self.freq1:
+            self.rx_callback1(ok, *pkt)
+        else:
+            self.rx_callback2(ok, *pkt)
+
     def rx_callback1(self, ok, am_group, src_addr, dst_addr, module_src, module_dst, msg_type, msg_payload, crc):
         self.st1.npkts += 1
         if ok:
@@ -138,7 +138,8 @@ class fsk_rx_graph (gr.flow_graph):
                                                         sps=self.samples_per_symbol,
                                                         symbol_rate=self.data_rate,
                                                         p_size=payload_size,
-                                                        threshold=-1)
+                                                        threshold=-1,
+                                                        link_quality=True)
 
         self.connect(u, self.packet_receiver)
             
@@ -153,7 +154,8 @@ class fsk_rx_graph (gr.flow_graph):
         #send a packet...
 
 
-    def rx_callback(self, ok, am_group, src_addr, dst_addr, module_src, module_dst, msg_type, msg_payload, crc):
+    def rx_callback(self, ok, am_group, src_addr, dst_addr, module_src, module_dst, msg_type, msg_payload, crc,
+                    manchester_errors):
         self.st.npkts += 1
         if ok:
             self.st.nright += 1
@@ -165,6 +167,7 @@ class fsk_rx_graph (gr.flow_graph):
         print "  msg type: " + str(msg_type)
         print "  msg: " + str(map(hex, map(ord, msg_payload)))
         print "  crc: " + str(crc)
+        print "  manchester errors: " + str(manchester_errors)
         print " ------------------------"
 
 
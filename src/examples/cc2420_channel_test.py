@@ -34,13 +34,13 @@ class my_graph (gr.flow_graph):
         gr.flow_graph.__init__(self)
 
         self.samples_per_symbol = 2
-	self.data_rate = 2000000
+        self.data_rate = 2000000
         payload_size = 128             # bytes
 
-	self.packet_transmitter = ieee802_15_4_pkt.ieee802_15_4_mod_pkts(self, spb=self.samples_per_symbol, msgq_limit=2)
+        self.packet_transmitter = ieee802_15_4_pkt.ieee802_15_4_mod_pkts(self, spb=self.samples_per_symbol, msgq_limit=2)
 
         # add some noise
-	print " Setting SNR to ", SNR
+        print " Setting SNR to ", SNR
         add = gr.add_cc()
         noise = gr.noise_source_c(gr.GR_GAUSSIAN, pow(10.0,-SNR/20.0))
 
@@ -74,9 +74,9 @@ def main ():
             #print "ok = %5r  pktno = %4d  len(payload) = %4d  %d/%d" % (ok, pktno, len(payload),
             #                                                            st.nright, st.npkts)
             #print "  payload: " + str(map(hex, map(ord, payload)))
-	else:
-	    #print "  Bad packet. %d/%d"%(st.nright, st.npkts)
-	    pass
+        else:
+            #print "  Bad packet. %d/%d"%(st.nright, st.npkts)
+            pass
 
     parser = OptionParser (option_class=eng_option)
     parser.add_option("-N", "--snr", type="eng_float", default=20,
@@ -92,9 +92,7 @@ def main ():
     fg.start()
 
     for i in range(options.nrpackets):
-	#print "======================="
-	while fg.packet_transmitter.pkt_input.msgq().count() >= 1:
-	    time.sleep(0.01)
+        # blocks while the message queue of the transmitter is full
         fg.send_pkt(payload=struct.pack('9B', 0x1, 0x80, 0x80, 0xff, 0xff, 0x10, 0x0, 0x20, 0x0))
 
     #fg.wait()
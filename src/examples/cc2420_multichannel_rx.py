@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+
+#
+# Decoder of IEEE 802.15.4 RADIO Packets on several channels at once.
+#
+# The input is a wideband complex baseband recording, for example made
+# with usrp_rx_cfile.py, or a synthesized file. Its sample rate has to
+# be a multiple of the 5 MHz channel spacing, and the channels must lie
+# on the 5 MHz grid around the center frequency.
+#
+#   ./cc2420_multichannel_rx.py -F capture.dat -s 20M -c 2.43G -C 15,16,17
+#
+# Without -c the file is taken to be centered on the middle channel.
+#
+
+from gnuradio import gr, eng_notation
+from gnuradio.ucla_blks import ieee802_15_4_pkt
+from gnuradio.eng_option import eng_option
+from optparse import OptionParser
+import os, sys, time
+
+
+class multichannel_rx_graph (gr.top_block):
+    def __init__(self, options, rx_callback):
+        gr.top_block.__init__(self)
+
+        print "sample_rate = ", eng_notation.num_to_str(options.sample_rate)
+        print "center_freq = ", eng_notation.num_to_str(options.center_freq)
+        print "channels = ", options.channels
+
+        self.src = gr.file_source(gr.sizeof_gr_complex, options.filename)
+        self.receiver = ieee802_15_4_pkt.ieee802_15_4_multichannel_demod_pkts(
+            options.sample_rate, options.center_freq, options.channels,
+            callback=rx_callback, threshold=options.threshold)
+        print "samples_per_symbol = ", self.receiver.sps
+
+        self.connect(self.src, self.receiver)
+
+
+def main ():
+
+    def rx_callback(channel, ok, payload):
+        if options.verbose:
+            print "channel = %2d  ok = %5r  len(payload) = %4d" % (channel, ok, len(payload))
+            print "  payload: " + str(map(hex, map(ord, payload)))
+            sys.stdout.flush()
+
+    def channel_list(s):
+        return [int(c) for c in s.split(',')]
+
+    parser = OptionParser (option_class=eng_option)
+    parser.add_option ("-F", "--filename", type="string", default=None,
+                       help="read complex samples from FILENAME")
+    parser.add_option ("-s", "--sample-rate", type="eng_float", default=20e6,
+                       help="sample rate of the file, a multiple of 5 MHz")
+    parser.add_option ("-c", "--center-freq", type="eng_float", default=None,
+                       help="frequency the file is centered at (default=middle channel)",
+                       metavar="FREQ")
+    parser.add_option ("-C", "--channels", type="string", default="15,16,17",
+                       help="comma separated list of 802.15.4 channels")
+    parser.add_option ("-t", "--threshold", type="int", default=-1)
+    parser.add_option ("-v", "--verbose", action="store_true", default=False)
+
+    (options, args) = parser.parse_args ()
+    if options.filename is None:
+        parser.error("a file to read from is required")
+    options.channels = channel_list(options.channels)
+    if options.center_freq is None:
+        options.center_freq = ieee802_15_4_pkt.center_frequency(options.channels)
+
+    tb = multichannel_rx_graph(options, rx_callback)
+    nsamples = os.path.getsize(options.filename) / gr.sizeof_gr_complex
+
+    start = time.time()
+    tb.receiver.reset_stats()
+    tb.run()
+    elapsed = time.time() - start
+
+    print "%d samples in %.2f s, %s samples/s" % (nsamples, elapsed,
+                                                 eng_notation.num_to_str(nsamples / elapsed))
+    for (channel, npkts, nright, fps) in tb.receiver.throughput():
+        print "channel %2d: %5d frames  %5d ok  %8.1f frames/s" % (channel, npkts, nright, fps)
+
+if __name__ == '__main__':
+    main ()
@@ -0,0 +1,125 @@
+/*
+Copyright (c) 2006 The Regents of the University of California.
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions
+are met:
+1. Redistributions of source code must retain the above copyright
+   notice, this list of conditions and the following disclaimer.
+2. Redistributions in binary form must reproduce the above
+   copyright notice, this list of conditions and the following
+   disclaimer in the documentation and/or other materials provided
+   with the distribution.
+3. Neither the name of the University nor that of the Laboratory
+   may be used to endorse or promote products derived from this
+   software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE REGENTS AND CONTRIBUTORS ``AS IS''
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A
+PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE REGENTS
+OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF
+USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT
+OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+SUCH DAMAGE.
+*/
+
+/*
+ * Microbenchmark for the 802.15.4 chip decoder. Compares the split
+ * table maximum likelihood decoder against the linear first fit scan
+ * the packet sink used before.
+ *
+ *   ./benchmark_decode_chips [number of words]
+ */
+
+#ifdef HAVE_CONFIG_H
+#include "config.h"
+#endif
+
+#include <ucla_chip_decoder.h>
+#include <gr_count_bits.h>
+#include <cstdio>
+#include <cstdlib>
+#include <sys/time.h>
+
+static const unsigned int THRESHOLD = 10;	// default of the packet sink
+
+static double
+now()
+{
+  struct timeval tv;
+  gettimeofday(&tv, 0);
+  return tv.tv_sec + tv.tv_usec * 1e-6;
+}
+
+static unsigned int
+random32()
+{
+  return ((unsigned int) (random() & 0xFFFF) << 16) | (random() & 0xFFFF);
+}
+
+int
+main(int argc, char **argv)
+{
+  int n = argc > 1 ? atoi(argv[1]) : 1 << 22;
+  unsigned int *words = new unsigned int[n];
+  unsigned char *symbols = new unsigned char[n];
+
+  // chip sequences with 0 to 15 wrong chips
+  srandom(4711);
+  for (int i = 0; i < n; i++){
+    unsigned int w = UCLA_CHIP_MAPPING[i & 0xF];
+    int errors = (i >> 4) & 0xF;
+    for (int e = 0; e < errors; e++)
+      w ^= 1 << (random() % 32);
+    words[i] = w;
+    symbols[i] = i & 0xF;
+  }
+
+  // first fit linear scan
+  unsigned int sum_first = 0;
+  double t0 = now();
+  for (int i = 0; i < n; i++)
+    sum_first += ucla_decode_chips_first_fit(words[i], THRESHOLD);
+  double t_first = now() - t0;
+
+  // maximum likelihood split table
+  unsigned int sum_ml = 0;
+  t0 = now();
+  for (int i = 0; i < n; i++){
+    unsigned int distance;
+    unsigned char c = ucla_decode_chips(words[i], &distance);
+    sum_ml += distance <= THRESHOLD ? c : 0xFF;
+  }
+  double t_ml = now() - t0;
+
+  // decoding quality
+  int right_first = 0, right_ml = 0, differ = 0;
+  for (int i = 0; i < n; i++){
+    unsigned int distance;
+    unsigned char c_first = ucla_decode_chips_first_fit(words[i], THRESHOLD);
+    unsigned char c_ml = ucla_decode_chips(words[i], &distance);
+    if (distance > THRESHOLD)
+      c_ml = 0xFF;
+    right_first += c_first == symbols[i];
+    right_ml += c_ml == symbols[i];
+    differ += c_first != c_ml;
+  }
+
+  printf("words:              %d\n", n);
+  printf("first fit:          %8.2f ns/word  %6.2f%% correct\n",
+	 t_first * 1e9 / n, 100.0 * right_first / n);
+  printf("maximum likelihood: %8.2f ns/word  %6.2f%% correct\n",
+	 t_ml * 1e9 / n, 100.0 * right_ml / n);
+  printf("speedup:            %8.2f\n", t_first / t_ml);
+  printf("different decisions: %d (checksum %u %u)\n", differ, sum_first, sum_ml);
+
+  delete [] words;
+  delete [] symbols;
+  return 0;
+}
@@ -0,0 +1,121 @@
+/*
+Copyright (c) 2006 The Regents of the University of California.
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions
+are met:
+1. Redistributions of source code must retain the above copyright
+   notice, this list of conditions and the following disclaimer.
+2. Redistributions in binary form must reproduce the above
+   copyright notice, this list of conditions and the following
+   disclaimer in the documentation and/or other materials provided
+   with the distribution.
+3. Neither the name of the University nor that of the Laboratory
+   may be used to endorse or promote products derived from this
+   software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE REGENTS AND CONTRIBUTORS ``AS IS''
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A
+PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE REGENTS
+OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF
+USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT
+OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+SUCH DAMAGE.
+*/
+
+/*
+ * Microbenchmark for the first stage of the O-QPSK modulator. Runs
+ * symbols_to_chips_bi followed by the unpacking that
+ * packed_to_unpacked_ii(2, GR_MSB_FIRST) does, and symbols_to_chips_bb
+ * which produces the same chip pairs in one step, over the same random
+ * bytes.
+ *
+ *   ./benchmark_symbols_to_chips [number of bytes] [rounds]
+ */
+
+#ifdef HAVE_CONFIG_H
+#include "config.h"
+#endif
+
+#include <ucla_symbols_to_chips_bi.h>
+#include <ucla_symbols_to_chips_bb.h>
+#include <gr_io_signature.h>
+#include <vector>
+#include <cstdio>
+#include <cstdlib>
+#include <cstring>
+#include <sys/time.h>
+
+static double
+now()
+{
+  struct timeval tv;
+  gettimeofday(&tv, 0);
+  return tv.tv_sec + tv.tv_usec * 1e-6;
+}
+
+// the unpacking of packed_to_unpacked_ii(2, GR_MSB_FIRST)
+static void
+unpack_chip_pairs(const unsigned int *in, int n, int *out)
+{
+  for (int i = 0; i < n; i++)
+    for (int k = 0; k < 16; k++)
+      *out++ = (in[i] >> (30 - 2*k)) & 0x3;
+}
+
+int
+main(int argc, char **argv)
+{
+  int n = argc > 1 ? atoi(argv[1]) : 1 << 16;
+  int rounds = argc > 2 ? atoi(argv[2]) : 100;
+
+  std::vector<unsigned char> bytes(n);
+  std::vector<unsigned int> words(2 * n);
+  std::vector<int> pairs_old(32 * n);
+  std::vector<unsigned char> pairs_new(32 * n);
+
+  srandom(4711);
+  for (int i = 0; i < n; i++)
+    bytes[i] = random() & 0xFF;
+
+  ucla_symbols_to_chips_bi_sptr bi = ucla_make_symbols_to_chips_bi();
+  ucla_symbols_to_chips_bb_sptr bb = ucla_make_symbols_to_chips_bb();
+  gr_vector_const_void_star in(1);
+  gr_vector_void_star out(1);
+
+  double t0 = now();
+  for (int r = 0; r < rounds; r++){
+    in[0] = &bytes[0];
+    out[0] = &words[0];
+    bi->work(2 * n, in, out);
+    unpack_chip_pairs(&words[0], 2 * n, &pairs_old[0]);
+  }
+  double t_old = now() - t0;
+
+  t0 = now();
+  for (int r = 0; r < rounds; r++){
+    in[0] = &bytes[0];
+    out[0] = &pairs_new[0];
+    bb->work(32 * n, in, out);
+  }
+  double t_new = now() - t0;
+
+  int errors = 0;
+  for (int i = 0; i < 32 * n; i++)
+    errors += pairs_old[i] != pairs_new[i];
+
+  double total = (double) n * rounds;
+  printf("bytes:               %d x %d\n", n, rounds);
+  printf("bi + unpack:         %8.2f Mbytes/s\n", total / t_old * 1e-6);
+  printf("bb:                  %8.2f Mbytes/s\n", total / t_new * 1e-6);
+  printf("speedup:             %8.2f\n", t_old / t_new);
+  printf("mismatches:          %d\n", errors);
+
+  return errors != 0;
+}
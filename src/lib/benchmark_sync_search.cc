@@ -0,0 +1,268 @@
+/*
+Copyright (c) 2006 The Regents of the University of California.
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions
+are met:
+1. Redistributions of source code must retain the above copyright
+   notice, this list of conditions and the following disclaimer.
+2. Redistributions in binary form must reproduce the above
+   copyright notice, this list of conditions and the following
+   disclaimer in the documentation and/or other materials provided
+   with the distribution.
+3. Neither the name of the University nor that of the Laboratory
+   may be used to endorse or promote products derived from this
+   software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE REGENTS AND CONTRIBUTORS ``AS IS''
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A
+PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE REGENTS
+OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF
+USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT
+OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+SUCH DAMAGE.
+
+/*
+ * Microbenchmark for the sync searches of the packet sinks and the CC1K
+ * correlator, on the noise they see most of the time while the channel
+ * is idle. Each search runs as the per sample slice/shift/popcount loop
+ * the blocks used before and as the bulk search they use now, and both
+ * have to find the same syncs.
+ *
+ * The 802.15.4 search is all of STATE_SYNC_SEARCH: the first 0 symbol
+ * of the preamble, then the next 0 symbols and the SFD every 32 chips.
+ * Noise is within the threshold of a 0 symbol every few dozen chips,
+ * so the 32 chips after such a false start count as much as the search
+ * for it. Every 16k samples a preamble with SFD is mixed in.
+ *
+ *   ./benchmark_sync_search [number of samples] [SOS threshold] [802.15.4 threshold]
+ */
+
+#ifdef HAVE_CONFIG_H
+#include "config.h"
+#endif
+
+#include <ucla_sync_search.h>
+#include <ucla_chip_decoder.h>
+#include <gr_count_bits.h>
+#include <algorithm>
+#include <vector>
+#include <cstdio>
+#include <cstdlib>
+#include <sys/time.h>
+
+static const unsigned long long SOS_SYNC = 0x999999995a5aa5a5ULL;
+static unsigned int SOS_THRESHOLD = 3;	// 'close' sync words show up in noise
+static unsigned int IEEE802_15_4_THRESHOLD = 10;	// default of the packet sink
+static const int RUNS = 5;
+
+static double
+now()
+{
+  struct timeval tv;
+  gettimeofday(&tv, 0);
+  return tv.tv_sec + tv.tv_usec * 1e-6;
+}
+
+/*
+ * SOS sync word, 64 bits without mask. Both add the position after
+ * each hit to syncs.
+ */
+static void
+sos_per_sample(const float *in, int n, std::vector<int> &syncs)
+{
+  unsigned long long reg = 0;
+
+  for (int i = 0; i < n; i++){
+    reg = (reg << 1) | (in[i] > 0 ? 1 : 0);
+    if (gr_count_bits64(reg ^ SOS_SYNC) <= SOS_THRESHOLD)
+      syncs.push_back(i + 1);
+  }
+}
+
+static void
+sos_bulk(const float *in, int n, std::vector<int> &syncs)
+{
+  ucla_sync_pattern64 pattern;
+  unsigned long long reg = 0;
+  int count = 0;
+
+  ucla_sync_pattern64_init(&pattern, SOS_SYNC);
+  while (count < n){
+    int nbits = std::min(32, n - count);
+    unsigned int bits = ucla_slice32(&in[count], nbits);
+    int hit = ucla_sync_search64(&reg, bits, nbits, &pattern, SOS_THRESHOLD + 1);
+    if (hit >= 0){
+      count += hit + 1;
+      syncs.push_back(count);
+    }
+    else
+      count += nbits;
+  }
+}
+
+/*
+ * STATE_SYNC_SEARCH of the 802.15.4 packet sink. A found SFD starts
+ * the search over, the sink would decode the frame instead.
+ */
+struct ieee802_15_4_search {
+  unsigned int shift_reg;
+  int preamble_cnt;
+  int chip_cnt;
+  int packet_byte;
+
+  ieee802_15_4_search() { enter_search(); }
+
+  void enter_search() { shift_reg = 0; preamble_cnt = 0; chip_cnt = 0; packet_byte = 0; }
+
+  bool close(unsigned int symbol) const {
+    return gr_count_bits32((shift_reg & 0x7FFFFFFE) ^ (UCLA_CHIP_MAPPING[symbol] & 0xFFFFFFFE))
+      <= IEEE802_15_4_THRESHOLD;
+  }
+
+  // 32 chips after the last symbol of the preamble or SFD
+  void check_symbol(int count, std::vector<int> &syncs) {
+    chip_cnt = 0;
+    if (packet_byte == 0){
+      if (close(0))
+	preamble_cnt++;
+      else if (close(7))
+	packet_byte = 7 << 4;
+      else
+	enter_search();
+    }
+    else {
+      if (close(10))
+	syncs.push_back(count);
+      enter_search();
+    }
+  }
+};
+
+// in memory like the members of the packet sink, not in registers
+static ieee802_15_4_search search_state;
+
+static void
+ieee802_15_4_per_sample(const float *in, int n, std::vector<int> &syncs)
+{
+  ieee802_15_4_search &s = search_state;
+  int count = 0;
+
+  s.enter_search();
+
+  while (count < n){
+    s.shift_reg = (s.shift_reg << 1) | (in[count++] > 0 ? 1 : 0);
+    if (s.preamble_cnt > 0)
+      s.chip_cnt++;
+
+    if (s.preamble_cnt == 0){
+      if (gr_count_bits32((s.shift_reg & 0x7FFFFFFE) ^ (UCLA_CHIP_MAPPING[0] & 0x7FFFFFFE))
+	  < IEEE802_15_4_THRESHOLD)
+	s.preamble_cnt++;
+    }
+    else if (s.chip_cnt == 32)
+      s.check_symbol(count, syncs);
+  }
+}
+
+static void
+ieee802_15_4_bulk(const float *in, int n, std::vector<int> &syncs)
+{
+  ieee802_15_4_search &s = search_state;
+  ucla_sync_pattern32 zero;
+  int count = 0;
+
+  s.enter_search();
+  ucla_sync_pattern32_init(&zero, UCLA_CHIP_MAPPING[0], UCLA_CHIP_MASK);
+  while (count < n){
+    if (s.preamble_cnt == 0){
+      int nchips = std::min(32, n - count);
+      int hit = ucla_sync_search32(&s.shift_reg, ucla_slice32(&in[count], nchips), nchips,
+				   &zero, IEEE802_15_4_THRESHOLD);
+      if (hit < 0)
+	count += nchips;
+      else {
+	count += hit + 1;
+	s.preamble_cnt++;
+      }
+      continue;
+    }
+
+    int nchips = std::min(32 - s.chip_cnt, n - count);
+    s.shift_reg = (unsigned int) (((unsigned long long) s.shift_reg << nchips)
+				  | ucla_slice32(&in[count], nchips));
+    count += nchips;
+    s.chip_cnt += nchips;
+    if (s.chip_cnt == 32)
+      s.check_symbol(count, syncs);
+  }
+}
+
+typedef void (*search_fn)(const float *, int, std::vector<int> &);
+
+// best of RUNS
+static double
+run(search_fn search, const float *in, int n, std::vector<int> &syncs)
+{
+  double best = 0;
+
+  for (int r = 0; r < RUNS; r++){
+    syncs.clear();
+    double t0 = now();
+    search(in, n, syncs);
+    double t = now() - t0;
+    if (r == 0 || t < best)
+      best = t;
+  }
+  return best;
+}
+
+static bool
+compare(const char *name, search_fn per_sample, search_fn bulk, const float *in, int n)
+{
+  std::vector<int> syncs_old, syncs_bulk;
+
+  double t_old = run(per_sample, in, n, syncs_old);
+  double t_bulk = run(bulk, in, n, syncs_bulk);
+
+  printf("%s\n", name);
+  printf("  per sample:  %8.2f Msamples/s  %d syncs\n", n / t_old * 1e-6, (int) syncs_old.size());
+  printf("  bulk:        %8.2f Msamples/s  %d syncs\n", n / t_bulk * 1e-6, (int) syncs_bulk.size());
+  printf("  speedup:     %8.2f\n", t_old / t_bulk);
+  return syncs_old == syncs_bulk;
+}
+
+int
+main(int argc, char **argv)
+{
+  int n = argc > 1 ? atoi(argv[1]) : 1 << 24;
+  if (argc > 2)
+    SOS_THRESHOLD = atoi(argv[2]);
+  if (argc > 3)
+    IEEE802_15_4_THRESHOLD = atoi(argv[3]);
+  float *samples = new float[n];
+
+  srandom(4711);
+  for (int i = 0; i < n; i++)
+    samples[i] = (float) random() / RAND_MAX - 0.5;
+
+  printf("samples:     %d\n", n);
+  bool same = compare("SOS", sos_per_sample, sos_bulk, samples, n);
+
+  // 8 0 symbols and the SFD, 0xA7
+  static const int SHR[10] = { 0, 0, 0, 0, 0, 0, 0, 0, 7, 10 };
+  for (int i = 0; i + 10 * 32 <= n; i += 1 << 14)
+    for (int s = 0; s < 10; s++)
+      for (int k = 0; k < 32; k++)
+	samples[i + 32 * s + k] = (UCLA_CHIP_MAPPING[SHR[s]] >> (31 - k)) & 1 ? 1.0 : -1.0;
+  same = compare("802.15.4", ieee802_15_4_per_sample, ieee802_15_4_bulk, samples, n) && same;
+
+  delete [] samples;
+  return !same;
+}
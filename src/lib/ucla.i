@@ -11,12 +11,16 @@
 #include "ucla_sos_packet_sink.h"
 #include "ucla_ieee802_15_4_packet_sink.h"
 #include "ucla_qpsk_modulator_cc.h"
+#include "ucla_oqpsk_modulator_bc.h"
 #include "ucla_delay_cc.h"
   //#include "ucla_interleave.h"
 #include "ucla_multichanneladd_cc.h"
 #include "ucla_symbols_to_chips_bi.h"
+#include "ucla_symbols_to_chips_bb.h"
 #include "ucla_manchester_ff.h"
+#include "ucla_mmap_source_c.h"
 #include <stdexcept>
+#include <cstring>
 %}
 
 // ----------------------------------------------------------------
@@ -33,12 +37,17 @@ GR_SWIG_BLOCK_MAGIC(ucla,cc1k_correlator_cb);
 ucla_cc1k_correlator_cb_sptr ucla_make_cc1k_correlator_cb (int payload_bytesize,
 						  unsigned char sync_byte, 
 						  unsigned char nsync_byte,
-						  unsigned char manchester);
+						  unsigned char manchester)
+  throw (std::invalid_argument);
 
 class ucla_cc1k_correlator_cb : public gr_block
 {
 private:
   ucla_cc1k_correlator_cb ();
+public:
+  long nframes () const;
+  long nsync_timeouts () const;
+  long nlength_errors () const;
 };
 
 // ----------------------------------------------------------------
@@ -47,35 +56,63 @@ GR_SWIG_BLOCK_MAGIC(ucla,sos_packet_sink);
 
 ucla_sos_packet_sink_sptr ucla_make_sos_packet_sink (const std::vector<unsigned char>& sync_vector,
 						     gr_msg_queue_sptr target_queue, 
-						     int threshold);
+						     int threshold = -1,
+						     bool drop_bad_frames = false);
 
 class ucla_sos_packet_sink : public gr_sync_block
 {
 private:
   ucla_cc1k_packet_sink ();
+
+public:
+  unsigned long long processed () const;
 };
 
 
 GR_SWIG_BLOCK_MAGIC(ucla,ieee802_15_4_packet_sink);
 
 ucla_ieee802_15_4_packet_sink_sptr ucla_make_ieee802_15_4_packet_sink (gr_msg_queue_sptr target_queue, 
-							   int threshold);
+							   int threshold=-1,
+							   bool drop_bad_frames=false,
+							   bool soft_decision=false);
 
 class ucla_ieee802_15_4_packet_sink : public gr_sync_block
 {
 private:
   ucla_ieee802_15_4_packet_sink ();
+
+public:
+  unsigned long long processed () const;
 };
 
 
 GR_SWIG_BLOCK_MAGIC(ucla,qpsk_modulator_cc);
 
-ucla_qpsk_modulator_cc_sptr ucla_make_qpsk_modulator_cc ();
+ucla_qpsk_modulator_cc_sptr ucla_make_qpsk_modulator_cc (int spb = 2)
+  throw (std::invalid_argument);
 
 class ucla_qpsk_modulator_cc : public gr_sync_interpolator
 {
 private:
   ucla_qpsk_modulator_cc ();
+
+public:
+  int spb () const;
+};
+
+GR_SWIG_BLOCK_MAGIC(ucla,oqpsk_modulator_bc);
+
+ucla_oqpsk_modulator_bc_sptr ucla_make_oqpsk_modulator_bc (int spb = 2)
+  throw (std::invalid_argument);
+
+class ucla_oqpsk_modulator_bc : public gr_sync_interpolator
+{
+private:
+  ucla_oqpsk_modulator_bc ();
+
+public:
+  int spb () const;
+  std::string modulate (const std::string &data);
 };
 
 GR_SWIG_BLOCK_MAGIC(ucla,symbols_to_chips_bi);
@@ -88,6 +125,16 @@ private:
   ucla_symbols_to_chips_bi ();
 };
 
+GR_SWIG_BLOCK_MAGIC(ucla,symbols_to_chips_bb);
+
+ucla_symbols_to_chips_bb_sptr ucla_make_symbols_to_chips_bb ();
+
+class ucla_symbols_to_chips_bb : public gr_sync_interpolator
+{
+private:
+  ucla_symbols_to_chips_bb ();
+};
+
 
 GR_SWIG_BLOCK_MAGIC(ucla,manchester_ff);
 
@@ -130,3 +177,49 @@ class ucla_multichanneladd_cc : public gr_block
 private:
   ucla_multichanneladd_cc ();
 };
+
+GR_SWIG_BLOCK_MAGIC(ucla,mmap_source_c);
+
+ucla_mmap_source_c_sptr ucla_make_mmap_source_c (const char *filename,
+						 long long offset = 0,
+						 long long nitems = 0)
+  throw (std::runtime_error);
+
+class ucla_mmap_source_c : public gr_sync_block
+{
+private:
+  ucla_mmap_source_c ();
+
+public:
+  long long nitems () const;
+  long long position () const;
+};
+
+// ----------------------------------------------------------------
+
+/*
+ * Copy the payload of a message into a writable buffer, e.g. a slot
+ * of a bytearray ring, without making a python string of it first.
+ * Returns the number of bytes copied.
+ */
+%rename(copy_message) ucla_copy_message;
+
+%inline %{
+long
+ucla_copy_message (gr_message_sptr msg, PyObject *buf)
+  throw (std::invalid_argument)
+{
+  void *data;
+  Py_ssize_t size;
+
+  if (PyObject_AsWriteBuffer (buf, &data, &size) != 0){
+    PyErr_Clear ();
+    throw std::invalid_argument ("ucla_copy_message: buffer is not writable");
+  }
+  if ((Py_ssize_t) msg->length () > size)
+    throw std::invalid_argument ("ucla_copy_message: message does not fit into the buffer");
+
+  memcpy (data, msg->msg (), msg->length ());
+  return msg->length ();
+}
+%}
@@ -36,11 +36,13 @@
 #endif
 
 #include <ucla_cc1k_correlator_cb.h>
+#include <ucla_sync_search.h>
 #include <gr_io_signature.h>
 #include <assert.h>
 #include <stdexcept>
 #include <gr_count_bits.h>
 #include <cstring>
+#include <algorithm>
 
 /*
  * Create a new instance of cc1k_correlator_cb and return
@@ -85,15 +87,37 @@ ucla_cc1k_correlator_cb::ucla_cc1k_correlator_cb (int payload_bytesize,
     d_manchester (manchester),
     d_state (ST_LOOKING), 
     d_osi (0),
+    d_chips_per_byte (manchester ? 2 * CC1K_BITS_PER_BYTE : CC1K_BITS_PER_BYTE),
     d_bblen ((payload_bytesize) * CC1K_BITS_PER_BYTE),
-    d_bitbuf (new float [2*d_bblen]),
-    d_bbi (0)
+    d_bitbuf (0),
+    d_bbi (0),
+    d_frame_len (0),
+    d_emit_pos (0),
+    d_emit_len (0),
+    d_nframes (0),
+    d_nsync_timeouts (0),
+    d_nlength_errors (0)
 {
+  if (payload_bytesize < MSG_LEN_POS + CRC_LEN)
+    throw std::invalid_argument ("ucla_cc1k_correlator_cb: payload_bytesize must be >= 11");
+  d_bitbuf = new float [2*d_bblen];
+
+  if (d_manchester){
+    d_sync_word = (encode_byte (sync_byte) << 16) | encode_byte (nsync_byte);
+    d_sync_mask = 0xFFFFFFFF;
+  }
+  else {
+    d_sync_word = (sync_byte << 8) | nsync_byte;
+    d_sync_mask = 0xFFFF;
+  }
+
   d_avbi = 0;
   d_accum = 0.0;
   d_avg = 0.0;
   for (int i = 0; i < AVG_PERIOD; i++)
     d_avgbuf[i] = 0.0;
+  d_sync_pattern = new ucla_sync_pattern64;
+  ucla_sync_pattern64_init(d_sync_pattern, CC1K_SYNC);
 
 #ifdef DEBUG_UCLA_CC1K_CORRELATOR
   d_debug_fp = fopen("corr.log", "w");
@@ -110,6 +134,7 @@ ucla_cc1k_correlator_cb::~ucla_cc1k_correlator_cb ()
   fclose(d_debug_fp);
 #endif  
   delete [] d_bitbuf;
+  delete d_sync_pattern;
 }
 
 
@@ -150,7 +175,9 @@ ucla_cc1k_correlator_cb::enter_locked ()
   int delta = sub_index (d_osi, d_transition_osi);
   d_center_osi = add_index (d_transition_osi, delta/2);
   d_center_osi = add_index (d_center_osi, 3);   // FIXME
-  d_bbi = 0;
+  // the chips of the center phase seen so far
+  d_sync_reg = (unsigned int) d_shift_reg[d_center_osi];
+  d_nchips = 0;
   fflush (stdout);
 #ifdef DEBUG_UCLA_CC1K_CORRELATOR
   fprintf (stderr, ">>> enter_locked  d_center_osi = %d\n", d_center_osi);
@@ -161,6 +188,59 @@ ucla_cc1k_correlator_cb::enter_locked ()
 #endif
 }
 
+void
+ucla_cc1k_correlator_cb::enter_frame ()
+{
+#ifdef DEBUG_UCLA_CC1K_CORRELATOR
+  fprintf (stderr, ">>> enter_frame  d_nchips = %d\n", d_nchips);
+#endif
+  d_state = ST_FRAME;
+  d_bbi = 0;
+  d_frame_len = 0;
+}
+
+/*
+ * Manchester chips of b, first chip in the most significant bit: 1 ->
+ * 10, 0 -> 01.
+ */
+unsigned int
+ucla_cc1k_correlator_cb::encode_byte (unsigned char b)
+{
+  unsigned int chips = 0;
+  for (int i = 7; i >= 0; i--)
+    chips = (chips << 2) | ((b >> i) & 1 ? 2 : 1);
+  return chips;
+}
+
+/*
+ * Byte of d_chips_per_byte chips. Invalid manchester pairs decode as
+ * 0, like in ucla_sos_packet_sink.
+ */
+unsigned char
+ucla_cc1k_correlator_cb::decode_byte (const float *chips)
+{
+  unsigned char b = 0;
+  if (d_manchester)
+    for (int i = 0; i < 2 * CC1K_BITS_PER_BYTE; i += 2)
+      b = (b << 1) | (chips[i] != 0 && chips[i+1] == 0);
+  else
+    for (int i = 0; i < CC1K_BITS_PER_BYTE; i++)
+      b = (b << 1) | (chips[i] != 0);
+  return b;
+}
+
+/*
+ * Output as much of the last frame as fits.
+ */
+int
+ucla_cc1k_correlator_cb::emit (float *out, int noutput_items)
+{
+  int n = std::min (noutput_items, d_emit_len - d_emit_pos);
+  memcpy (out, &d_bitbuf[d_emit_pos], n * sizeof (float));
+  d_emit_pos += n;
+  return n;
+}
+
 /*static int
 packit (unsigned char *pktbuf, const unsigned char *bitbuf, int bitcount)
 {
@@ -206,6 +286,62 @@ ucla_cc1k_correlator_cb::update_avg(float x)
   d_accum += x;
   d_avbi = (d_avbi + 1) & (AVG_PERIOD-1);
 }
+
+/*
+ * ST_LOOKING over up to n samples: the samples of every over sample
+ * phase are packed into one word each and searched for the sync word
+ * at once. Stops at the first sample where one of the phases has a
+ * Hamming distance <= THRESHOLD and enters ST_UNDER_THRESHOLD there,
+ * the same as shifting the samples in one by one. Returns the number
+ * of samples consumed.
+ */
+int
+ucla_cc1k_correlator_cb::search_sync(const float *in, int n)
+{
+  int m = std::min(n, 32 * OVERSAMPLE);
+  unsigned int bits[OVERSAMPLE];
+  int nbits[OVERSAMPLE];
+  int hit = m;					// first sample of a hit
+
+  // sample i belongs to phase add_index(d_osi, i % OVERSAMPLE)
+  for (int q = 0; q < OVERSAMPLE; q++){
+    bits[q] = 0;
+    nbits[q] = 0;
+    for (int i = q; i < m; i += OVERSAMPLE){
+      bits[q] = (bits[q] << 1) | slice(in[i]);
+      nbits[q]++;
+    }
+    if (nbits[q] == 0)
+      continue;
+
+    unsigned long long reg = d_shift_reg[add_index(d_osi, q)];
+    int k = ucla_sync_search64(&reg, bits[q], nbits[q], d_sync_pattern, THRESHOLD + 1);
+    if (k >= 0)
+      hit = std::min(hit, q + k * OVERSAMPLE);
+  }
+
+  int consumed = hit < m ? hit + 1 : m;
+
+  // shift the bits up to the hit into the registers
+  for (int q = 0; q < OVERSAMPLE && q < consumed; q++){
+    int nb = (consumed - q + OVERSAMPLE - 1) / OVERSAMPLE;
+    unsigned long long *reg = &d_shift_reg[add_index(d_osi, q)];
+    *reg = (*reg << nb) | (bits[q] >> (nbits[q] - nb));
+  }
+  for (int i = 0; i < consumed; i++)
+    update_avg(in[i]);
+
+  if (hit < m){
+    d_osi = add_index(d_osi, hit % OVERSAMPLE);
+    // We're seeing a good PN code, remember location
+    enter_under_threshold ();
+    d_osi = add_index(d_osi, 1);
+  }
+  else
+    d_osi = add_index(d_osi, m % OVERSAMPLE);
+
+  return consumed;
+}
   
 int 
 ucla_cc1k_correlator_cb::general_work (int noutput_items,
@@ -228,6 +364,13 @@ ucla_cc1k_correlator_cb::general_work (int noutput_items,
     float 	enter_locked;
   } debug_data;
 
+  // the rest of the last frame first, its chips stay in d_bitbuf
+  // until the next lock
+  if (d_emit_pos < d_emit_len){
+    consume_each (0);
+    return emit (out, noutput_items);
+  }
+
   while (n < nin){
 
 #ifdef DEBUG_UCLA_CC1K_CORRELATOR
@@ -239,6 +382,25 @@ ucla_cc1k_correlator_cb::general_work (int noutput_items,
     switch (d_state){
 
     case ST_LOCKED:
+      // preamble, look for the sync and nsync byte
+      if (d_osi == d_center_osi){
+
+#ifdef DEBUG_UCLA_CC1K_CORRELATOR
+	debug_data.sampled = 1.0;
+#endif
+	decision = slice (in[n]);
+	d_sync_reg = (d_sync_reg << 1) | decision;
+	d_nchips++;
+	if (gr_count_bits32 ((d_sync_reg & d_sync_mask) ^ d_sync_word) <= SYNC_THRESHOLD)
+	  enter_frame ();
+	else if (d_nchips > MAX_PREAMBLE_CHIPS){
+	  d_nsync_timeouts++;
+	  enter_looking ();
+	}
+      }
+      break;
+
+    case ST_FRAME:
       if (d_osi == d_center_osi){
 
 #ifdef DEBUG_UCLA_CC1K_CORRELATOR
@@ -248,24 +410,35 @@ ucla_cc1k_correlator_cb::general_work (int noutput_items,
 	assert(d_bbi < 2*d_bblen);
 	d_bitbuf[d_bbi] = decision;
 	d_bbi++;
-	if (d_bbi >= 2*d_bblen){
-	  int errors;
-	  printf ("got whole packet\n");
-	  /*
-	  for(int i = 0; i < d_bbi/CC1K_BITS_PER_BYTE/2; i++){
-	    printf ("%2x ", pktbuf[i]);
+
+	if (d_bbi == MSG_LEN_POS * d_chips_per_byte){
+	  // the length byte tells where the frame ends
+	  int msg_len = decode_byte (&d_bitbuf[d_bbi - d_chips_per_byte]);
+	  int frame_bytes = MSG_LEN_POS + msg_len + CRC_LEN;
+	  if (frame_bytes > d_payload_bytesize){
+	    d_nlength_errors++;
+	    enter_looking ();
+	    break;
 	  }
-	  printf ("\n");
-	  */
-	  memcpy (out, &d_bitbuf[0], 2*d_bblen);
+	  d_frame_len = frame_bytes * d_chips_per_byte;
+	}
+
+	if (d_bbi == d_frame_len){
+	  d_nframes++;
+	  d_emit_pos = 0;
+	  d_emit_len = d_frame_len;
 	  enter_looking ();
 	  consume_each (n + 1);
-	  return d_bblen*2;
+	  return emit (out, noutput_items);
 	}
       }
       break;
 
     case ST_LOOKING:
+      // all phases at once, up to the first sample under the threshold
+      n += search_sync (&in[n], nin - n);
+      continue;
+
     case ST_UNDER_THRESHOLD:
       update_avg(in[n]);
       decision = slice (in[n]);
@@ -275,11 +448,7 @@ ucla_cc1k_correlator_cb::general_work (int noutput_items,
       hamming_dist = gr_count_bits64 (d_shift_reg[d_osi] ^ CC1K_SYNC);
       //printf ("%2d  %d\n", hamming_dist, d_osi);
 
-      if (d_state == ST_LOOKING && hamming_dist <= THRESHOLD){
-	// We're seeing a good PN code, remember location
-	enter_under_threshold ();
-      }
-      else if (d_state == ST_UNDER_THRESHOLD && hamming_dist > THRESHOLD){
+      if (hamming_dist > THRESHOLD){
 	// no longer seeing good PN code, compute center of goodness
 	enter_locked ();
 	debug_data.enter_locked = 1.0;
@@ -28,6 +28,7 @@
 //#define DEBUG_UCLA_CC1K_CORRELATOR
 
 class ucla_cc1k_correlator_cb;
+struct ucla_sync_pattern64;
 
 /*
  * We use boost::shared_ptr's instead of raw pointers for all access
@@ -55,13 +56,20 @@ ucla_cc1k_correlator_cb_sptr ucla_make_cc1k_correlator_cb (int payload_bytesize,
  * \brief implements the cc1k radio chip.
  * \ingroup block
  *
+ * Locks on the preamble, looks for the sync and nsync bytes and then
+ * reads the SOS frame. The length byte of the header gives the end of
+ * the frame, the output is the chips (0.0 or 1.0, 16 per byte with
+ * manchester, 8 without) of the frame from the header to the CRC.
+ * payload_bytesize is the longest frame in bytes, header and CRC
+ * included; longer frames are dropped.
+ *
  * \sa ucla_cc1k_correlator_cb for a version that subclasses gr_sync_block.
  */
 class ucla_cc1k_correlator_cb : public gr_block
 {
 private:
   static const int OVERSAMPLE = 8;
-  enum state_t { ST_LOOKING, ST_UNDER_THRESHOLD, ST_LOCKED };
+  enum state_t { ST_LOOKING, ST_UNDER_THRESHOLD, ST_LOCKED, ST_FRAME };
   
   int	  	 d_payload_bytesize;
   unsigned char  d_sync_byte;                   // syncronisation byte
@@ -72,9 +80,22 @@ private:
   unsigned int	 d_transition_osi;		// first index where Hamming dist < thresh
   unsigned int	 d_center_osi;			// center of bit
   unsigned long long int d_shift_reg[OVERSAMPLE];
+  ucla_sync_pattern64 *d_sync_pattern;		// CC1K_SYNC, for the bulk search
+  int		 d_chips_per_byte;		// 16 with manchester, 8 without
+  unsigned int	 d_sync_word;			// chips of sync and nsync byte
+  unsigned int	 d_sync_mask;
+  unsigned int	 d_sync_reg;			// chips since the lock
+  int		 d_nchips;			// how many so far
   int		 d_bblen;			// length of bitbuf
   float 	*d_bitbuf;			// demodulated bits
   int		 d_bbi;				// bitbuf index
+  int		 d_frame_len;			// chips of the frame, 0 until the length is known
+  int		 d_emit_pos;			// chips of the last frame already output
+  int		 d_emit_len;			// chips of the last frame
+
+  long		 d_nframes;			// frames output
+  long		 d_nsync_timeouts;		// locks without sync and nsync byte
+  long		 d_nlength_errors;		// frames longer than payload_bytesize
 
   static const int AVG_PERIOD = 512;		// must be power of 2 (for freq offset correction)
   
@@ -87,6 +108,10 @@ private:
   static const int CC1K_OVERHEAD = CC1K_SYNC_OVERHEAD + CC1K_PAYLOAD_OVERHEAD + CC1K_TAIL_PAD; 
   
   static const int THRESHOLD = 3;
+  static const int SYNC_THRESHOLD = 3;			// of the 32 sync chips
+  static const int MAX_PREAMBLE_CHIPS = 32 * 16;	// wait for sync after the lock
+  static const int MSG_LEN_POS = 8 + 1;		// SOS header up to the length byte
+  static const int CRC_LEN = 2;
 
   int	d_avbi;
   float	d_avgbuf[AVG_PERIOD];
@@ -116,10 +141,15 @@ private:
   }
   
   void update_avg(float x);
+  int search_sync(const float *in, int n);
   
   void enter_locked ();
   void enter_under_threshold ();
   void enter_looking ();
+  void enter_frame ();
+  unsigned int encode_byte (unsigned char b);
+  unsigned char decode_byte (const float *chips);
+  int emit (float *out, int noutput_items);
   
   static int add_index (int a, int b)
   {
@@ -148,6 +178,13 @@ public:
 		    gr_vector_int &ninput_items,
 		    gr_vector_const_void_star &input_items,
 		    gr_vector_void_star &output_items);
+
+  //! number of frames output so far
+  long nframes () const { return d_nframes; }
+  //! number of locks on the preamble without sync and nsync byte
+  long nsync_timeouts () const { return d_nsync_timeouts; }
+  //! number of frames dropped because they were longer than payload_bytesize
+  long nlength_errors () const { return d_nlength_errors; }
 };
 
 #endif /* INCLUDED_UCLA_CC1K_CORRELATOR_CB_H */
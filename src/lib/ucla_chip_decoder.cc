@@ -0,0 +1,216 @@
+/*
+Copyright (c) 2006 The Regents of the University of California.
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions
+are met:
+1. Redistributions of source code must retain the above copyright
+   notice, this list of conditions and the following disclaimer.
+2. Redistributions in binary form must reproduce the above
+   copyright notice, this list of conditions and the following
+   disclaimer in the documentation and/or other materials provided
+   with the distribution.
+3. Neither the name of the University nor that of the Laboratory
+   may be used to endorse or promote products derived from this
+   software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE REGENTS AND CONTRIBUTORS ``AS IS''
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A
+PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE REGENTS
+OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF
+USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT
+OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+SUCH DAMAGE.
+*/
+
+#ifdef HAVE_CONFIG_H
+#include "config.h"
+#endif
+
+#include <ucla_chip_decoder.h>
+#include <gr_count_bits.h>
+
+  // this is the mapping between chips and symbols if we do
+  // a fm demodulation of the O-QPSK signal. Note that this
+  // is different than the O-QPSK chip sequence from the
+  // 802.15.4 standard since there there is a translation
+  // happening.
+  // See "CMOS RFIC Architectures for IEEE 802.15.4 Networks",
+  // John Notor, Anthony Caviglia, Gary Levy, for more details.
+const unsigned int UCLA_CHIP_MAPPING[] = {1618456172,
+					  1309113062,
+					  1826650030,
+					  1724778362,
+					  778887287,
+					  2061946375,
+					  2007919840,
+					  125494990,
+					  529027475,
+					  838370585,
+					  320833617,
+					  422705285,
+					  1368596360,
+					  85537272,
+					  139563807,
+					  2021988657};
+
+  // the chip sequences as they are sent, the same as in
+  // ucla_symbols_to_chips_bi. The first chip is the MSB.
+const unsigned int UCLA_CHIP_SEQUENCES[] = {3653456430U,
+					    3986437410U,
+					    786023250U,
+					    585997365U,
+					    1378802115U,
+					    891481500U,
+					    3276943065U,
+					    2620728045U,
+					    2358642555U,
+					    3100205175U,
+					    2072811015U,
+					    2008598880U,
+					    125537430U,
+					    1618458825U,
+					    2517072780U,
+					    3378542520U};
+
+/*
+ * Split table decoder. The 32 chips are split into 4 bytes. For every
+ * byte position and byte value the table holds the number of wrong
+ * chips against all 16 sequences. Every symbol has a 16 bit lane,
+ * four lanes are packed into a 64 bit word. Adding the entries of the
+ * 4 bytes gives all 16 distances with 16 lookups and 12 additions.
+ *
+ * A lane holds (distance << 4) | symbol, the symbol is only stored in
+ * the table of the first byte. The smallest lane is therefore the
+ * closest symbol, and on a tie the lower symbol. The lanes never
+ * exceed 0x7FFF, which the branch free minimum below relies on.
+ */
+static unsigned long long DISTANCE_TABLE[4][256][4];
+
+static void
+init_distance_table()
+{
+  for (int k = 0; k < 4; k++){
+    unsigned int mask = (UCLA_CHIP_MASK >> (8*k)) & 0xFF;
+    for (int v = 0; v < 256; v++){
+      for (int w = 0; w < 4; w++){
+	unsigned long long entry = 0;
+	for (int j = 0; j < 4; j++){
+	  int symbol = 4*w + j;
+	  unsigned int chips = (UCLA_CHIP_MAPPING[symbol] >> (8*k)) & 0xFF;
+	  unsigned long long lane = gr_count_bits32((v ^ chips) & mask) << 4;
+	  if (k == 0)
+	    lane |= symbol;
+	  entry |= lane << (16*j);
+	}
+	DISTANCE_TABLE[k][v][w] = entry;
+      }
+    }
+  }
+}
+
+namespace {
+  // fills the table when the library is loaded
+  struct distance_table_init {
+    distance_table_init() { init_distance_table(); }
+  } s_distance_table_init;
+}
+
+// lane wise minimum of four 16 bit lanes, all lanes must be < 0x8000
+static inline unsigned long long
+min_lanes(unsigned long long a, unsigned long long b)
+{
+  const unsigned long long H = 0x8000800080008000ULL;
+  unsigned long long a_ge_b = (((a | H) - b) & H) >> 15;
+  unsigned long long mask = a_ge_b * 0xFFFF;
+  return (b & mask) | (a & ~mask);
+}
+
+unsigned char
+ucla_decode_chips(unsigned int chips, unsigned int *distance)
+{
+  const unsigned long long *t0 = DISTANCE_TABLE[0][chips & 0xFF];
+  const unsigned long long *t1 = DISTANCE_TABLE[1][(chips >> 8) & 0xFF];
+  const unsigned long long *t2 = DISTANCE_TABLE[2][(chips >> 16) & 0xFF];
+  const unsigned long long *t3 = DISTANCE_TABLE[3][chips >> 24];
+
+  unsigned long long m = min_lanes(min_lanes(t0[0] + t1[0] + t2[0] + t3[0],
+					     t0[1] + t1[1] + t2[1] + t3[1]),
+				   min_lanes(t0[2] + t1[2] + t2[2] + t3[2],
+					     t0[3] + t1[3] + t2[3] + t3[3]));
+  m = min_lanes(m, m >> 32);
+  m = min_lanes(m, m >> 16);
+
+  *distance = (m & 0xFFFF) >> 4;
+  return m & 0xF;
+}
+
+/*
+ * The +-1 chip sequences for soft decisions, one row per chip and one
+ * column per symbol, so the correlation of all 16 symbols is updated
+ * in one loop that the compiler can vectorize. The first and the last
+ * chip are set to 0 to ignore them like UCLA_CHIP_MASK does.
+ */
+static float SOFT_TABLE[32][16];
+
+static void
+init_soft_table()
+{
+  for (int k = 0; k < 32; k++)
+    for (int i = 0; i < 16; i++){
+      unsigned int bit = 1U << (31 - k);
+      if (!(UCLA_CHIP_MASK & bit))
+	SOFT_TABLE[k][i] = 0.0;
+      else
+	SOFT_TABLE[k][i] = (UCLA_CHIP_MAPPING[i] & bit) ? 1.0 : -1.0;
+    }
+}
+
+namespace {
+  struct soft_table_init {
+    soft_table_init() { init_soft_table(); }
+  } s_soft_table_init;
+}
+
+unsigned char
+ucla_decode_chips_soft(const float *chips, float *correlation)
+{
+  float corr[16];
+  float magnitude = 0.0;
+
+  for (int i = 0; i < 16; i++)
+    corr[i] = 0.0;
+
+  for (int k = 1; k < 31; k++){
+    const float x = chips[k];
+    const float *row = SOFT_TABLE[k];
+    for (int i = 0; i < 16; i++)
+      corr[i] += row[i] * x;
+    magnitude += x < 0 ? -x : x;
+  }
+
+  int best = 0;
+  for (int i = 1; i < 16; i++)
+    if (corr[i] > corr[best])
+      best = i;
+
+  *correlation = magnitude > 0 ? corr[best] / magnitude : 0.0;
+  return best;
+}
+
+unsigned char
+ucla_decode_chips_first_fit(unsigned int chips, unsigned int threshold)
+{
+  for (int i = 0; i < 16; i++){
+    unsigned int d = gr_count_bits32((chips & UCLA_CHIP_MASK) ^ (UCLA_CHIP_MAPPING[i] & UCLA_CHIP_MASK));
+    if (d <= threshold)
+      return i;
+  }
+  return 0xFF;
+}
@@ -0,0 +1,76 @@
+/*
+Copyright (c) 2006 The Regents of the University of California.
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions
+are met:
+1. Redistributions of source code must retain the above copyright
+   notice, this list of conditions and the following disclaimer.
+2. Redistributions in binary form must reproduce the above
+   copyright notice, this list of conditions and the following
+   disclaimer in the documentation and/or other materials provided
+   with the distribution.
+3. Neither the name of the University nor that of the Laboratory
+   may be used to endorse or promote products derived from this
+   software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE REGENTS AND CONTRIBUTORS ``AS IS''
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A
+PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE REGENTS
+OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF
+USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT
+OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+SUCH DAMAGE.
+*/
+
+#ifndef INCLUDED_UCLA_CHIP_DECODER_H
+#define INCLUDED_UCLA_CHIP_DECODER_H
+
+/*!
+ * \brief Mapping between the 16 symbols and their 32 chip sequences as
+ * seen after fm demodulation of the O-QPSK signal.
+ */
+extern const unsigned int UCLA_CHIP_MAPPING[16];
+
+extern const unsigned int UCLA_CHIP_SEQUENCES[16];
+
+/*!
+ * \brief Only the inner 30 chips are compared. The first and the last
+ * chip depend on the neighbouring symbols.
+ */
+static const unsigned int UCLA_CHIP_MASK = 0x7FFFFFFE;
+
+/*!
+ * \brief Maximum likelihood decoding of 32 chips into a symbol.
+ *
+ * Computes the Hamming distance to all 16 chip sequences at once and
+ * returns the symbol with the smallest distance. The distance is
+ * stored in *distance. On a tie the lower symbol wins.
+ */
+unsigned char ucla_decode_chips(unsigned int chips, unsigned int *distance);
+
+/*!
+ * \brief Soft decision decoding of 32 chips.
+ *
+ * chips[0] is the oldest chip (the MSB of the hard decision word).
+ * The chips are correlated with the +-1 versions of the 16 chip
+ * sequences and the symbol with the largest correlation is returned.
+ * The correlation normalized by the sum of the chip magnitudes, which
+ * is in [-1, 1], is stored in *correlation. For hard limited chips a
+ * normalized correlation c corresponds to 15 * (1 - c) wrong chips.
+ */
+unsigned char ucla_decode_chips_soft(const float *chips, float *correlation);
+
+/*!
+ * \brief Reference decoder: linear scan over the chip sequences which
+ * returns the first symbol with at most threshold errors, or 0xFF.
+ */
+unsigned char ucla_decode_chips_first_fit(unsigned int chips, unsigned int threshold);
+
+#endif /* INCLUDED_UCLA_CHIP_DECODER_H */
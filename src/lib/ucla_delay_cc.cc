@@ -39,7 +39,8 @@ ucla_delay_cc::ucla_delay_cc (const int delay)
 		   gr_make_io_signature (1, 1, sizeof (gr_complex)))
 {
   d_delay = delay;
-  set_history (delay);
+  // the Q sample delay samples back is always inside the history
+  set_history (delay + 1);
 }
 
 ucla_delay_cc::~ucla_delay_cc ()
@@ -57,7 +58,7 @@ ucla_delay_cc::work (int noutput_items,
 
   //fprintf(stderr, "."), fflush(stderr);
   for (int j = 0; j < noutput_items; j++)
-      out[j] = gr_complex (real(in[j]), imag(in[j-d_delay]));
+      out[j] = gr_complex (real(in[j+d_delay]), imag(in[j]));
 
   return noutput_items;
 }
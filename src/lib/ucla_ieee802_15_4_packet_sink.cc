@@ -31,6 +31,7 @@
 #endif
 
 #include <ucla_ieee802_15_4_packet_sink.h>
+#include <ucla_sync_search.h>
 #include <gr_io_signature.h>
 #include <cstdio>
 #include <cstring>
@@ -40,6 +41,8 @@
 #include <fcntl.h>
 #include <stdexcept>
 #include <gr_count_bits.h>
+#include <ucla_chip_decoder.h>
+#include <algorithm>
 
 // very verbose output for almost each sample
 #define VERBOSE 0
@@ -47,31 +50,28 @@
 #define VERBOSE2 0
 
 static const int DEFAULT_THRESHOLD = 10;  // detect access code with up to DEFAULT_THRESHOLD bits wrong
+static const int MIN_BULK_CHIPS = 16;     // fewer chips are searched one at a time
 
-  // this is the mapping between chips and symbols if we do
-  // a fm demodulation of the O-QPSK signal. Note that this
-  // is different than the O-QPSK chip sequence from the
-  // 802.15.4 standard since there there is a translation
-  // happening.
-  // See "CMOS RFIC Architectures for IEEE 802.15.4 Networks",
-  // John Notor, Anthony Caviglia, Gary Levy, for more details.
-static const unsigned int CHIP_MAPPING[] = {1618456172,
-					    1309113062,
-					    1826650030,
-					    1724778362,
-					    778887287,
-					    2061946375,
-					    2007919840,
-					    125494990,
-					    529027475,
-					    838370585,
-					    320833617,
-					    422705285,
-					    1368596360,
-					    85537272,
-					    139563807,
-					    2021988657};
+// table for the reflected CRC-16/CCITT (polynomial 0x1021 reflected
+// is 0x8408) used for the 802.15.4 FCS. Same CRC as crc16.py.
+static unsigned short CRC16_TABLE[256];
 
+static void
+init_crc16_table()
+{
+  for (int i = 0; i < 256; i++) {
+    unsigned short crc = i;
+    for (int b = 0; b < 8; b++)
+      crc = (crc & 1) ? (crc >> 1) ^ 0x8408 : crc >> 1;
+    CRC16_TABLE[i] = crc;
+  }
+}
+
+static inline unsigned short
+crc16_update(unsigned short crc, unsigned char byte)
+{
+  return (crc >> 8) ^ CRC16_TABLE[(crc ^ byte) & 0xFF];
+}
 
 inline void
 ucla_ieee802_15_4_packet_sink::enter_search()
@@ -109,43 +109,157 @@ ucla_ieee802_15_4_packet_sink::enter_have_header(int payload_len)
   d_payload_cnt = 0;
   d_packet_byte = 0;
   d_packet_byte_index = 0;
+  d_crc = 0;
 }
 
 
 inline unsigned char
 ucla_ieee802_15_4_packet_sink::decode_chips(unsigned int chips){
-  int i;
+  unsigned int distance;
+
+  // maximum likelihood decoding, we take the closest chip sequence
+  // and not the first one that is good enough.
+  unsigned char c = ucla_decode_chips(chips, &distance);
+  if (distance <= d_threshold) {
+    if (VERBOSE)
+      fprintf(stderr, "Found sequence %d with %d errors\n", c, distance), fflush(stderr);
+    return c;
+  }
+  return 0xFF;
+}
+
+inline unsigned char
+ucla_ieee802_15_4_packet_sink::decode_chips_soft(){
+  float correlation;
+
+  unsigned char c = ucla_decode_chips_soft(d_chips, &correlation);
+  if (15 * (1 - correlation) <= d_threshold) {
+    if (VERBOSE)
+      fprintf(stderr, "Found sequence %d with correlation %f\n", c, correlation), fflush(stderr);
+    return c;
+  }
+  return 0xFF;
+}
+
+/*
+ * Look for the first 0 symbol of the preamble in the next n chips, 32
+ * at a time. Returns the number of chips consumed, which is n unless
+ * a 0 symbol was found.
+ */
+int
+ucla_ieee802_15_4_packet_sink::search_preamble(const float *in, int n)
+{
+  int count = 0;
+
+  while (count < n) {
+    int hit;
+    int nbits = std::min(32, n - count);
+    if (nbits >= MIN_BULK_CHIPS) {
+      unsigned int bits = ucla_slice32(&in[count], nbits);
+      hit = ucla_sync_search32(&d_shift_reg, bits, nbits, d_zero_pattern, d_threshold);
+    }
+    else {
+      // a few chips are cheaper one at a time
+      for (hit = 0; hit < nbits; hit++) {
+	d_shift_reg = (d_shift_reg << 1) | slice(in[count + hit]);
+	if (gr_count_bits32((d_shift_reg&0x7FFFFFFE) ^ (UCLA_CHIP_MAPPING[0]&0x7FFFFFFE)) < d_threshold)
+	  break;
+      }
+      if (hit == nbits)
+	hit = -1;
+    }
+
+    if (hit >= 0) {
+      if (VERBOSE2)
+	fprintf(stderr,"Found 0 in chip sequence\n"),fflush(stderr);
+      // we found a 0 in the chip sequence
+      d_preamble_cnt += 1;
+      return count + hit + 1;
+    }
+    count += nbits;
+  }
+  return count;
+}
 
-  for(i=0; i<16; i++) {
-    // FIXME: we can store the last chip
-    // ignore the first and last chip since it depends on the last chip.
-    unsigned int threshold = gr_count_bits32((chips&0x7FFFFFFE) ^ (CHIP_MAPPING[i]&0x7FFFFFFE));
-    if (threshold <= d_threshold) {
+/*
+ * After the first 0 symbol, shift in the chips up to the end of the
+ * next symbol at once and check it for another 0 or the SFD. Returns
+ * the number of chips consumed, the state is STATE_HAVE_SYNC if the
+ * SFD was complete.
+ */
+int
+ucla_ieee802_15_4_packet_sink::search_sfd(const float *in, int n)
+{
+  int nbits = std::min(32 - d_chip_cnt, n);
+  unsigned int bits = ucla_slice32(in, nbits);
+
+  d_shift_reg = (unsigned int) (((unsigned long long) d_shift_reg << nbits) | bits);
+  d_chip_cnt += nbits;
+  if (d_chip_cnt < 32)
+    return nbits;
+  d_chip_cnt = 0;
+
+  if(d_packet_byte == 0) {
+    if (gr_count_bits32((d_shift_reg&0x7FFFFFFE) ^ (UCLA_CHIP_MAPPING[0]&0xFFFFFFFE)) <= d_threshold) {
+      if (VERBOSE2)
+	fprintf(stderr,"Found %d 0 in chip sequence\n", d_preamble_cnt),fflush(stderr);
+      // we found an other 0 in the chip sequence
+      d_packet_byte = 0;
+      d_preamble_cnt ++;
+    } else if (gr_count_bits32((d_shift_reg&0x7FFFFFFE) ^ (UCLA_CHIP_MAPPING[7]&0xFFFFFFFE)) <= d_threshold) {
+      if (VERBOSE2)
+	fprintf(stderr,"Found first SFD\n", d_preamble_cnt),fflush(stderr);
+      d_packet_byte = 7<<4;
+    } else {
+      // we are not in the synchronization header
+      if (VERBOSE2)
+	fprintf(stderr, "Wrong first byte of SFD. %u\n", d_shift_reg), fflush(stderr);
+      enter_search();
+    }
+  } else {
+    if (gr_count_bits32((d_shift_reg&0x7FFFFFFE) ^ (UCLA_CHIP_MAPPING[10]&0xFFFFFFFE)) <= d_threshold) {
+      d_packet_byte |= 0xA;
+      if (VERBOSE2)
+	fprintf(stderr,"Found sync, 0x%x\n", d_packet_byte),fflush(stderr);
+      // found SDF
+      // setup for header decode
+      enter_have_sync();
+    } else {
       if (VERBOSE)
-	fprintf(stderr, "Found sequence with %d errors at 0x%x\n", threshold, (chips&0x7FFFFFFE) ^ (CHIP_MAPPING[i]&0x7FFFFFFE)), fflush(stderr);
-      return (char)i&0xF;
+	fprintf(stderr, "Wrong second byte of SFD. %u\n", d_shift_reg), fflush(stderr);
+      enter_search();
     }
   }
-  return 0xFF;
+  return nbits;
 }
 
 ucla_ieee802_15_4_packet_sink_sptr
 ucla_make_ieee802_15_4_packet_sink (gr_msg_queue_sptr target_queue, 
-			   int threshold)
+			   int threshold,
+			   bool drop_bad_frames,
+			   bool soft_decision)
 {
-  return ucla_ieee802_15_4_packet_sink_sptr (new ucla_ieee802_15_4_packet_sink (target_queue, threshold));
+  return ucla_ieee802_15_4_packet_sink_sptr (new ucla_ieee802_15_4_packet_sink (target_queue, threshold, drop_bad_frames,
+										soft_decision));
 }
 
 
-ucla_ieee802_15_4_packet_sink::ucla_ieee802_15_4_packet_sink (gr_msg_queue_sptr target_queue, int threshold)
+ucla_ieee802_15_4_packet_sink::ucla_ieee802_15_4_packet_sink (gr_msg_queue_sptr target_queue, int threshold,
+							      bool drop_bad_frames, bool soft_decision)
   : gr_sync_block ("ucla_ieee802_15_4_packet_sink",
 		   gr_make_io_signature (1, 1, sizeof(float)),
 		   gr_make_io_signature (0, 0, 0)),
     d_target_queue(target_queue), 
-    d_threshold(threshold == -1 ? DEFAULT_THRESHOLD : threshold)
+    d_threshold(threshold == -1 ? DEFAULT_THRESHOLD : threshold),
+    d_drop_bad_frames(drop_bad_frames),
+    d_soft_decision(soft_decision)
 {
   d_sync_vector = 0xA7;
   d_processed = 0;
+  d_sync_offset = 0;
+  init_crc16_table();
+  d_zero_pattern = new ucla_sync_pattern32;
+  ucla_sync_pattern32_init(d_zero_pattern, UCLA_CHIP_MAPPING[0], UCLA_CHIP_MASK);
 
   if ( VERBOSE )
     fprintf(stderr, "syncvec: %x, threshold: %d, sizeof(Float): %d\n", d_sync_vector, d_threshold, sizeof(float)),fflush(stderr);
@@ -154,6 +268,7 @@ ucla_ieee802_15_4_packet_sink::ucla_ieee802_15_4_packet_sink (gr_msg_queue_sptr
 
 ucla_ieee802_15_4_packet_sink::~ucla_ieee802_15_4_packet_sink ()
 {
+  delete d_zero_pattern;
 }
 
 int ucla_ieee802_15_4_packet_sink::work (int noutput_items,
@@ -174,75 +289,20 @@ int ucla_ieee802_15_4_packet_sink::work (int noutput_items,
       if (VERBOSE)
 	fprintf(stderr,"SYNC Search, noutput=%d syncvec=%x\n",noutput_items, d_sync_vector),fflush(stderr);
 
+      // Most of the time this is noise, so the chips are sliced and
+      // checked a word at a time instead of one by one.
       while (count < noutput_items) {
-	
-	//if(inbuf[count++] == 0.0)
-	//  continue;
-	
-	
-	if(slice(inbuf[count++]))
-	  d_shift_reg = (d_shift_reg << 1) | 1;
-	else
-	  d_shift_reg = d_shift_reg << 1;
-	
-	if(d_preamble_cnt > 0){
-	  d_chip_cnt = d_chip_cnt+1;
-	}
-	
-	// The first if block syncronizes to chip sequences.
+	// The first block syncronizes to chip sequences.
 	if(d_preamble_cnt == 0){
-	  unsigned int threshold;
-	  threshold = gr_count_bits32((d_shift_reg&0x7FFFFFFE) ^ (CHIP_MAPPING[0]&0x7FFFFFFE));
-	  if(threshold < d_threshold) {
-	    //  fprintf(stderr, "Threshold %d d_preamble_cnt: %d\n", threshold, d_preamble_cnt);
-	    //if ((d_shift_reg&0xFFFFFE) == (CHIP_MAPPING[0]&0xFFFFFE)) {
-	    if (VERBOSE2)
-	      fprintf(stderr,"Found 0 in chip sequence\n"),fflush(stderr);	
-	    // we found a 0 in the chip sequence
-	    d_preamble_cnt+=1;
-	    //fprintf(stderr, "Threshold %d d_preamble_cnt: %d\n", threshold, d_preamble_cnt);
-	  }
-	} else {
-	  // we found the first 0, thus we only have to do the calculation every 32 chips
-	  if(d_chip_cnt == 32){
-	    d_chip_cnt = 0;
-	    
-	    if(d_packet_byte == 0) {
-	      if (gr_count_bits32((d_shift_reg&0x7FFFFFFE) ^ (CHIP_MAPPING[0]&0xFFFFFFFE)) <= d_threshold) {	
-		if (VERBOSE2)
-		  fprintf(stderr,"Found %d 0 in chip sequence\n", d_preamble_cnt),fflush(stderr);	
-		// we found an other 0 in the chip sequence
-		d_packet_byte = 0;
-		d_preamble_cnt ++;
-	      } else if (gr_count_bits32((d_shift_reg&0x7FFFFFFE) ^ (CHIP_MAPPING[7]&0xFFFFFFFE)) <= d_threshold) {
-		if (VERBOSE2)
-		  fprintf(stderr,"Found first SFD\n", d_preamble_cnt),fflush(stderr);	
-		d_packet_byte = 7<<4;
-	      } else {
-		// we are not in the synchronization header
-		if (VERBOSE2)
-		  fprintf(stderr, "Wrong first byte of SFD. %u\n", d_shift_reg), fflush(stderr);
-		enter_search();
-		break;
-	      }
+	  count += search_preamble(&inbuf[count], noutput_items - count);
+	  continue;
+	}
 
-	    } else {
-	      if (gr_count_bits32((d_shift_reg&0x7FFFFFFE) ^ (CHIP_MAPPING[10]&0xFFFFFFFE)) <= d_threshold) {
-		d_packet_byte |= 0xA;
-		if (VERBOSE2)
-		  fprintf(stderr,"Found sync, 0x%x\n", d_packet_byte),fflush(stderr);	
-		// found SDF
-		// setup for header decode
-		enter_have_sync();
-		break;
-	      } else {
-		if (VERBOSE)
-		  fprintf(stderr, "Wrong second byte of SFD. %u\n", d_shift_reg), fflush(stderr);
-		enter_search();
-		break;
-	      }
-	    }
-	  } 
+	// we found the first 0, thus we only have to do the calculation every 32 chips
+	count += search_sfd(&inbuf[count], noutput_items - count);
+	if(d_state == STATE_HAVE_SYNC){
+	  d_sync_offset = d_processed - noutput_items + count;
+	  break;
 	}
       }
       break;
@@ -253,6 +313,7 @@ int ucla_ieee802_15_4_packet_sink::work (int noutput_items,
 	  fflush(stderr);
 
       while (count < noutput_items) {		// Decode the bytes one after another.
+	d_chips[d_chip_cnt] = inbuf[count];
 	if(slice(inbuf[count++]))
 	  d_shift_reg = (d_shift_reg << 1) | 1;
 	else
@@ -262,7 +323,7 @@ int ucla_ieee802_15_4_packet_sink::work (int noutput_items,
 
 	if(d_chip_cnt == 32){
 	  d_chip_cnt = 0;
-	  unsigned char c = decode_chips(d_shift_reg);
+	  unsigned char c = decode_symbol();
 	  if(c == 0xFF){
 	    // something is wrong. restart the search for a sync
 	    if(VERBOSE2)
@@ -298,6 +359,7 @@ int ucla_ieee802_15_4_packet_sink::work (int noutput_items,
 	fprintf(stderr,"Packet Build count=%d, noutput_items=%d, packet_len=%d\n", count, noutput_items, d_packetlen),fflush(stderr);
 
       while (count < noutput_items) {   // shift bits into bytes of packet one at a time
+	d_chips[d_chip_cnt] = inbuf[count];
 	if(slice(inbuf[count++]))
 	  d_shift_reg = (d_shift_reg << 1) | 1;
 	else
@@ -306,7 +368,7 @@ int ucla_ieee802_15_4_packet_sink::work (int noutput_items,
 	d_chip_cnt = (d_chip_cnt+1)%32;
 
 	if(d_chip_cnt == 0){
-	  unsigned char c = decode_chips(d_shift_reg);
+	  unsigned char c = decode_symbol();
 	  if(c == 0xff){
 	    // something is wrong. restart the search for a sync
 	    if(VERBOSE2)
@@ -330,19 +392,27 @@ int ucla_ieee802_15_4_packet_sink::work (int noutput_items,
 	      fprintf(stderr, "packetcnt: %d, payloadcnt: %d, payload 0x%x, d_packet_byte_index: %d\n", d_packetlen_cnt, d_payload_cnt, d_packet_byte, d_packet_byte_index), fflush(stderr);
 
 	    d_packet[d_packetlen_cnt++] = d_packet_byte;
+	    d_crc = crc16_update(d_crc, d_packet_byte);
 	    d_payload_cnt++;
 	    d_packet_byte_index = 0;
 
-	    if (d_payload_cnt >= d_packetlen){	// packet is filled, including CRC. might do check later in here
+	    if (d_payload_cnt >= d_packetlen){	// packet is filled, including CRC.
+
+	      // the CRC over the data and the FCS is 0 if the packet is intact
+	      bool fcs_ok = d_packetlen_cnt > 2 && d_crc == 0;
 
-	      // build a message
-	      gr_message_sptr msg = gr_make_message(0, 0, 0, d_packetlen_cnt);  	    
-	      memcpy(msg->msg(), d_packet, d_packetlen_cnt);
+	      if (fcs_ok || !d_drop_bad_frames){
+		// build a message, arg1 tells if the FCS is correct
+		gr_message_sptr msg = gr_make_message(0, fcs_ok ? 1 : 0, d_sync_offset, d_packetlen_cnt);
+		memcpy(msg->msg(), d_packet, d_packetlen_cnt);
 
-	      d_target_queue->insert_tail(msg);		// send it
-	      msg.reset();  				// free it up
-	      if(VERBOSE2)
-		fprintf(stderr, "Adding message of size %d to queue\n", d_packetlen_cnt);
+		d_target_queue->insert_tail(msg);		// send it
+		msg.reset();  				// free it up
+		if(VERBOSE2)
+		  fprintf(stderr, "Adding message of size %d to queue\n", d_packetlen_cnt);
+	      } else if (VERBOSE2) {
+		fprintf(stderr, "Dropping message of size %d with bad FCS\n", d_packetlen_cnt);
+	      }
 	      enter_search();
 	      break;
 	    }
@@ -359,7 +429,7 @@ int ucla_ieee802_15_4_packet_sink::work (int noutput_items,
   }   // while
 
   if(VERBOSE2)
-    fprintf(stderr, "Samples Processed: %d\n", d_processed), fflush(stderr);
+    fprintf(stderr, "Samples Processed: %llu\n", d_processed), fflush(stderr);
 
   return noutput_items;
 }
@@ -27,21 +27,35 @@
 #include <gr_msg_queue.h>
 
 class ucla_ieee802_15_4_packet_sink;
+struct ucla_sync_pattern32;
 typedef boost::shared_ptr<ucla_ieee802_15_4_packet_sink> ucla_ieee802_15_4_packet_sink_sptr;
 
 ucla_ieee802_15_4_packet_sink_sptr 
 ucla_make_ieee802_15_4_packet_sink (gr_msg_queue_sptr target_queue,
-			      int threshold = -1	                // -1 -> use default
+			      int threshold = -1,	                // -1 -> use default
+			      bool drop_bad_frames = false,
+			      bool soft_decision = false
 			      );
 /*!
  * \brief process received  bits looking for packet sync, header, and process bits into packet
  * \ingroup sink
+ *
+ * The FCS is checked while the packet is assembled. The result is
+ * passed in arg1 of the message (1 if the FCS is correct, 0 otherwise).
+ * If drop_bad_frames is true, packets with a bad FCS are not queued.
+ *
+ * With soft_decision the symbols are decoded by correlating the
+ * received chips with the chip sequences instead of slicing them
+ * first. The threshold is then applied to the equivalent number of
+ * wrong chips, see ucla_decode_chips_soft.
  */
 class ucla_ieee802_15_4_packet_sink : public gr_sync_block
 {
   friend ucla_ieee802_15_4_packet_sink_sptr 
   ucla_make_ieee802_15_4_packet_sink (gr_msg_queue_sptr target_queue,
-				int threshold);
+				int threshold,
+				bool drop_bad_frames,
+				bool soft_decision);
 
 private:
   enum state_t {STATE_SYNC_SEARCH, STATE_HAVE_SYNC, STATE_HAVE_HEADER};
@@ -54,12 +68,16 @@ private:
   gr_msg_queue_sptr  d_target_queue;		// where to send the packet when received
   unsigned int       d_sync_vector;		// 802.15.4 standard is 4x 0 bytes and 1x0xA7
   unsigned int	     d_threshold;		// how many bits may be wrong in sync vector
+  bool               d_drop_bad_frames;         // don't queue packets with a bad FCS
+  bool               d_soft_decision;           // correlate chips instead of slicing them
 
   state_t            d_state;
 
   unsigned int       d_shift_reg;		// used to look for sync_vector
   int                d_preamble_cnt;            // count on where we are in preamble
   int                d_chip_cnt;                // counts the chips collected
+  float              d_chips[32];               // received chips of the current symbol
+  ucla_sync_pattern32 *d_zero_pattern;		// chips of the 0 symbol, for the bulk search
 
   unsigned int       d_header;			// header bits
   int		     d_headerbitlen_cnt;	// how many so far
@@ -70,16 +88,26 @@ private:
   int 		     d_packetlen;		// length of packet
   int		     d_packetlen_cnt;		// how many so far
   int		     d_payload_cnt;		// how many bytes in payload
-  int                d_processed;
+  unsigned long long d_processed;		// chips seen so far
+  unsigned long long d_sync_offset;		// chip after the SFD of the current frame
+  unsigned short     d_crc;                     // running CRC over the packet, including FCS
 
 protected:
   ucla_ieee802_15_4_packet_sink(gr_msg_queue_sptr target_queue,
-				int threshold);
+				int threshold,
+				bool drop_bad_frames,
+				bool soft_decision);
   
   void enter_search();
   void enter_have_sync();
   void enter_have_header(int payload_len);
+  int search_preamble(const float *in, int n);
+  int search_sfd(const float *in, int n);
   unsigned char decode_chips(unsigned int chips);
+  unsigned char decode_chips_soft();
+  unsigned char decode_symbol() {
+    return d_soft_decision ? decode_chips_soft() : decode_chips(d_shift_reg);
+  }
   int slice(float x) { return x > 0 ? 1 : 0; }
   
   bool header_ok()
@@ -103,6 +131,9 @@ public:
     return d_state != STATE_SYNC_SEARCH;
   }
 
+  //! number of chips seen so far, the arg2 of a frame counts in these
+  unsigned long long processed() const { return d_processed; }
+
 };
 
 #endif /* INCLUDED_GR_PACKET_SINK_H */
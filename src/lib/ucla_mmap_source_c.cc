@@ -0,0 +1,127 @@
+/*
+Copyright (c) 2006 The Regents of the University of California.
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions
+are met:
+1. Redistributions of source code must retain the above copyright
+   notice, this list of conditions and the following disclaimer.
+2. Redistributions in binary form must reproduce the above
+   copyright notice, this list of conditions and the following
+   disclaimer in the documentation and/or other materials provided
+   with the distribution.
+3. Neither the name of the University nor that of the Laboratory
+   may be used to endorse or promote products derived from this
+   software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE REGENTS AND CONTRIBUTORS ``AS IS''
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A
+PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE REGENTS
+OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF
+USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT
+OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+SUCH DAMAGE.
+*/
+
+#ifdef HAVE_CONFIG_H
+#include "config.h"
+#endif
+
+#include <ucla_mmap_source_c.h>
+#include <cstdio>
+#include <cstring>
+#include <stdexcept>
+#include <sys/types.h>
+#include <sys/stat.h>
+#include <sys/mman.h>
+#include <fcntl.h>
+#include <unistd.h>
+
+// public constructor
+ucla_mmap_source_c_sptr
+ucla_make_mmap_source_c (const char *filename, long long offset, long long nitems)
+{
+  return ucla_mmap_source_c_sptr (new ucla_mmap_source_c (filename, offset, nitems));
+}
+
+ucla_mmap_source_c::ucla_mmap_source_c (const char *filename, long long offset, long long nitems)
+  : gr_sync_block ("mmap_source_c",
+		   gr_make_io_signature (0, 0, 0),
+		   gr_make_io_signature (1, 1, sizeof (gr_complex))),
+    d_base (0), d_length (0), d_samples (0), d_nitems (0), d_position (0)
+{
+  int fd = open (filename, O_RDONLY);
+  if (fd < 0){
+    perror (filename);
+    throw std::runtime_error ("can't open file");
+  }
+
+  struct stat st;
+  if (fstat (fd, &st) < 0){
+    perror (filename);
+    close (fd);
+    throw std::runtime_error ("can't stat file");
+  }
+
+  long long total = st.st_size / sizeof (gr_complex);
+  if (offset < 0 || offset > total){
+    close (fd);
+    throw std::runtime_error ("offset is not inside the file");
+  }
+  d_nitems = total - offset;
+  if (nitems > 0 && nitems < d_nitems)
+    d_nitems = nitems;
+
+  if (d_nitems > 0){
+    // map [offset, offset + d_nitems) starting at a page boundary
+    off_t start = (off_t) offset * sizeof (gr_complex);
+    off_t page_start = start - start % sysconf (_SC_PAGESIZE);
+    off_t length = start - page_start + (off_t) d_nitems * sizeof (gr_complex);
+    if ((off_t) (size_t) length != length){
+      close (fd);
+      throw std::runtime_error ("range does not fit into the address space");
+    }
+    d_length = length;
+    d_base = mmap (0, d_length, PROT_READ, MAP_SHARED, fd, page_start);
+    if (d_base == MAP_FAILED){
+      perror (filename);
+      close (fd);
+      throw std::runtime_error ("can't mmap file");
+    }
+    // we read the range once from front to back
+    madvise (d_base, d_length, MADV_SEQUENTIAL);
+    d_samples = (const gr_complex *) ((const char *) d_base + (start - page_start));
+  }
+  close (fd);
+}
+
+ucla_mmap_source_c::~ucla_mmap_source_c ()
+{
+  if (d_base)
+    munmap (d_base, d_length);
+}
+
+int
+ucla_mmap_source_c::work (int noutput_items,
+			  gr_vector_const_void_star &input_items,
+			  gr_vector_void_star &output_items)
+{
+  gr_complex *out = (gr_complex *) output_items[0];
+
+  long long n = d_nitems - d_position;
+  if (n <= 0)
+    return -1;			// done
+  if (n > noutput_items)
+    n = noutput_items;
+
+  memcpy (out, d_samples + d_position, n * sizeof (gr_complex));
+  d_position += n;
+
+  return n;
+}
@@ -0,0 +1,87 @@
+/*
+Copyright (c) 2006 The Regents of the University of California.
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions
+are met:
+1. Redistributions of source code must retain the above copyright
+   notice, this list of conditions and the following disclaimer.
+2. Redistributions in binary form must reproduce the above
+   copyright notice, this list of conditions and the following
+   disclaimer in the documentation and/or other materials provided
+   with the distribution.
+3. Neither the name of the University nor that of the Laboratory
+   may be used to endorse or promote products derived from this
+   software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE REGENTS AND CONTRIBUTORS ``AS IS''
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A
+PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE REGENTS
+OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF
+USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT
+OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+SUCH DAMAGE.
+*/
+
+#ifndef INCLUDED_UCLA_MMAP_SOURCE_C_H
+#define INCLUDED_UCLA_MMAP_SOURCE_C_H
+
+#include <gr_sync_block.h>
+#include <gr_io_signature.h>
+#include <gr_types.h>
+
+class ucla_mmap_source_c;
+typedef boost::shared_ptr<ucla_mmap_source_c> ucla_mmap_source_c_sptr;
+
+// public constructor
+ucla_mmap_source_c_sptr
+ucla_make_mmap_source_c (const char *filename, long long offset = 0, long long nitems = 0);
+
+/*!
+ * \brief Read complex samples from a memory mapped file.
+ * \ingroup ucla
+ *
+ * The file is mapped read only and the samples are copied straight
+ * from the page cache into the output buffer, without the stdio
+ * buffering of gr_file_source. The block skips the first offset
+ * samples and then produces nitems samples (0 -> up to the end of the
+ * file). At the end it returns -1, so the flow graph finishes.
+ *
+ * Only the pages holding the selected range are mapped, so blocks
+ * reading chunks of a large capture each map just their chunk.
+ */
+class ucla_mmap_source_c : public gr_sync_block
+{
+  friend ucla_mmap_source_c_sptr
+  ucla_make_mmap_source_c (const char *filename, long long offset, long long nitems);
+
+ public:
+  ~ucla_mmap_source_c ();
+
+  int work (int noutput_items,
+	    gr_vector_const_void_star &input_items,
+	    gr_vector_void_star &output_items);
+
+  //! number of samples in the selected range
+  long long nitems () const { return d_nitems; }
+  //! number of samples produced so far
+  long long position () const { return d_position; }
+
+ protected:
+  ucla_mmap_source_c (const char *filename, long long offset, long long nitems);
+
+ private:
+  void		*d_base;	// start of the mapping
+  size_t	 d_length;	// length of the mapping in bytes
+  const gr_complex *d_samples;	// first sample of the range
+  long long	 d_nitems;
+  long long	 d_position;
+};
+
+#endif /* INCLUDED_UCLA_MMAP_SOURCE_C_H */
@@ -0,0 +1,160 @@
+/*
+Copyright (c) 2006 The Regents of the University of California.
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions
+are met:
+1. Redistributions of source code must retain the above copyright
+   notice, this list of conditions and the following disclaimer.
+2. Redistributions in binary form must reproduce the above
+   copyright notice, this list of conditions and the following
+   disclaimer in the documentation and/or other materials provided
+   with the distribution.
+3. Neither the name of the University nor that of the Laboratory
+   may be used to endorse or promote products derived from this
+   software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE REGENTS AND CONTRIBUTORS ``AS IS''
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A
+PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE REGENTS
+OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF
+USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT
+OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+SUCH DAMAGE.
+*/
+
+#ifdef HAVE_CONFIG_H
+#include "config.h"
+#endif
+
+#include <ucla_oqpsk_modulator_bc.h>
+#include <ucla_chip_decoder.h>
+#include <gr_io_signature.h>
+#include <stdexcept>
+#include <cstring>
+#include <cmath>
+#include <assert.h>
+
+ucla_oqpsk_modulator_bc_sptr 
+ucla_make_oqpsk_modulator_bc (int spb)
+{
+  return ucla_oqpsk_modulator_bc_sptr (new ucla_oqpsk_modulator_bc (spb));
+}
+
+ucla_oqpsk_modulator_bc::ucla_oqpsk_modulator_bc (int spb)
+  : gr_sync_interpolator ("oqpsk_modulator_bc",
+			  gr_make_io_signature (1, 1, sizeof (unsigned char)),
+			  gr_make_io_signature (1, 1, sizeof (gr_complex)),
+			  2 * CHIPS_PER_SYMBOL * (spb < 1 ? 1 : spb)),
+    d_spb(spb), d_symbol_len(CHIPS_PER_SYMBOL * spb), d_last_q(0)
+{
+  if (spb < 1)
+    throw std::invalid_argument ("ucla_oqpsk_modulator_bc: spb must be >= 1");
+
+  build_table();
+}
+
+ucla_oqpsk_modulator_bc::~ucla_oqpsk_modulator_bc()
+{
+  return;
+}
+
+/*
+ * Chips go out in pairs, the first on I and the second on Q. Each
+ * chip is a half-sine pulse of 2*spb samples and the Q pulses are
+ * delayed by spb samples, so the last Q pulse of a symbol ends spb
+ * samples into the next one. The first spb Q samples of a symbol
+ * depend on the chip before it, which gives three tables: no chip
+ * before (start of the stream), -1 and +1.
+ */
+void
+ucla_oqpsk_modulator_bc::build_table()
+{
+  const int pulse_len = 2 * d_spb;
+  std::vector<float> pulse(pulse_len);
+
+  for (int k = 0; k < pulse_len; k++)
+    pulse[k] = sin(M_PI * k / pulse_len);
+
+  d_table.assign(3 * NSYMBOLS * d_symbol_len, gr_complex(0, 0));
+
+  for (int last_q = 0; last_q < 3; last_q++){
+    for (int symbol = 0; symbol < NSYMBOLS; symbol++){
+      gr_complex *s = &d_table[(last_q * NSYMBOLS + symbol) * d_symbol_len];
+      unsigned int chips = UCLA_CHIP_SEQUENCES[symbol];
+      float q = last_q == 0 ? 0 : (last_q == 1 ? -1 : 1);
+
+      // tail of the last Q pulse of the symbol before
+      for (int k = 0; k < d_spb; k++)
+	s[k] = gr_complex(0, q * pulse[d_spb + k]);
+
+      for (int n = 0; n < CHIPS_PER_SYMBOL / 2; n++){
+	float i = (chips >> (31 - 2*n)) & 1 ? 1 : -1;
+	q = (chips >> (30 - 2*n)) & 1 ? 1 : -1;
+
+	for (int k = 0; k < pulse_len; k++){
+	  int j = n * pulse_len + k;
+	  s[j] += gr_complex(i * pulse[k], 0);
+	  if (j + d_spb < d_symbol_len)
+	    s[j + d_spb] += gr_complex(0, q * pulse[k]);
+	}
+      }
+    }
+  }
+}
+
+gr_complex *
+ucla_oqpsk_modulator_bc::write_symbol(gr_complex *out, unsigned int symbol, int &last_q)
+{
+  memcpy(out, &d_table[(last_q * NSYMBOLS + symbol) * d_symbol_len],
+	 d_symbol_len * sizeof(gr_complex));
+  last_q = UCLA_CHIP_SEQUENCES[symbol] & 1 ? 2 : 1;
+  return out + d_symbol_len;
+}
+
+std::string
+ucla_oqpsk_modulator_bc::modulate(const std::string &data)
+{
+  std::string samples((2 * data.size() * d_symbol_len + d_spb) * sizeof(gr_complex), 0);
+  gr_complex *out = (gr_complex *) &samples[0];
+  int last_q = 0;
+
+  for (size_t i = 0; i < data.size(); i++){
+    unsigned char byte = data[i];
+    out = write_symbol(out, byte & 0xF, last_q);
+    out = write_symbol(out, (byte >> 4) & 0xF, last_q);
+  }
+
+  // second half of the last Q pulse
+  float q = last_q == 0 ? 0 : (last_q == 1 ? -1 : 1);
+  for (int k = 0; k < d_spb; k++)
+    out[k] = gr_complex(0, q * sin(M_PI * (d_spb + k) / (2 * d_spb)));
+
+  return samples;
+}
+
+int
+ucla_oqpsk_modulator_bc::work (int noutput_items,
+			       gr_vector_const_void_star &input_items,
+			       gr_vector_void_star &output_items)
+{
+  const unsigned char *in = (const unsigned char *) input_items[0];
+  gr_complex *out = (gr_complex *) output_items[0];
+  int nbytes = noutput_items / (2 * d_symbol_len);
+
+  assert (noutput_items % (2 * d_symbol_len) == 0);
+
+  for (int i = 0; i < nbytes; i++){
+    // The LSBlock is sent first (802.15.4 standard)
+    out = write_symbol(out, in[i] & 0xF, d_last_q);
+    out = write_symbol(out, (in[i] >> 4) & 0xF, d_last_q);
+  }
+
+  return noutput_items;
+}
@@ -0,0 +1,105 @@
+/*
+Copyright (c) 2006 The Regents of the University of California.
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions
+are met:
+1. Redistributions of source code must retain the above copyright
+   notice, this list of conditions and the following disclaimer.
+2. Redistributions in binary form must reproduce the above
+   copyright notice, this list of conditions and the following
+   disclaimer in the documentation and/or other materials provided
+   with the distribution.
+3. Neither the name of the University nor that of the Laboratory
+   may be used to endorse or promote products derived from this
+   software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE REGENTS AND CONTRIBUTORS ``AS IS''
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A
+PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE REGENTS
+OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF
+USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT
+OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+SUCH DAMAGE.
+*/
+
+#ifndef INCLUDED_UCLA_OQPSK_MODULATOR_BC_H
+#define INCLUDED_UCLA_OQPSK_MODULATOR_BC_H
+
+#include <gr_sync_interpolator.h>
+#include <gr_types.h>
+#include <gr_io_signature.h>
+#include <vector>
+#include <string>
+
+class ucla_oqpsk_modulator_bc;
+
+typedef boost::shared_ptr<ucla_oqpsk_modulator_bc> ucla_oqpsk_modulator_bc_sptr;
+
+ucla_oqpsk_modulator_bc_sptr 
+ucla_make_oqpsk_modulator_bc (int spb = 2);
+
+/*!
+ * \brief Generates the 802.15.4 O-QPSK baseband signal directly from
+ * a byte stream. Does the work of symbols_to_chips_bb,
+ * chunks_to_symbols_bc, qpsk_modulator_cc and delay_cc in one block.
+ * \ingroup ucla
+ *
+ * input: stream of bytes, low nibble first
+ * output: stream of complex, 64*spb samples per byte
+ *
+ * The waveform of every symbol is computed when the block is
+ * created. The only thing that crosses a symbol boundary is the
+ * second half of the last Q chip, which is delayed by half a chip
+ * period. There is one table per value of this chip, so work only
+ * copies whole symbols into the output buffer.
+ *
+ * modulate() gives the waveform of a single frame from the same
+ * tables, outside of a flow graph.
+ */
+
+class ucla_oqpsk_modulator_bc : public gr_sync_interpolator
+{
+  friend ucla_oqpsk_modulator_bc_sptr ucla_make_oqpsk_modulator_bc (int spb);
+
+  static const int NSYMBOLS = 16;
+  static const int CHIPS_PER_SYMBOL = 32;
+
+  int                     d_spb;		// samples per chip
+  int                     d_symbol_len;		// samples per symbol
+  std::vector<gr_complex> d_table;		// [last Q chip][symbol][sample]
+  int                     d_last_q;		// 0: none yet, 1: -1, 2: +1
+
+ protected:
+  ucla_oqpsk_modulator_bc (int spb);
+
+  void build_table();
+  gr_complex *write_symbol(gr_complex *out, unsigned int symbol, int &last_q);
+
+ public:
+  ~ucla_oqpsk_modulator_bc();
+
+  int spb() const { return d_spb; }
+
+  /*!
+   * \brief Baseband samples of data sent on its own.
+   *
+   * The first half chip of Q is zero and the samples end with the
+   * second half of the last Q chip, 64*spb*data.size() + spb samples
+   * of gr_complex. The state of the stream in work is not touched.
+   */
+  std::string modulate(const std::string &data);
+
+  int work (int noutput_items,
+	    gr_vector_const_void_star &input_items,
+	    gr_vector_void_star &output_items);
+
+};
+
+#endif /* INCLUDED_UCLA_OQPSK_MODULATOR_BC_H */
@@ -35,22 +35,30 @@ SUCH DAMAGE.
 
 #include <ucla_qpsk_modulator_cc.h>
 #include <gr_io_signature.h>
+#include <stdexcept>
+#include <cmath>
 #include <assert.h>
 
-static const int SAMPLES_PER_SYMBOL = 4;
-
 ucla_qpsk_modulator_cc_sptr 
-ucla_make_qpsk_modulator_cc ()
+ucla_make_qpsk_modulator_cc (int spb)
 {
-  return ucla_qpsk_modulator_cc_sptr (new ucla_qpsk_modulator_cc ());
+  return ucla_qpsk_modulator_cc_sptr (new ucla_qpsk_modulator_cc (spb));
 }
 
-ucla_qpsk_modulator_cc::ucla_qpsk_modulator_cc ()
+ucla_qpsk_modulator_cc::ucla_qpsk_modulator_cc (int spb)
   : gr_sync_interpolator ("qpsk_modulator_cc",
 			  gr_make_io_signature (1, 1, sizeof (gr_complex)),
 			  gr_make_io_signature (1, 1, sizeof (gr_complex)),
-			  SAMPLES_PER_SYMBOL)
+			  2 * (spb < 1 ? 1 : spb)),
+    d_spb(spb)
 {
+  if (spb < 1)
+    throw std::invalid_argument ("ucla_qpsk_modulator_cc: spb must be >= 1");
+
+  // for spb = 2 this is 0, 0.707, 1, 0.707
+  d_pulse.resize(2 * spb);
+  for (int k = 0; k < 2 * spb; k++)
+    d_pulse[k] = sin(M_PI * k / (2 * spb));
 }
 
 ucla_qpsk_modulator_cc::~ucla_qpsk_modulator_cc()
@@ -59,9 +67,9 @@ ucla_qpsk_modulator_cc::~ucla_qpsk_modulator_cc()
 }
 
 /**
- * Generate a QPSK signal from a +/- 1 float stream. For each
- * two input symbols we output 4 complex symbols with a half-sine
- * pulse shape.
+ * Generate a QPSK signal from a stream of +/- 1 +/- 1j symbols. Each
+ * symbol is scaled by the half-sine table, the inner loop has no
+ * dependencies between iterations and is vectorized by the compiler.
  */
 int
 ucla_qpsk_modulator_cc::work (int noutput_items,
@@ -71,17 +79,22 @@ ucla_qpsk_modulator_cc::work (int noutput_items,
   const gr_complex *in = (gr_complex *) input_items[0];
   gr_complex *out = (gr_complex *) output_items[0];
 
-  assert (noutput_items % SAMPLES_PER_SYMBOL == 0);
+  const int pulse_len = d_pulse.size();
+  const float *pulse = &d_pulse[0];
+
+  assert (noutput_items % pulse_len == 0);
 
-  for (int i = 0; i < noutput_items / SAMPLES_PER_SYMBOL; i++){
+  for (int i = 0; i < noutput_items / pulse_len; i++){
     float iphase = real(in[i]);
     float qphase = imag(in[i]);
+    float *o = (float *) out;
     //fprintf(stderr, "%.0f %.0f ", iphase, qphase), fflush(stderr);
 
-    *out++ = gr_complex(0.0, 0.0);
-    *out++ = gr_complex(iphase * 0.70710678, qphase * 0.70710678);
-    *out++ = gr_complex(iphase, qphase);
-    *out++ = gr_complex(iphase * 0.70710678, qphase * 0.70710678);
+    for (int k = 0; k < pulse_len; k++){
+      o[2*k] = iphase * pulse[k];
+      o[2*k+1] = qphase * pulse[k];
+    }
+    out += pulse_len;
   }
 
   return noutput_items;
@@ -35,36 +35,42 @@ SUCH DAMAGE.
 #include <gr_sync_interpolator.h>
 #include <gr_types.h>
 #include <gr_io_signature.h>
+#include <vector>
 
 class ucla_qpsk_modulator_cc;
 
 typedef boost::shared_ptr<ucla_qpsk_modulator_cc> ucla_qpsk_modulator_cc_sptr;
 
 ucla_qpsk_modulator_cc_sptr 
-ucla_make_qpsk_modulator_cc ();
+ucla_make_qpsk_modulator_cc (int spb = 2);
 
 /*!
  * \brief Generates a half-sine pulse shape QPSK complex signal
- * from a float input stream. For each 2 input symbols, the block
- * generates four complex output symbols, i.e., it upsamples by a
- * constant factor of 2.
+ * from a complex input stream. Each input symbol carries two chips,
+ * one on I and one on Q, and becomes a half-sine pulse of 2*spb
+ * complex output samples, i.e., the block upsamples by 2*spb.
  * \ingroup ucla
  *
- * input: stream of float
+ * input: stream of complex
  * output: stream of complex
  *
  */
 
 class ucla_qpsk_modulator_cc : public gr_sync_interpolator
 {
-  friend ucla_qpsk_modulator_cc_sptr ucla_make_qpsk_modulator_cc ();
+  friend ucla_qpsk_modulator_cc_sptr ucla_make_qpsk_modulator_cc (int spb);
+
+  int                d_spb;		// samples per chip
+  std::vector<float> d_pulse;		// half-sine of 2*spb samples
 
  protected:
-  ucla_qpsk_modulator_cc ();
+  ucla_qpsk_modulator_cc (int spb);
 
  public:
   ~ucla_qpsk_modulator_cc();
 
+  int spb() const { return d_spb; }
+
 
   int work (int noutput_items,
 	    gr_vector_const_void_star &input_items,
@@ -31,6 +31,7 @@
 #endif
 
 #include <ucla_sos_packet_sink.h>
+#include <ucla_sync_search.h>
 #include <gr_io_signature.h>
 #include <cstdio>
 #include <cstring>
@@ -39,12 +40,62 @@
 #include <sys/stat.h>
 #include <fcntl.h>
 #include <stdexcept>
-#include <gr_count_bits.h>
+#include <algorithm>
 
 #define VERBOSE 0
 
 static const int DEFAULT_THRESHOLD = 0;  // detect access code with up to DEFAULT_THRESHOLD bits wrong
 
+// table for the CRC-16/CCITT (polynomial 0x1021, MSB first) of the SOS
+// packets. Same CRC as crc8.py.
+static unsigned short SOS_CRC_TABLE[256];
+
+static void
+init_sos_crc_table()
+{
+  for (int i = 0; i < 256; i++) {
+    unsigned short crc = i << 8;
+    for (int b = 0; b < 8; b++)
+      crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : crc << 1;
+    SOS_CRC_TABLE[i] = crc;
+  }
+}
+
+static inline unsigned short
+sos_crc_update(unsigned short crc, unsigned char byte)
+{
+  return (crc << 8) ^ SOS_CRC_TABLE[(crc >> 8) ^ byte];
+}
+
+// Manchester decoding of 8 chips: the nibble in the low 4 bits, the
+// number of chip pairs which are neither 01 (0) nor 10 (1) in the high
+// 4 bits. Invalid pairs decode as 0.
+static unsigned char MANCHESTER_TABLE[256];
+
+static void
+init_manchester_table()
+{
+  for (int i = 0; i < 256; i++) {
+    unsigned char nibble = 0, errors = 0;
+    for (int k = 6; k >= 0; k -= 2) {
+      int t = (i >> k) & 0x3;
+      nibble <<= 1;
+      if (t == 2)
+	nibble |= 1;
+      else if (t != 1)
+	errors++;
+    }
+    MANCHESTER_TABLE[i] = (errors << 4) | nibble;
+  }
+}
+
+static inline void
+put_le16(unsigned char *p, unsigned short v)
+{
+  p[0] = v & 0xFF;
+  p[1] = v >> 8;
+}
+
 inline void
 ucla_sos_packet_sink::enter_search()
 {
@@ -64,7 +115,9 @@ ucla_sos_packet_sink::enter_have_sync()
   d_state = STATE_HAVE_SYNC;
   d_packetlen_cnt = 0;
   d_packet_byte = 0;
-  d_packet_byte_index = 0;
+  d_raw = 0;
+  d_raw_cnt = 0;
+  d_manchester_errors = 0;
 }
 
 inline void
@@ -76,34 +129,138 @@ ucla_sos_packet_sink::enter_have_header(int payload_len)
   d_state = STATE_HAVE_HEADER;
   d_packetlen  = payload_len;
   d_payload_cnt = 0;
-  d_packet_byte = 0;
-  d_packet_byte_manchester = 0;
-  d_packet_byte_index = 0;
+}
+
+/*
+ * Slice samples into d_raw until a whole byte is collected, 16 chips
+ * with Manchester coding or 8 bits without. The byte is left in
+ * d_packet_byte. Returns false if the input ran out first.
+ */
+inline bool
+ucla_sos_packet_sink::collect_byte(const float *in, int n, int &count)
+{
+  int bits_per_byte = d_manchester ? 16 : 8;
+  int nbits = std::min(bits_per_byte - d_raw_cnt, n - count);
+
+  d_raw = (d_raw << nbits) | ucla_slice32(&in[count], nbits);
+  count += nbits;
+  d_raw_cnt += nbits;
+  if (d_raw_cnt < bits_per_byte)
+    return false;
+
+  d_raw_cnt = 0;
+  if (d_manchester) {
+    unsigned char hi = MANCHESTER_TABLE[(d_raw >> 8) & 0xFF];
+    unsigned char lo = MANCHESTER_TABLE[d_raw & 0xFF];
+    d_packet_byte = ((hi & 0x0F) << 4) | (lo & 0x0F);
+    d_manchester_errors += (hi >> 4) + (lo >> 4);
+  }
+  else
+    d_packet_byte = d_raw & 0xFF;
+  return true;
+}
+
+/*
+ * Check the CRC of the assembled packet and queue it behind the record
+ * described in ucla_sos_packet_sink.h. The CRC covers the header
+ * without the AM group and the payload.
+ */
+void
+ucla_sos_packet_sink::send_packet()
+{
+  unsigned short crc = 0;
+  for (int i = 1; i < MSG_LEN_POS + d_packetlen; i++)
+    crc = sos_crc_update(crc, d_packet[i]);
+
+  unsigned short rcvd_crc = d_packet[d_packetlen_cnt-2] | (d_packet[d_packetlen_cnt-1] << 8);
+  bool crc_ok = crc == rcvd_crc;
+
+  if (VERBOSE)
+    fprintf(stderr, "crc: 0x%04x crc_check: 0x%04x\n", rcvd_crc, crc);
+
+  if (!crc_ok && d_drop_bad_frames)
+    return;
+
+  // build a message
+  gr_message_sptr msg = gr_make_message(0, crc_ok ? 1 : 0, d_sync_offset,
+					RECORD_LEN + d_packetlen_cnt);
+  unsigned char *r = msg->msg();
+  r[0] = d_packet[0];				// am_group
+  r[1] = d_packet[1];				// module_src
+  r[2] = d_packet[2];				// module_dst
+  r[3] = d_packet[7];				// msg_type
+  r[4] = d_packet[3]; r[5] = d_packet[4];	// dst_addr, already little endian
+  r[6] = d_packet[5]; r[7] = d_packet[6];	// src_addr
+  r[8] = d_packet[8];				// msg_len
+  r[9] = crc_ok ? 1 : 0;
+  put_le16(&r[10], rcvd_crc);
+  put_le16(&r[12], RECORD_LEN + MSG_LEN_POS);
+  put_le16(&r[14], d_packetlen);
+  put_le16(&r[16], d_manchester_errors);
+  memcpy(&r[RECORD_LEN], d_packet, d_packetlen_cnt);
+
+  d_target_queue->insert_tail(msg);		// send it
+  msg.reset();  				// free it up
+  if(VERBOSE)
+    fprintf(stderr, "Adding message of size %d to queue\n", d_packetlen_cnt);
+}
+
+/*
+ * Search for the sync vector in the next n samples, 32 at a time.
+ * Returns the number of samples consumed, the state is
+ * STATE_HAVE_SYNC if the sync vector was found.
+ */
+int
+ucla_sos_packet_sink::search_sync(const float *in, int n)
+{
+  int count = 0;
+
+  while (count < n) {
+    int nbits = std::min(32, n - count);
+    unsigned int bits = ucla_slice32(&in[count], nbits);
+    int hit = ucla_sync_search64(&d_shift_reg, bits, nbits, d_sync_pattern, d_threshold + 1);
+    if (hit >= 0) {
+      // Found it, set up for header decode
+      enter_have_sync();
+      return count + hit + 1;
+    }
+    count += nbits;
+  }
+  return count;
 }
 
 ucla_sos_packet_sink_sptr
 ucla_make_sos_packet_sink (const std::vector<unsigned char>& sync_vector,
 			   gr_msg_queue_sptr target_queue, 
-			   int threshold)
+			   int threshold,
+			   bool drop_bad_frames)
 {
-  return ucla_sos_packet_sink_sptr (new ucla_sos_packet_sink (sync_vector, target_queue, threshold));
+  return ucla_sos_packet_sink_sptr (new ucla_sos_packet_sink (sync_vector, target_queue, threshold,
+							      drop_bad_frames));
 }
 
 
 ucla_sos_packet_sink::ucla_sos_packet_sink (const std::vector<unsigned char>& sync_vector,
-					    gr_msg_queue_sptr target_queue, int threshold)
+					    gr_msg_queue_sptr target_queue, int threshold,
+					    bool drop_bad_frames)
   : gr_sync_block ("sos_packet_sink",
 		   gr_make_io_signature (1, 1, sizeof(float)),
 		   gr_make_io_signature (0, 0, 0)),
     d_target_queue(target_queue), 
     d_threshold(threshold == -1 ? DEFAULT_THRESHOLD : threshold),
-    d_manchester  (1)
+    d_manchester  (1), d_drop_bad_frames(drop_bad_frames),
+    d_processed (0), d_sync_offset (0)
 {
+  init_sos_crc_table();
+  init_manchester_table();
+
   d_sync_vector = 0;
   for(int i=0;i<8;i++){
     d_sync_vector <<= 8;
     d_sync_vector |= sync_vector[i];
   }
+  d_sync_pattern = new ucla_sync_pattern64;
+  ucla_sync_pattern64_init(d_sync_pattern, d_sync_vector);
   if ( VERBOSE )
     fprintf(stderr, "syncvec: %llx\n", d_sync_vector),fflush(stderr);
 
@@ -112,6 +269,7 @@ ucla_sos_packet_sink::ucla_sos_packet_sink (const std::vector<unsigned char>& sy
 
 ucla_sos_packet_sink::~ucla_sos_packet_sink ()
 {
+  delete d_sync_pattern;
 }
 
 int
@@ -133,23 +291,11 @@ ucla_sos_packet_sink::work (int noutput_items,
       if (VERBOSE)
 	fprintf(stderr,"SYNC Search, noutput=%d syncvec=%llx\n",noutput_items, d_sync_vector),fflush(stderr);
 
-      while (count < noutput_items) {
-
-	if(slice(inbuf[count++]))
-	  d_shift_reg = (d_shift_reg << 1) | 1;
-	else
-	  d_shift_reg = d_shift_reg << 1;
-
-	//if (VERBOSE)
-	//  fprintf(stderr,"d_shift=%llx sync_vec=%llx\n",d_shift_reg, d_sync_vector),fflush(stderr);	
-
-	// Compute popcnt of putative sync vector
-	if(gr_count_bits64 (d_shift_reg ^ d_sync_vector) <= d_threshold) {
-	  // Found it, set up for header decode
-	  enter_have_sync();
-	  break;
-	}
-      }
+      // popcount(d_shift_reg ^ d_sync_vector) <= d_threshold, over
+      // the whole buffer
+      count += search_sync(&inbuf[count], noutput_items - count);
+      if (d_state == STATE_HAVE_SYNC)
+	d_sync_offset = d_processed + count;
       break;
 
     case STATE_HAVE_SYNC:
@@ -157,35 +303,14 @@ ucla_sos_packet_sink::work (int noutput_items,
 	fprintf(stderr,"Header Search bitcnt=%d, header=0x%08x\n", d_headerbitlen_cnt, d_header),
 	  fflush(stderr);
 
-      while (count < noutput_items) {		// Shift bits one at a time into header
-	if(slice(inbuf[count++]))
-	  d_packet_byte = (d_packet_byte << 1) | 1;
-	else
-	  d_packet_byte = d_packet_byte << 1;
-
-	
-
-	if (d_packet_byte_index++ == 7) {
-
-	  if (d_manchester) {
-	    if (d_packet_byte_manchester == 0){
-	      d_packet_byte_manchester = d_packet_byte;
-	      d_packet_byte = 0;
-	      d_packet_byte_index = 0;
-	      continue;
-	    } else {
-	      // ok, second manchester byte received, now put them together to one byte
-	      //fprintf(stderr, "b1: 0x%x b2: 0x%x ", d_packet_byte_manchester, d_packet_byte);
-	      d_packet_byte = manchester_decode(d_packet_byte_manchester, d_packet_byte);
-	      d_packet_byte_manchester = 0;
-	    }
-	  } 
-
-	  d_packet[d_packetlen_cnt++] = d_packet_byte;
-	  d_packet_byte_index = 0;
-	  if (VERBOSE)
-	    fprintf(stderr, "byte: 0x%x ", d_packet_byte), fflush(stderr);
-	}
+      while (count < noutput_items) {		// Shift bytes one at a time into header
+	if (!collect_byte(inbuf, noutput_items, count))
+	  break;				// need more input
+
+	d_packet[d_packetlen_cnt++] = d_packet_byte;
+	if (VERBOSE)
+	  fprintf(stderr, "byte: 0x%x ", d_packet_byte), fflush(stderr);
+
 	if (d_packetlen_cnt == MSG_LEN_POS) {
 
 	  if (VERBOSE)
@@ -210,45 +335,17 @@ ucla_sos_packet_sink::work (int noutput_items,
       if (VERBOSE)
 	fprintf(stderr,"Packet Build count=%d, noutput_items=%d\n", count, noutput_items),fflush(stderr);
 
-      while (count < noutput_items) {   // shift bits into bytes of packet one at a time
-	if(slice(inbuf[count++]))
-	  d_packet_byte = (d_packet_byte << 1) | 1;
-	else
-	  d_packet_byte = d_packet_byte << 1;
-
-	//fprintf(stderr, "packetcnt: %d, payloadcnt: %d, payload 0x%x, d_packet_byte_index: %d\n", d_packetlen_cnt, d_payload_cnt, d_packet_byte, d_packet_byte_index);
-
-	if (d_packet_byte_index++ == 7) {	  	// byte is full so move to next byte
-	  if (d_manchester) {
-	    if (d_packet_byte_manchester == 0){
-	      d_packet_byte_manchester = d_packet_byte;
-	      d_packet_byte = 0;
-	      d_packet_byte_index = 0;
-	      continue;
-	    } else {
-	      // ok, second manchester byte received, now put them together to one byte
-	      //fprintf(stderr, "b1: 0x%x b2: 0x%x ", d_packet_byte_manchester, d_packet_byte);
-	      d_packet_byte = manchester_decode(d_packet_byte_manchester, d_packet_byte);
-	      d_packet_byte_manchester = 0;
-	    }
-	  } 
-	  d_packet[d_packetlen_cnt++] = d_packet_byte;
-	  d_payload_cnt++;
-	  d_packet_byte_index = 0;
-
-	  if (d_payload_cnt >= d_packetlen+2){	// packet is filled, including 16 bit CRC. might do check later in here
-
-	    // build a message
-	    gr_message_sptr msg = gr_make_message(0, 0, 0, d_packetlen_cnt);  	    
-	    memcpy(msg->msg(), d_packet, d_packetlen_cnt);
-
-	    d_target_queue->insert_tail(msg);		// send it
-	    msg.reset();  				// free it up
-	    if(VERBOSE)
-	      fprintf(stderr, "Adding message of size %d to queue\n", d_packetlen_cnt);
-	    enter_search();
-	    break;
-	  }
+      while (count < noutput_items) {   // shift bytes into packet one at a time
+	if (!collect_byte(inbuf, noutput_items, count))
+	  break;				// need more input
+
+	d_packet[d_packetlen_cnt++] = d_packet_byte;
+	d_payload_cnt++;
+
+	if (d_payload_cnt >= d_packetlen+2){	// packet is filled, including 16 bit CRC
+	  send_packet();
+	  enter_search();
+	  break;
 	}
       }
       break;
@@ -260,6 +357,7 @@ ucla_sos_packet_sink::work (int noutput_items,
 
   }   // while
 
+  d_processed += noutput_items;
   return noutput_items;
 }
   
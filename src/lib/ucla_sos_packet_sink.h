@@ -27,58 +27,97 @@
 #include <gr_msg_queue.h>
 
 class ucla_sos_packet_sink;
+struct ucla_sync_pattern64;
 typedef boost::shared_ptr<ucla_sos_packet_sink> ucla_sos_packet_sink_sptr;
 
 ucla_sos_packet_sink_sptr 
 ucla_make_sos_packet_sink (const std::vector<unsigned char>& sync_vector,
 			   gr_msg_queue_sptr target_queue,
-			   int threshold = -1	                // -1 -> use default
+			   int threshold = -1,	                // -1 -> use default
+			   bool drop_bad_frames = false
 			   );
 /*!
  * \brief process received  bits looking for packet sync, header, and process bits into packet
  * \ingroup sink
+ *
+ * The CRC is checked in the sink. Every message starts with a fixed
+ * 18 byte record, all fields little endian, followed by the frame as
+ * received (9 byte header, payload, 2 byte CRC):
+ *
+ *   offset  size  field
+ *        0     1  am_group
+ *        1     1  module_src
+ *        2     1  module_dst
+ *        3     1  msg_type
+ *        4     2  dst_addr
+ *        6     2  src_addr
+ *        8     1  msg_len
+ *        9     1  crc_ok
+ *       10     2  crc (as received)
+ *       12     2  payload offset in the message
+ *       14     2  payload length
+ *       16     2  Manchester errors
+ *
+ * arg1 of the message is 1 if the CRC is correct, 0 otherwise, arg2
+ * the symbol after the access code. If drop_bad_frames is true,
+ * frames with a bad CRC are not queued.
+ *
+ * The Manchester errors are the chip pairs of the frame after the
+ * access code which were neither 01 nor 10, a link quality measure
+ * which is available even if the CRC fails.
  */
 class ucla_sos_packet_sink : public gr_sync_block
 {
   friend ucla_sos_packet_sink_sptr 
   ucla_make_sos_packet_sink (const std::vector<unsigned char>& sync_vector,
 			     gr_msg_queue_sptr target_queue,
-			     int threshold);
+			     int threshold,
+			     bool drop_bad_frames);
 
 private:
   enum state_t {STATE_SYNC_SEARCH, STATE_HAVE_SYNC, STATE_HAVE_HEADER};
 
   static const int MSG_LEN_POS   = 8+1;         // 8 byte sos header, 1 byte AM type
   static const int MAX_PKT_LEN    = 128 - MSG_LEN_POS - 1; // remove header and CRC
+  static const int RECORD_LEN     = 18;         // record in front of the frame, see above
 
   gr_msg_queue_sptr  d_target_queue;		// where to send the packet when received
   unsigned long long d_sync_vector;		// access code to locate start of packet
   unsigned int	     d_threshold;		// how many bits may be wrong in sync vector
   unsigned char      d_manchester;              // do we use manchester encoding or not
+  bool               d_drop_bad_frames;         // don't queue packets with a bad CRC
 
   state_t            d_state;
 
   unsigned long long d_shift_reg;		// used to look for sync_vector
+  ucla_sync_pattern64 *d_sync_pattern;		// sync_vector, for the bulk search
 
   unsigned int       d_header;			// header bits
   int		     d_headerbitlen_cnt;	// how many so far
 
-  unsigned char      d_packet[MAX_PKT_LEN];	// assembled payload
-  unsigned char	     d_packet_byte;		// byte being assembled
-  unsigned char      d_packet_byte_manchester;  // byte which is needed for manchester encoding
-  int		     d_packet_byte_index;	// which bit of d_packet_byte we're working on
+  unsigned char      d_packet[MSG_LEN_POS + MAX_PKT_LEN + 2]; // assembled header, payload and CRC
+  unsigned char	     d_packet_byte;		// last byte assembled
+  unsigned int       d_raw;			// sliced bits of the byte being assembled
+  int		     d_raw_cnt;			// how many so far
+  unsigned int       d_manchester_errors;	// invalid chip pairs in the current frame
   int 		     d_packetlen;		// length of packet
   int		     d_packetlen_cnt;		// how many so far
   int		     d_payload_cnt;		// how many bytes in payload
+  unsigned long long d_processed;		// symbols seen so far
+  unsigned long long d_sync_offset;		// symbol after the access code of the current frame
   
 protected:
   ucla_sos_packet_sink(const std::vector<unsigned char>& sync_vector, 
 		       gr_msg_queue_sptr target_queue,
-		       int threshold);
+		       int threshold,
+		       bool drop_bad_frames);
   
   void enter_search();
   void enter_have_sync();
   void enter_have_header(int payload_len);
+  void send_packet();
+  bool collect_byte(const float *in, int n, int &count);
+  int search_sync(const float *in, int n);
   
   int slice(float x) { return x > 0 ? 1 : 0; }
   
@@ -88,40 +127,6 @@ protected:
     return 1;
   }
 
-  unsigned char manchester_decode(unsigned char b1, unsigned char b2){
-    unsigned char t, b;
-    int errors = 0;
-
-    for (unsigned char i = 0; i < 8; i += 2){
-      t = (b1 >> (6 - i)) & 0x3;
-      if ( t == 1 ){
-	b = (b << 1) | 0;
-      } else if ( t == 2 ){
-	b = (b << 1) | 1;
-      } else {
-	// mistake in manchester encoding encode as 0
-	b = (b << 1) | 0;
-	errors += 1;
-      }
-    }
-
-    for (unsigned char i = 0; i < 8; i += 2){
-      t = (b2 >> (6 - i)) & 0x3;
-      if ( t == 1 ){
-	b = (b << 1) | 0;
-      } else if ( t == 2 ){
-	b = (b << 1) | 1;
-      } else {
-	// mistake in manchester encoding encode as 0
-	b = (b << 1) | 0;
-	errors += 1;
-      }
-    }
-    return b;
-  }
-
-  
-  
 public:
   ~ucla_sos_packet_sink();
 
@@ -136,6 +141,9 @@ public:
     return d_state != STATE_SYNC_SEARCH;
   }
 
+  //! number of symbols seen so far, the arg2 of a frame counts in these
+  unsigned long long processed() const { return d_processed; }
+
 };
 
 #endif /* INCLUDED_GR_PACKET_SINK_H */
@@ -0,0 +1,98 @@
+/*
+Copyright (c) 2006 The Regents of the University of California.
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions
+are met:
+1. Redistributions of source code must retain the above copyright
+   notice, this list of conditions and the following disclaimer.
+2. Redistributions in binary form must reproduce the above
+   copyright notice, this list of conditions and the following
+   disclaimer in the documentation and/or other materials provided
+   with the distribution.
+3. Neither the name of the University nor that of the Laboratory
+   may be used to endorse or promote products derived from this
+   software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE REGENTS AND CONTRIBUTORS ``AS IS''
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A
+PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE REGENTS
+OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF
+USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT
+OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+SUCH DAMAGE.
+*/
+
+#ifdef HAVE_CONFIG_H
+#include "config.h"
+#endif
+
+#include <ucla_symbols_to_chips_bb.h>
+#include <ucla_chip_decoder.h>
+#include <gr_io_signature.h>
+#include <assert.h>
+#include <cstring>
+
+static const int CHIP_PAIRS = 16;	// per symbol
+
+// one row of 16 chip pairs per symbol, so a symbol is a single 16
+// byte copy
+static unsigned char CHIP_PAIR_TABLE[16][CHIP_PAIRS];
+
+static void
+init_chip_pair_table()
+{
+  static bool done = false;
+
+  if (done)
+    return;
+  for (int symbol = 0; symbol < 16; symbol++)
+    for (int n = 0; n < CHIP_PAIRS; n++)
+      CHIP_PAIR_TABLE[symbol][n] = (UCLA_CHIP_SEQUENCES[symbol] >> (30 - 2*n)) & 0x3;
+  done = true;
+}
+
+ucla_symbols_to_chips_bb_sptr
+ucla_make_symbols_to_chips_bb ()
+{
+  return ucla_symbols_to_chips_bb_sptr (new ucla_symbols_to_chips_bb ());
+}
+
+ucla_symbols_to_chips_bb::ucla_symbols_to_chips_bb ()
+  : gr_sync_interpolator ("symbols_to_chips_bb",
+			  gr_make_io_signature (1, -1, sizeof (unsigned char)),
+			  gr_make_io_signature (1, -1, sizeof (unsigned char)),
+			  2 * CHIP_PAIRS)
+{
+  init_chip_pair_table();
+}
+
+int
+ucla_symbols_to_chips_bb::work (int noutput_items,
+				gr_vector_const_void_star &input_items,
+				gr_vector_void_star &output_items)
+{
+  assert (input_items.size() == output_items.size());
+  assert (noutput_items % (2 * CHIP_PAIRS) == 0);
+  int nstreams = input_items.size();
+  int nbytes = noutput_items / (2 * CHIP_PAIRS);
+
+  for (int m = 0; m < nstreams; m++){
+    const unsigned char *in = (const unsigned char *) input_items[m];
+    unsigned char *out = (unsigned char *) output_items[m];
+
+    for (int i = 0; i < nbytes; i++){
+      // The LSBlock is sent first (802.15.4 standard)
+      memcpy(out, CHIP_PAIR_TABLE[in[i] & 0xF], CHIP_PAIRS);
+      memcpy(out + CHIP_PAIRS, CHIP_PAIR_TABLE[(in[i] >> 4) & 0xF], CHIP_PAIRS);
+      out += 2 * CHIP_PAIRS;
+    }
+  }
+  return noutput_items;
+}
@@ -0,0 +1,70 @@
+/*
+Copyright (c) 2006 The Regents of the University of California.
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions
+are met:
+1. Redistributions of source code must retain the above copyright
+   notice, this list of conditions and the following disclaimer.
+2. Redistributions in binary form must reproduce the above
+   copyright notice, this list of conditions and the following
+   disclaimer in the documentation and/or other materials provided
+   with the distribution.
+3. Neither the name of the University nor that of the Laboratory
+   may be used to endorse or promote products derived from this
+   software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE REGENTS AND CONTRIBUTORS ``AS IS''
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A
+PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE REGENTS
+OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF
+USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT
+OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+SUCH DAMAGE.
+*/
+
+#ifndef INCLUDED_UCLA_SYMBOLS_TO_CHIPS_BB_H
+#define INCLUDED_UCLA_SYMBOLS_TO_CHIPS_BB_H
+
+#include <gr_sync_interpolator.h>
+
+class ucla_symbols_to_chips_bb;
+typedef boost::shared_ptr<ucla_symbols_to_chips_bb> ucla_symbols_to_chips_bb_sptr;
+
+ucla_symbols_to_chips_bb_sptr ucla_make_symbols_to_chips_bb ();
+
+/*!
+ * \brief Map a stream of bytes to the 2 bit constellation indexes of
+ * their chips
+ * \ingroup ucla
+ *
+ * input: stream of unsigned char; output: stream of unsigned char
+ *
+ * Every byte becomes two symbols (low nibble first) of 16 chip pairs
+ * each. An output byte holds one chip pair, the I chip in bit 1 and
+ * the Q chip in bit 0. This is what symbols_to_chips_bi followed by
+ * packed_to_unpacked_ii(2, GR_MSB_FIRST) produces, ready for
+ * chunks_to_symbols_bc.
+ */
+
+class ucla_symbols_to_chips_bb : public gr_sync_interpolator
+{
+  friend ucla_symbols_to_chips_bb_sptr ucla_make_symbols_to_chips_bb ();
+
+  ucla_symbols_to_chips_bb ();
+
+ public:
+  int work (int noutput_items,
+	    gr_vector_const_void_star &input_items,
+	    gr_vector_void_star &output_items);
+
+  bool check_topology(int ninputs, int noutputs) { return ninputs == noutputs; }
+};
+
+#endif /* INCLUDED_UCLA_SYMBOLS_TO_CHIPS_BB_H */
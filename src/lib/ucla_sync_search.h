@@ -0,0 +1,258 @@
+/*
+Copyright (c) 2006 The Regents of the University of California.
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions
+are met:
+1. Redistributions of source code must retain the above copyright
+   notice, this list of conditions and the following disclaimer.
+2. Redistributions in binary form must reproduce the above
+   copyright notice, this list of conditions and the following
+   disclaimer in the documentation and/or other materials provided
+   with the distribution.
+3. Neither the name of the University nor that of the Laboratory
+   may be used to endorse or promote products derived from this
+   software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE REGENTS AND CONTRIBUTORS ``AS IS''
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A
+PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE REGENTS
+OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF
+USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT
+OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+SUCH DAMAGE.
+*/
+
+#ifndef INCLUDED_UCLA_SYNC_SEARCH_H
+#define INCLUDED_UCLA_SYNC_SEARCH_H
+
+/*
+ * Helpers to search a whole buffer of samples for a sync word. The
+ * samples are sliced into a word first and the search then works on
+ * the packed bits, which avoids the per sample state machine of the
+ * packet sinks while nothing has been found.
+ *
+ * Not installed, only the blocks include it in their .cc files.
+ */
+
+/*!
+ * \brief Slice n <= 32 samples into the low n bits of a word, the
+ * first sample ends up in the most significant of them.
+ */
+static inline unsigned int
+ucla_slice32(const float *in, int n)
+{
+  unsigned int w = 0;
+  for (int k = 0; k < n; k++)
+    w = (w << 1) | (in[k] > 0);
+  return w;
+}
+
+// carry save adder, h:l = a + b + c
+#define UCLA_CSA(h, l, a, b, c)				\
+  do {							\
+    unsigned int u_ = (a) ^ (b);			\
+    h = ((a) & (b)) | (u_ & (c));			\
+    l = u_ ^ (c);					\
+  } while (0)
+
+/*!
+ * \brief Add 16 words bit sliced to the counters, see ucla_sync_search64.
+ * \returns the carry into the sixteens.
+ */
+static inline unsigned int
+ucla_harley_seal16(const unsigned int *y, unsigned int *ones, unsigned int *twos,
+		   unsigned int *fours, unsigned int *eights)
+{
+  unsigned int twos_a, twos_b, fours_a, fours_b, eights_a, eights_b, sixteens;
+
+  UCLA_CSA(twos_a, *ones, *ones, y[0], y[1]);
+  UCLA_CSA(twos_b, *ones, *ones, y[2], y[3]);
+  UCLA_CSA(fours_a, *twos, *twos, twos_a, twos_b);
+  UCLA_CSA(twos_a, *ones, *ones, y[4], y[5]);
+  UCLA_CSA(twos_b, *ones, *ones, y[6], y[7]);
+  UCLA_CSA(fours_b, *twos, *twos, twos_a, twos_b);
+  UCLA_CSA(eights_a, *fours, *fours, fours_a, fours_b);
+  UCLA_CSA(twos_a, *ones, *ones, y[8], y[9]);
+  UCLA_CSA(twos_b, *ones, *ones, y[10], y[11]);
+  UCLA_CSA(fours_a, *twos, *twos, twos_a, twos_b);
+  UCLA_CSA(twos_a, *ones, *ones, y[12], y[13]);
+  UCLA_CSA(twos_b, *ones, *ones, y[14], y[15]);
+  UCLA_CSA(fours_b, *twos, *twos, twos_a, twos_b);
+  UCLA_CSA(eights_b, *fours, *fours, fours_a, fours_b);
+  UCLA_CSA(sixteens, *eights, *eights, eights_a, eights_b);
+  return sixteens;
+}
+
+/*!
+ * \brief Lanes of the bit sliced count[0..nplanes-1] which are < limit.
+ */
+static inline unsigned int
+ucla_lanes_below(const unsigned int *count, int nplanes, unsigned int limit)
+{
+  if (limit >> nplanes)
+    return ~0u;
+
+  // most significant bit plane first
+  unsigned int less = 0, equal = ~0u;
+  for (int b = nplanes - 1; b >= 0; b--){
+    if ((limit >> b) & 1){
+      less |= equal & ~count[b];
+      equal &= count[b];
+    }
+    else
+      equal &= ~count[b];
+  }
+  return less;
+}
+
+/*!
+ * \brief Index of the most significant set lane, less must not be 0.
+ */
+static inline int
+ucla_first_lane(unsigned int less)
+{
+#ifdef __GNUC__
+  return __builtin_clz(less);
+#else
+  int k = 0;
+  while (!(less & (0x80000000u >> k)))
+    k++;
+  return k;
+#endif
+}
+
+/*!
+ * \brief 32 bit sync word and mask in the bit sliced form used by
+ * ucla_sync_search32.
+ */
+struct ucla_sync_pattern32 {
+  unsigned int flip[32];	// all ones where the pattern bit is set
+  unsigned int keep[32];	// all ones where the mask bit is set
+};
+
+static inline void
+ucla_sync_pattern32_init(ucla_sync_pattern32 *p, unsigned int pattern, unsigned int mask)
+{
+  for (int j = 0; j < 32; j++){
+    p->flip[j] = (pattern >> j) & 1 ? ~0u : 0;
+    p->keep[j] = (mask >> j) & 1 ? ~0u : 0;
+  }
+}
+
+/*!
+ * \brief Shift nbits (1..32) bits into *reg, oldest bit first, and
+ * stop as soon as popcount((*reg ^ pattern) & mask) < limit, with
+ * pattern and mask given by p.
+ *
+ * Works like ucla_sync_search64, on the 32 register bits of all 32
+ * candidate registers at once.
+ *
+ * \returns the index of the bit which completed the sync word, or -1
+ * if there was none. *reg holds the register after that bit, or after
+ * all nbits bits.
+ */
+static inline int
+ucla_sync_search32(unsigned int *reg, unsigned int bits, int nbits,
+		   const ucla_sync_pattern32 *p, unsigned int limit)
+{
+  unsigned long long window = ((unsigned long long) *reg << 32) | (bits << (32 - nbits));
+  unsigned int x[32];
+
+  for (int j = 0; j < 32; j++)
+    x[j] = ((unsigned int) (window >> j) ^ p->flip[j]) & p->keep[j];
+
+  // Harley-Seal, twice 16 inputs
+  unsigned int ones = 0, twos = 0, fours = 0, eights = 0;
+  unsigned int s0 = ucla_harley_seal16(&x[0], &ones, &twos, &fours, &eights);
+  unsigned int s1 = ucla_harley_seal16(&x[16], &ones, &twos, &fours, &eights);
+  unsigned int count[6] = { ones, twos, fours, eights, s0 ^ s1, s0 & s1 };
+
+  unsigned int less = ucla_lanes_below(count, 6, limit) & (~0u << (32 - nbits));
+
+  if (less == 0){
+    *reg = (unsigned int) (window >> (32 - nbits));
+    return -1;
+  }
+
+  int k = ucla_first_lane(less);
+  *reg = (unsigned int) (window >> (31 - k));
+  return k;
+}
+
+/*!
+ * \brief 64 bit sync word in the bit sliced form used by ucla_sync_search64.
+ */
+struct ucla_sync_pattern64 {
+  unsigned int flip[64];	// all ones where the pattern bit is set
+};
+
+static inline void
+ucla_sync_pattern64_init(ucla_sync_pattern64 *p, unsigned long long pattern)
+{
+  for (int j = 0; j < 64; j++)
+    p->flip[j] = (pattern >> j) & 1 ? ~0u : 0;
+}
+
+/*!
+ * \brief Shift nbits (1..32) bits into *reg, oldest bit first, and
+ * stop as soon as popcount(*reg ^ pattern) < limit, with the pattern
+ * given by p.
+ *
+ * All 32 candidate registers are checked at once: the window is the
+ * 64 bits of *reg followed by the new bits, and register bit j of lane
+ * m is bit j + m of it counted from the end of the lane. The distances
+ * of all lanes are counted with a bit sliced carry save adder tree over
+ * the 64 register bits instead of one popcount per bit.
+ *
+ * \returns the index of the bit which completed the sync word, or -1
+ * if there was none. *reg holds the register after that bit, or after
+ * all nbits bits.
+ */
+static inline int
+ucla_sync_search64(unsigned long long *reg, unsigned int bits, int nbits,
+		   const ucla_sync_pattern64 *p, unsigned int limit)
+{
+  // low 64 bits of the window, the high 32 are the top of *reg
+  unsigned long long low = (*reg << 32) | (unsigned long long) (bits << (32 - nbits));
+  unsigned int x[64];
+
+  for (int j = 0; j < 32; j++)
+    x[j] = ((unsigned int) (low >> j) ^ p->flip[j]);
+  for (int j = 32; j < 64; j++)
+    x[j] = ((unsigned int) (*reg >> (j - 32)) ^ p->flip[j]);
+
+  // Harley-Seal, four times 16 inputs
+  unsigned int ones = 0, twos = 0, fours = 0, eights = 0;
+  unsigned int s0 = ucla_harley_seal16(&x[0], &ones, &twos, &fours, &eights);
+  unsigned int s1 = ucla_harley_seal16(&x[16], &ones, &twos, &fours, &eights);
+  unsigned int s2 = ucla_harley_seal16(&x[32], &ones, &twos, &fours, &eights);
+  unsigned int s3 = ucla_harley_seal16(&x[48], &ones, &twos, &fours, &eights);
+  unsigned int sixteens, thirtytwos_a, thirtytwos_b;
+  UCLA_CSA(thirtytwos_a, sixteens, s0, s1, s2);
+  thirtytwos_b = sixteens & s3;
+  sixteens ^= s3;
+  unsigned int count[7] = { ones, twos, fours, eights, sixteens,
+			    thirtytwos_a ^ thirtytwos_b, thirtytwos_a & thirtytwos_b };
+
+  unsigned int less = ucla_lanes_below(count, 7, limit) & (~0u << (32 - nbits));
+
+  if (less == 0){
+    *reg = (*reg << nbits) | (bits & (0xFFFFFFFFu >> (32 - nbits)));
+    return -1;
+  }
+
+  int k = ucla_first_lane(less);
+  *reg = (*reg << (k + 1)) | ((bits >> (nbits - 1 - k)) & (0xFFFFFFFFu >> (31 - k)));
+  return k;
+}
+
+#undef UCLA_CSA
+
+#endif /* INCLUDED_UCLA_SYNC_SEARCH_H */
@@ -0,0 +1,328 @@
+#
+# Copyright 2005 Free Software Foundation, Inc.
+# 
+# This file is part of GNU Radio
+# 
+# GNU Radio is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2, or (at your option)
+# any later version.
+# 
+# GNU Radio is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with GNU Radio; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+# Boston, MA 02111-1307, USA.
+# 
+
+#
+# Offline decoder for recorded complex captures. The capture is memory
+# mapped and run through the same demodulator and packet sink as the
+# live receivers, without throttling, so it decodes as fast as the CPU
+# allows. Every frame is written as one tab separated line:
+#
+#   sample_offset  ok  length  hex
+#
+# sample_offset is the sample of the file where the access code (cc1k)
+# or the SFD (802.15.4) of the frame ended.
+#
+# With --jobs the capture is split into chunks which are decoded by a
+# pool of processes. Neighbouring chunks overlap by more than the
+# longest frame, so every frame is complete in at least one of them.
+# Frames found twice in an overlap are dropped when the results are
+# merged.
+#
+# The packet sinks count symbols after clock recovery, which runs a
+# little faster or slower than the nominal samples per symbol. A chunk
+# therefore maps the symbol count of a frame to a sample of the file
+# with the samples per symbol it measured itself, the samples its
+# source read over the symbols its sink saw.
+#
+
+from gnuradio import gr, ucla, eng_notation
+from gnuradio.eng_option import eng_option
+from optparse import OptionParser
+import gnuradio.gr.gr_threading as _threading
+import multiprocessing
+import os, sys, time
+import ieee802_15_4
+import cc1k
+import cc1k_sos_pkt
+
+IEEE802_15_4_CHIP_RATE = 2000000
+CC1K_SYMBOL_RATE = 38400
+
+# longest frames in symbols at the packet sink:
+# 802.15.4: 5 byte SHR, 1 byte PHR and 127 bytes, 2 symbols of 32 chips per byte
+IEEE802_15_4_MAX_FRAME = (5 + 1 + 127) * 2 * 32
+# SOS: access code, header, payload and CRC, 8 Manchester coded bits per byte
+CC1K_MAX_FRAME = (8 + cc1k_sos_pkt.HEADER_SIZE + 1 + cc1k_sos_pkt.MAX_PKT_SIZE + 2) * 16
+
+# shortest frames, an acknowledgement and an SOS message without payload.
+# The same frame is sent again at the earliest this many symbols later.
+IEEE802_15_4_MIN_FRAME = (5 + 1 + 5) * 2 * 32
+CC1K_MIN_FRAME = (8 + cc1k_sos_pkt.HEADER_SIZE + 1 + 2) * 16
+
+# symbols the demodulators need to settle at the start of a chunk
+SETTLE_SYMBOLS = 5000
+
+
+class ieee802_15_4_capture_graph(gr.top_block):
+    def __init__(self, filename, rcvd_pktq, sps, threshold=-1, offset=0, nitems=0):
+        gr.top_block.__init__(self)
+        self.src = ucla.mmap_source_c(filename, offset, nitems)
+        self.demod = ieee802_15_4.ieee802_15_4_demod(sps=sps,
+                                                     symbol_rate=IEEE802_15_4_CHIP_RATE)
+        self.sink = ucla.ieee802_15_4_packet_sink(rcvd_pktq, threshold)
+        self.connect(self.src, self.demod, self.sink)
+
+
+class cc1k_capture_graph(gr.flow_graph):
+    def __init__(self, filename, rcvd_pktq, sps, threshold=-1, offset=0, nitems=0):
+        gr.flow_graph.__init__(self)
+        self.src = ucla.mmap_source_c(filename, offset, nitems)
+        self.demod = cc1k.cc1k_demod(self, sps=sps, symbol_rate=CC1K_SYMBOL_RATE)
+        self.sink = ucla.sos_packet_sink(map(ord, cc1k_sos_pkt.DEFAULT_ACCESS_CODE),
+                                         rcvd_pktq, threshold)
+        self.connect(self.src, self.demod)
+        self.connect(self.demod, self.sink)
+
+
+def ieee802_15_4_frame(msg):
+    # the packet sink checked the FCS
+    return msg.arg1() != 0, msg.to_string()
+
+def cc1k_frame(msg):
+    # the packet sink checked the CRC, strip the header record in
+    # front of the frame
+    return msg.arg1() != 0, msg.to_string()[cc1k_sos_pkt.SOS_RECORD.size:]
+
+# graph, frame check, default sample rate, symbol rate, longest and
+# shortest frame in symbols
+MODULATIONS = {
+    'ieee802_15_4' : (ieee802_15_4_capture_graph, ieee802_15_4_frame, 4e6,
+                      IEEE802_15_4_CHIP_RATE, IEEE802_15_4_MAX_FRAME, IEEE802_15_4_MIN_FRAME),
+    'cc1k'         : (cc1k_capture_graph, cc1k_frame, 8 * CC1K_SYMBOL_RATE,
+                      CC1K_SYMBOL_RATE, CC1K_MAX_FRAME, CC1K_MIN_FRAME),
+    }
+
+
+def decode(fg, rcvd_pktq, frame, sps, offset, handler):
+    """
+    Run the flow graph to the end of the capture and pass on the frames.
+
+    @param fg: flow graph with a packet sink feeding rcvd_pktq
+    @param rcvd_pktq: queue of the packet sink
+    @type rcvd_pktq: gr.msg_queue
+    @param frame: function of one arg, msg, returning (ok, payload)
+    @param sps: samples per symbol at the packet sink
+    @type sps: float
+    @param offset: first sample of the file the flow graph reads
+    @type offset: int
+    @param handler: function of three args: sample_offset, ok, payload
+
+    @returns: (number of frames, number of good frames)
+    """
+    def wait():
+        fg.wait()
+        rcvd_pktq.insert_tail(gr.message(1))    # we are done
+
+    fg.start()
+    waiter = _threading.Thread(target=wait)
+    waiter.setDaemon(1)
+    waiter.start()
+
+    nframes = nright = 0
+    while True:
+        msg = rcvd_pktq.delete_head()
+        if msg.type() == 1:
+            break
+        ok, payload = frame(msg)
+        nframes += 1
+        if ok:
+            nright += 1
+        handler(offset + int(round(msg.arg2() * sps)), ok, payload)
+    return nframes, nright
+
+
+def plan_chunks(nsamples, chunk, overlap, skip=0):
+    """
+    Split nsamples samples starting at skip into chunks of chunk
+    samples, each extended by overlap samples into the next one.
+
+    @returns: list of (offset, nitems)
+    """
+    chunks = []
+    end = skip + nsamples
+    for offset in range(skip, end, chunk):
+        chunks.append((offset, min(chunk + overlap, end - offset)))
+    return chunks
+
+
+def merge_frames(chunks, tolerance):
+    """
+    Merge the frames of overlapping chunks.
+
+    A frame is dropped if a frame with the same bytes was already found
+    at most tolerance samples before it, that is the same frame decoded
+    from the overlap of two chunks.
+
+    @param chunks: lists of (sample_offset, ok, payload), one per chunk
+    @param tolerance: largest offset difference of the same frame
+    @returns: list of (sample_offset, ok, payload) sorted by offset
+    """
+    frames = []
+    for c in chunks:
+        frames.extend(c)
+    frames.sort(key=lambda f: f[0])
+
+    merged = []
+    recent = []         # frames which might still have a duplicate
+    for f in frames:
+        recent = [r for r in recent if f[0] - r[0] <= tolerance]
+        dup = False
+        for r in recent:
+            if r[2] == f[2]:
+                dup = True
+                break
+        if not dup:
+            merged.append(f)
+            recent.append(f)
+    return merged
+
+
+def _decode_chunk(job):
+    # runs in a pool process, every one builds its own flow graph
+    modulation, filename, sps, threshold, offset, nitems = job
+    graph, frame = MODULATIONS[modulation][:2]
+    rcvd_pktq = gr.msg_queue()
+    fg = graph(filename, rcvd_pktq, sps, threshold, offset, nitems)
+    frames = []
+    # with sps 1 and offset 0 the handler gets the symbol count
+    decode(fg, rcvd_pktq, frame, 1, 0,
+           lambda symbol, ok, payload: frames.append((symbol, ok, payload)))
+
+    nsamples = fg.src.position()
+    if fg.sink.processed() > 0:
+        sps = float(nsamples) / fg.sink.processed()
+    frames = [(offset + int(round(symbol * sps)), ok, payload)
+              for (symbol, ok, payload) in frames]
+    return nsamples, frames
+
+
+def decode_parallel(modulation, filename, sps, threshold=-1, skip=0, count=0,
+                    jobs=None, chunk=None):
+    """
+    Decode a capture with a pool of processes.
+
+    @param jobs: number of processes (None -> number of CPUs)
+    @param chunk: samples per chunk without the overlap (None -> pick one)
+    @returns: (samples decoded, list of (sample_offset, ok, payload))
+    """
+    max_frame, min_frame = MODULATIONS[modulation][4:6]
+    overlap = int((max_frame + SETTLE_SYMBOLS) * sps)
+
+    nsamples = os.path.getsize(filename) / gr.sizeof_gr_complex - skip
+    if count > 0:
+        nsamples = min(nsamples, count)
+    if jobs is None:
+        jobs = multiprocessing.cpu_count()
+    if chunk is None:
+        # a few chunks per process to even out the load, but keep the
+        # overlap small compared to the chunk
+        chunk = max(nsamples / (4 * jobs), 16 * overlap)
+
+    plan = plan_chunks(nsamples, chunk, overlap, skip)
+    work = [(modulation, filename, sps, threshold, offset, nitems)
+            for (offset, nitems) in plan]
+    pool = multiprocessing.Pool(jobs)
+    try:
+        results = pool.map(_decode_chunk, work, 1)
+    finally:
+        pool.close()
+        pool.join()
+
+    # frames right at the start of a chunk were seen by the previous
+    # chunk with a settled demodulator
+    settle = int(SETTLE_SYMBOLS * sps)
+    chunks = []
+    for ((offset, nitems), (n, frames)) in zip(plan, results):
+        if offset > skip:
+            frames = [f for f in frames if f[0] >= offset + settle]
+        chunks.append(frames)
+
+    # what is left of the timing error is far less than a frame, and
+    # a frame is never repeated within its own length
+    return nsamples, merge_frames(chunks, min_frame * sps)
+
+
+def main(args=None):
+    parser = OptionParser (option_class=eng_option,
+                           usage="%prog [options] capture")
+    parser.add_option ("-m", "--modulation", type="choice", choices=MODULATIONS.keys(),
+                       default='ieee802_15_4', help="ieee802_15_4 or cc1k [default=%default]")
+    parser.add_option ("-s", "--sample-rate", type="eng_float", default=None,
+                       help="sample rate of the capture [default=4M for ieee802_15_4, 307.2k for cc1k]")
+    parser.add_option ("-o", "--output", type="string", default=None,
+                       help="write the frames to FILENAME instead of stdout", metavar="FILENAME")
+    parser.add_option ("", "--skip", type="int", default=0,
+                       help="skip the first N samples of the capture", metavar="N")
+    parser.add_option ("", "--count", type="int", default=0,
+                       help="decode at most N samples (0 -> all)", metavar="N")
+    parser.add_option ("-t", "--threshold", type="int", default=-1)
+    parser.add_option ("-j", "--jobs", type="int", default=1,
+                       help="decode chunks in N processes (0 -> one per CPU)", metavar="N")
+    parser.add_option ("", "--chunk", type="int", default=None,
+                       help="samples per chunk with --jobs", metavar="N")
+    (options, args) = parser.parse_args (args)
+    if len(args) != 1:
+        parser.error("exactly one capture file is required")
+
+    graph, frame, default_rate, symbol_rate = MODULATIONS[options.modulation][:4]
+    if options.sample_rate is None:
+        options.sample_rate = default_rate
+    sps = options.sample_rate / symbol_rate
+
+    if options.output:
+        out = open(options.output, 'w')
+    else:
+        out = sys.stdout
+    out.write("# sample_offset\tok\tlength\thex\n")
+
+    def write_frame(sample_offset, ok, payload):
+        out.write("%d\t%d\t%d\t%s\n" % (sample_offset, ok, len(payload),
+                                        payload.encode('hex')))
+
+    start = time.time()
+    if options.jobs == 1:
+        rcvd_pktq = gr.msg_queue()
+        fg = graph(args[0], rcvd_pktq, sps, options.threshold, options.skip, options.count)
+        nframes, nright = decode(fg, rcvd_pktq, frame, sps, options.skip, write_frame)
+        nsamples = fg.src.position()
+    else:
+        nsamples, frames = decode_parallel(options.modulation, args[0], sps,
+                                           options.threshold, options.skip, options.count,
+                                           options.jobs or None, options.chunk)
+        nframes = nright = 0
+        for (sample_offset, ok, payload) in frames:
+            write_frame(sample_offset, ok, payload)
+            nframes += 1
+            if ok:
+                nright += 1
+    elapsed = max(time.time() - start, 1e-9)
+
+    if out is not sys.stdout:
+        out.close()
+
+    sys.stderr.write("%d samples in %.2f s: %s samples/s\n" % (
+        nsamples, elapsed, eng_notation.num_to_str(nsamples / elapsed)))
+    sys.stderr.write("%d frames (%d ok): %.1f frames/s\n" % (
+        nframes, nright, nframes / elapsed))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
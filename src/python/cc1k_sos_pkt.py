@@ -27,16 +27,34 @@
 from math import pi
 import Numeric
 
-from gnuradio import gr, packet_utils
+from gnuradio import gr, packet_utils, blks
 from gnuradio import ucla
 import crc8
-import gnuradio.gr.gr_threading as _threading
+import pkt_watcher
+import pkt_async
+import pkt_queue
 import cc1k
+from channel_stats import channel_stats
+from frame_ring import frame_ring
 import struct
+import logging
+
+_logger = logging.getLogger('ucla_blks.cc1k_sos_pkt')
 
 HEADER_SIZE = 8
 MAX_PKT_SIZE = 128 - HEADER_SIZE
 
+#this is 0x999999995a5aa5a5
+DEFAULT_ACCESS_CODE = chr(153) + chr(153) + chr(153) + chr(153) + chr(90) + chr(90) + chr(165) + chr(165)
+
+# record in front of every frame from ucla.sos_packet_sink, see
+# ucla_sos_packet_sink.h: am_group, module_src, module_dst, msg_type,
+# dst_addr, src_addr, msg_len, crc_ok, crc, payload offset, payload length,
+# Manchester errors
+SOS_RECORD = struct.Struct('<BBBBHHBBHHHH')
+# longest message of the packet sink: record, header, payload and CRC
+MAX_MSG_SIZE = SOS_RECORD.size + 9 + 118 + 2
+
 def make_sos_packet(am_group, module_src, module_dst, dst_addr, src_addr, msg_type, payload, sbp, access_code, pad_for_usrp=True):
     """
     Build a SOS packet
@@ -58,8 +76,7 @@ def make_sos_packet(am_group, module_src, module_dst, dst_addr, src_addr, msg_ty
 
     header = ''.join((chr(am_group), chr(module_src), chr(module_dst), chr(dst_addr&0xFF), chr((dst_addr >> 8) & 0xFF), chr(src_addr&0xFF), chr((src_addr >> 8) & 0xFF), chr(msg_type&0xFF), chr((len(payload) & 0xFF))))
     
-    crcClass = crc8.crc8()
-    crc = struct.pack('H', crcClass.crc(header[1:]+payload))
+    crc = struct.pack('H', crc8.sos_crc(header[1:]+payload))
     #crc = chr(0xfe)
 
     # create the packet with the syncronization header of 100x '10' in front.
@@ -100,35 +117,73 @@ class cc1k_mod_pkts(gr.hier_block):
         self._access_code = access_code
 
         # accepts messages from the outside world
-        self.pkt_input = gr.message_source(gr.sizeof_char, msgq_limit)
+        self.pkt_input = gr.message_source(gr.sizeof_char, pkt_queue.SOURCE_LIMIT)
+        self._sender = pkt_queue.msgq_sender(self.pkt_input.msgq(), msgq_limit)
         self.cc1k_mod = cc1k.cc1k_mod(fg, *args, **kwargs)
         fg.connect(self.pkt_input, self.cc1k_mod)
         gr.hier_block.__init__(self, fg, None, self.cc1k_mod)
 
-    def send_pkt(self, am_group, module_src, module_dst, dst_addr, src_addr, msg_type, payload='', eof=False):
+    def send_pkt(self, am_group, module_src, module_dst, dst_addr, src_addr, msg_type, payload='', eof=False,
+                 block=True, timeout=None):
         """
         Send the payload.
 
         @param payload: data to send
         @type payload: string
+        @param block: wait while msgq_limit packets are queued
+        @type block: bool
+        @param timeout: longest time to wait in seconds (None -> forever)
+        @type timeout: float
+        @returns: True if the packet was queued, False if the queue stayed full
         """
         if eof:
             msg = gr.message(1) # tell self.pkt_input we're not sending any more packets
         else:
             #print "original_payload =", string_to_hex_list(payload)
-            pkt = make_sos_packet(am_group,
-                                  module_src,
-                                  module_dst,
-                                  dst_addr,
-                                  src_addr,
-                                  msg_type,
-                                  payload,
-                                  self.cc1k_mod.spb,
-                                  self._access_code,
-                                  self.pad_for_usrp)
+            pkt = self._make_pkt(am_group, module_src, module_dst, dst_addr, src_addr, msg_type, payload)
             #print "pkt =", str(map(hex, map(ord, pkt)))
             msg = gr.message_from_string(pkt)
-        self.pkt_input.msgq().insert_tail(msg)
+        return self._sender.insert_tail(msg, block, timeout)
+
+    def send_pkts(self, pkts, block=True, timeout=None):
+        """
+        Send many packets in one message, so they take a single slot of
+        the message queue and go out back to back.
+
+        @param pkts: (am_group, module_src, module_dst, dst_addr, src_addr, msg_type, payload) tuples
+        @type pkts: iterable
+        @param block: wait while msgq_limit messages are queued
+        @type block: bool
+        @param timeout: longest time to wait in seconds (None -> forever)
+        @type timeout: float
+        @returns: number of packets queued, 0 if the queue stayed full
+        """
+        data = [self._make_pkt(*pkt) for pkt in pkts]
+        if not data:
+            return 0
+        msg = gr.message_from_string(''.join(data))
+        if self._sender.insert_tail(msg, block, timeout):
+            return len(data)
+        return 0
+
+    def _make_pkt(self, am_group, module_src, module_dst, dst_addr, src_addr, msg_type, payload):
+        return make_sos_packet(am_group,
+                               module_src,
+                               module_dst,
+                               dst_addr,
+                               src_addr,
+                               msg_type,
+                               payload,
+                               self.cc1k_mod.spb,
+                               self._access_code,
+                               self.pad_for_usrp)
+
+    def send_pkt_async(self, *args, **kwargs):
+        """
+        Like send_pkt, but returns a future instead of blocking while
+        the message queue is full. See pkt_async.send_pkt_async.
+        """
+        return pkt_async.send_pkt_async(self, *args, **kwargs)
 
 
 class cc1k_demod_pkts(gr.hier_block):
@@ -154,27 +209,52 @@ class cc1k_demod_pkts(gr.hier_block):
         @type callback: ok: bool; payload: string
         @param threshold: detect access_code with up to threshold bits wrong (-1 -> use default)
         @type threshold: int
+        @param drop_bad_frames: if true, packets with a bad CRC are dropped by the packet sink
+        @type drop_bad_frames: bool
+        @param link_quality: if true, callback gets the number of Manchester errors in the
+                             frame as an additional last arg, 0 on a clean link
+        @type link_quality: bool
+        @param ring_buffer: if true, msg_payload is a memoryview into a frame_ring instead of
+                            a string. It is only valid until the ring wraps, see frame_ring.
+        @type ring_buffer: bool
+        @param batch: if true, callback gets one arg, a list of the usual arg tuples
+        @type batch: bool
+        @param max_batch: most frames per list in batch mode
+        @type max_batch: int
 
         See cc1k_demod for remaining parameters.
 	"""
 
         if access_code is None:
-            #this is 0x999999995a5aa5a5
-            access_code = chr(153) + chr(153) + chr(153) + chr(153) + chr(90) + chr(90) + chr(165) + chr(165)
+            access_code = DEFAULT_ACCESS_CODE
         if not isinstance(access_code, str) or len(access_code) != 8:
             raise ValueError, "Invalid access_code '%r' len '%r'" % (access_code, len(access_code),)
         self._access_code = access_code
 
+        drop_bad_frames = kwargs.pop('drop_bad_frames', False)
+        ring_buffer = kwargs.pop('ring_buffer', False)
+        watcher_args = {}
+        for key in ('batch', 'max_batch', 'link_quality'):
+            if kwargs.has_key(key):
+                watcher_args[key] = kwargs.pop(key)
+
         self._rcvd_pktq = gr.msg_queue()          # holds packets from the PHY
         self.cc1k_demod = cc1k.cc1k_demod(fg, *args, **kwargs)
-        self._packet_sink = ucla.sos_packet_sink(map(ord, access_code), self._rcvd_pktq, threshold)
+        self._packet_sink = ucla.sos_packet_sink(map(ord, access_code), self._rcvd_pktq, threshold,
+                                                 drop_bad_frames)
         
         fg.connect(self.cc1k_demod, self._packet_sink)
         #filesink = gr.file_sink (gr.sizeof_char, "/tmp/rx.log")
         #fg.connect(self.cc1k_demod,filesink)
       
         gr.hier_block.__init__(self, fg, self.cc1k_demod, None)
-        self._watcher = _queue_watcher_thread(self._rcvd_pktq, callback)
+        if ring_buffer:
+            # a whole batch has to fit into the ring
+            self._ring = frame_ring(max(64, 2 * watcher_args.get('max_batch', 64)), MAX_MSG_SIZE)
+        else:
+            self._ring = None
+        self._watcher = _queue_watcher_thread(self._rcvd_pktq, callback, self._ring,
+                                              **watcher_args)
 
     def carrier_sensed(self):
         """
@@ -182,50 +262,156 @@ class cc1k_demod_pkts(gr.hier_block):
         """
         return self._packet_sink.carrier_sensed()
 
+    def frames(self, loop=None):
+        """
+        Deliver the packets to an event loop instead of the callback.
+
+        @returns: pkt_async.frame_stream of the usual callback arg tuples
+        """
+        stream = pkt_async.frame_stream(loop)
+        self._watcher.set_callback(stream.put_batch, batch=True)
+        return stream
+
+
+class cc1k_multichannel_demod_pkts(gr.hier_block):
+    """
+    cc1k demodulator for several channels at once that is a GNU Radio sink.
+
+    The input is a wideband complex baseband stream. One polyphase
+    analysis filterbank splits it into bins of sps * symbol_rate, and
+    every channel is fed into its own cc1k_demod_pkts from the bin
+    closest to its frequency. The remaining offset is removed by the DC
+    blocker of cc1k_demod. Filtering is done once for all channels, so
+    an additional channel only costs its demodulator.
 
-class _queue_watcher_thread(_threading.Thread):
-    def __init__(self, rcvd_pktq, callback):
-        _threading.Thread.__init__(self)
-        self.setDaemon(1)
-        self.rcvd_pktq = rcvd_pktq
+    Packets are passed to the app via the callback together with the
+    frequency of the channel they were received on.
+    """
+
+    def __init__(self, fg, sample_rate, center_freq, freqs, callback=None,
+                 sps=8, symbol_rate=38400, max_offset=50e3, **kwargs):
+        """
+	Hierarchical block for multichannel binary FSK demodulation.
+
+	@param fg: flow graph
+	@type fg: flow graph
+        @param sample_rate: sample rate of the input
+        @type sample_rate: float
+        @param center_freq: frequency the input is centered at
+        @type center_freq: float
+        @param freqs: frequencies of the channels to demodulate
+        @type freqs: list of float
+        @param callback: function of ten args: freq, ok, am_group, src_addr, dst_addr,
+                         module_src, module_dst, msg_type, msg_payload, crc
+        @param sps: samples per symbol wanted per channel, the actual
+                    value depends on the number of bins
+        @type sps: integer
+        @param symbol_rate: symbols per second
+        @type symbol_rate: float
+        @param max_offset: largest distance of a channel from its bin center
+        @type max_offset: float
+
+        See cc1k_demod_pkts for remaining parameters.
+	"""
+        mpoints = int(round(sample_rate / (sps * symbol_rate)))
+        if mpoints < 1:
+            raise ValueError, "sample_rate must be at least sps * symbol_rate"
+        spacing = float(sample_rate) / mpoints
+
+        bins = {}
+        for freq in freqs:
+            offset = (freq - center_freq) / spacing
+            b = int(round(offset))
+            if 2 * abs(b) >= mpoints:
+                raise ValueError, "channel %d is outside of the input band" % (freq,)
+            if abs(offset - b) * spacing > max_offset:
+                raise ValueError, "channel %d is %d Hz away from the closest bin" % (
+                    freq, (offset - b) * spacing)
+            if bins.has_key(b % mpoints):
+                raise ValueError, "channels %d and %d share a bin" % (bins[b % mpoints], freq)
+            bins[b % mpoints] = freq
+
+        self.sample_rate = sample_rate
+        self.center_freq = center_freq
+        self.freqs = list(freqs)
         self.callback = callback
-        self.keep_running = True
-        self.start()
+        self.mpoints = mpoints
+        self.spacing = spacing
+        self.sps = spacing / symbol_rate
+
+        # same channel filter as the single channel receivers used
+        taps = gr.firdes.low_pass(1.0, sample_rate, 150e3, 50e3, gr.firdes.WIN_HANN)
+        self.filterbank = blks.analysis_filterbank(fg, mpoints, taps)
+
+        self.stats = {}
+        self.receivers = {}
+        for i in range(mpoints):
+            if not bins.has_key(i):
+                fg.connect((self.filterbank, i), gr.null_sink(gr.sizeof_gr_complex))
+                continue
+            freq = bins[i]
+            self.stats[freq] = channel_stats()
+            self.receivers[freq] = cc1k_demod_pkts(fg, callback=self._make_callback(freq),
+                                                   sps=self.sps, symbol_rate=symbol_rate,
+                                                   **kwargs)
+            fg.connect((self.filterbank, i), self.receivers[freq])
+
+        gr.hier_block.__init__(self, fg, self.filterbank, None)
+
+    def _make_callback(self, freq):
+        def rx_callback(ok, *pkt):
+            st = self.stats[freq]
+            st.npkts += 1
+            if ok:
+                st.nright += 1
+            if self.callback:
+                self.callback(freq, ok, *pkt)
+        return rx_callback
 
-    #def stop(self):
-    #    self.keep_running = False
-        
-    def run(self):
-        while self.keep_running:
-            print "cc1k_sos_pkt: waiting for packet"
-            msg = self.rcvd_pktq.delete_head()
-            ok = 1
+    def reset_stats(self):
+        """
+        Restart the packet counts and the frame rate measurement.
+        """
+        for st in self.stats.values():
+            st.reset()
+
+    def throughput(self):
+        """
+        Return a list of (freq, npkts, nright, frames per second).
+        """
+        return [(f, self.stats[f].npkts, self.stats[f].nright,
+                 self.stats[f].frames_per_second()) for f in self.freqs]
+
+    def carrier_sensed(self, freq):
+        """
+        Return True if we detect carrier on the channel at freq.
+        """
+        return self.receivers[freq].carrier_sensed()
+
+
+class _queue_watcher_thread(pkt_watcher.queue_watcher_thread):
+    def __init__(self, rcvd_pktq, callback, ring=None, link_quality=False, **kwargs):
+        self.ring = ring
+        self.link_quality = link_quality
+        pkt_watcher.queue_watcher_thread.__init__(self, rcvd_pktq, callback,
+                                                  logger=_logger, **kwargs)
+
+    def decode(self, msg):
+        if self.ring is not None:
+            payload = self.ring.put_message(msg)
+        else:
             payload = msg.to_string()
-            
-            #print "received packet "
-            am_group = ord(payload[0])
-            module_src = ord(payload[1])
-            module_dst = ord(payload[2])
-            dst_addr = ord(payload[4])*256 + ord(payload[3])
-            src_addr = ord(payload[6])*256 + ord(payload[5])
-            msg_type = ord(payload[7])
-            msg_len = ord(payload[8])
-            msg_payload = payload[9:9+msg_len]
-            crc = ord(payload[-2]) + ord(payload[-1])*256
-
-            crcClass = crc8.crc8()
-            crcCheck = crcClass.crc(payload[1:9+msg_len])
-
-            #print " bare msg: " + str(map(hex, map(ord, payload)))
-            #print " am group: " + str(am_group)
-            #print "  src_addr: "+str(src_addr)+" dst_addr: "+str(dst_addr)
-            #print "  src_module: " + str(module_src) + " dst_module: " + str(module_dst)
-            #print "  msg type: " + str(msg_type) + " msg len: " +str(msg_len)
-            #print "  msg: " + str(map(hex, map(ord, msg_payload)))
-            #print "  crc: " + str(crc)
-            #print "  crc_check: " + str(crcCheck)
-            #print
-            ok = (crc == crcCheck)
-            if self.callback:
-                self.callback(ok, am_group, src_addr, dst_addr, module_src, module_dst, msg_type, msg_payload, crc)
 
+        # the packet sink parsed the header and checked the CRC
+        (am_group, module_src, module_dst, msg_type, dst_addr, src_addr,
+         msg_len, ok, crc, offset, length, errors) = SOS_RECORD.unpack_from(payload)
+        msg_payload = payload[offset:offset+length]
+
+        if _logger.isEnabledFor(logging.DEBUG):
+            _logger.debug("bare msg: %s", map(hex, bytearray(payload[SOS_RECORD.size:])))
+            _logger.debug("crc: %d ok: %d manchester errors: %d", crc, ok, errors)
+        ok = ok != 0
+        if self.link_quality:
+            return (ok, am_group, src_addr, dst_addr, module_src, module_dst, msg_type, msg_payload,
+                    crc, errors)
+        return (ok, am_group, src_addr, dst_addr, module_src, module_dst, msg_type, msg_payload, crc)
@@ -0,0 +1,45 @@
+#
+# Copyright 2005 Free Software Foundation, Inc.
+# 
+# This file is part of GNU Radio
+# 
+# GNU Radio is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2, or (at your option)
+# any later version.
+# 
+# GNU Radio is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with GNU Radio; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+# Boston, MA 02111-1307, USA.
+# 
+
+#
+# Packet counts of the channels of the multichannel receivers.
+#
+
+import time
+
+
+class channel_stats(object):
+    """
+    Packet counts of one channel of a multichannel receiver.
+    """
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.npkts = 0
+        self.nright = 0
+        self.start = time.time()
+
+    def frames_per_second(self):
+        elapsed = time.time() - self.start
+        if elapsed <= 0:
+            return 0.0
+        return self.npkts / elapsed
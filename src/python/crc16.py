@@ -3,6 +3,12 @@
 """
  Translation from a C code posted to a forum on the Internet.
 
+ The CRC used by IEEE 802.15.4 is the reflected CRC-16/CCITT (also
+ known as CRC-16/KERMIT): polynomial 0x1021, initial value 0, input and
+ output reflected, no final xor. crc16() computes it with a 256 entry
+ lookup table; crcbitbybit() is the original bit by bit reference
+ implementation.
+
  @translator Thomas Schmid
 """
 
@@ -52,6 +58,79 @@ def crcbitbybit(p):
      return crc
 
 
+def _make_table():
+     # one entry per byte value, computed with the reflected polynomial
+     poly = reflect(0x1021, 16)
+     table = []
+     for i in range(256):
+          crc = i
+          for b in range(8):
+               if crc & 1:
+                    crc = (crc >> 1) ^ poly
+               else:
+                    crc >>= 1
+          table.append(crc)
+     return tuple(table)
+
+CRC16_TABLE = _make_table()
+
+
+def crc16(p, crc=0):
+     """
+     Table driven CRC over the string p.
+
+     @param p: data to checksum
+     @type p: string
+     @param crc: running value to continue from (0 for a new checksum)
+     @type crc: int
+     @returns the updated 16 bit CRC
+     """
+     table = CRC16_TABLE
+     for c in array('B', p):
+          crc = (crc >> 8) ^ table[(crc ^ c) & 0xff]
+     return crc
+
+
+def fcs_ok(frame):
+     """
+     Check a frame that ends with its 2 byte FCS (low byte first, as
+     built by make_ieee802_15_4_packet). Running the CRC over the data
+     and its FCS leaves a zero remainder if the frame is intact.
+
+     @param frame: MPDU including the FCS
+     @type frame: string
+     """
+     return len(frame) > 2 and crc16(frame) == 0
+
+
+def crc16_batch(frames):
+     """
+     Compute the CRC of every string in frames.
+
+     @returns list of 16 bit CRC values
+     """
+     table = CRC16_TABLE
+     result = []
+     for p in frames:
+          crc = 0
+          for c in array('B', p):
+               crc = (crc >> 8) ^ table[(crc ^ c) & 0xff]
+          result.append(crc)
+     return result
+
+
+def check_frames(frames):
+     """
+     Check the FCS of many frames in one call.
+
+     @param frames: frames which end with their FCS
+     @type frames: sequence of strings
+     @returns list of booleans, True where the FCS is correct
+     """
+     return [len(f) > 2 and crc == 0
+             for f, crc in zip(frames, crc16_batch(frames))]
+
+
 class CRC16(object):
      """ Class interface, like the Python library's cryptographic
      hash functions (which CRC's are definitely not.)
@@ -63,7 +142,8 @@ class CRC16(object):
                self.update(string)
                
      def update(self, string):
-          self.val = crcbitbybit(string)
+          # extends the checksum, update(a); update(b) == update(a + b)
+          self.val = crc16(string, self.val)
                     
      def checksum(self):
           return chr(self.val >> 8) + chr(self.val & 0xff)
@@ -85,7 +165,9 @@ class CRC16(object):
 crc = CRC16()
 #crc.update("123456789")
 import struct
-crc.update(struct.pack("20B", 0x1, 0x88, 0xe5, 0xff, 0xff, 0xff, 0xff, 0x10, 0x0, 0x10, 0x0, 0x1, 0x80, 0x80, 0xff, 0xff, 0x10, 0x0, 0x20, 0x0))
+_vector = struct.pack("20B", 0x1, 0x88, 0xe5, 0xff, 0xff, 0xff, 0xff, 0x10, 0x0, 0x10, 0x0, 0x1, 0x80, 0x80, 0xff, 0xff, 0x10, 0x0, 0x20, 0x0)
+crc.update(_vector)
 
 assert crc.checksum() == '\x02\x82'
-
+assert crc.intchecksum() == crcbitbybit(_vector)
+assert crc16("123456789") == 0x2189
@@ -0,0 +1,162 @@
+#
+# Copyright 2005 Free Software Foundation, Inc.
+# 
+# This file is part of GNU Radio
+# 
+# GNU Radio is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2, or (at your option)
+# any later version.
+# 
+# GNU Radio is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with GNU Radio; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+# Boston, MA 02111-1307, USA.
+# 
+
+#
+# Batch verification of frames from captures. The frames are stored
+# back to back in one buffer and indexed by offset and length. Instead
+# of looping over frames we loop over byte positions and update the
+# CRC of all frames at once, so the Python overhead is per byte
+# position (at most 127) and not per frame.
+#
+
+import numpy
+import crc16
+import crc8
+
+_CRC16_TABLE = numpy.array(crc16.CRC16_TABLE, numpy.uint16)
+_SOS_CRC_TABLE = numpy.array(crc8.CRC_TABLE, numpy.uint16)
+
+SOS_HEADER_LEN = 9      # am group, modules, addresses, type, length
+
+
+def pack_frames(frames):
+    """
+    Store a list of frames back to back in one buffer.
+
+    @param frames: frames as received from the packet sink
+    @type frames: sequence of strings
+    @returns (buf, offsets, lengths) as numpy arrays
+    """
+    lengths = numpy.array([len(f) for f in frames], numpy.int64)
+    offsets = numpy.zeros(len(frames), numpy.int64)
+    if len(frames) > 1:
+        offsets[1:] = numpy.cumsum(lengths[:-1])
+    buf = numpy.frombuffer(''.join(frames), numpy.uint8)
+    return buf, offsets, lengths
+
+
+def _as_index(buf, offsets, lengths):
+    if not isinstance(buf, numpy.ndarray):
+        buf = numpy.frombuffer(buf, numpy.uint8)
+    elif buf.dtype != numpy.uint8:
+        buf = buf.view(numpy.uint8)
+    offsets = numpy.asarray(offsets, numpy.int64)
+    lengths = numpy.asarray(lengths, numpy.int64)
+    if offsets.shape != lengths.shape or offsets.ndim != 1:
+        raise ValueError, "offsets and lengths must be 1-d arrays of the same size"
+    if len(offsets) and (offsets.min() < 0 or lengths.min() < 0
+                         or (offsets + lengths).max() > len(buf)):
+        raise ValueError, "frame index out of range of buffer"
+    return buf, offsets, lengths
+
+
+def _crc_batch(buf, offsets, lengths, table, update):
+    """
+    Run a table driven CRC over all frames at once.
+
+    The frames are sorted by decreasing length, so the frames which
+    still have bytes left at position j are always a prefix of the
+    sorted index.
+    """
+    n = len(offsets)
+    order = numpy.argsort(-lengths, kind='mergesort')
+    off = offsets[order]
+    ln = lengths[order]
+    crc = numpy.zeros(n, numpy.uint16)
+    if n == 0 or ln[0] == 0:
+        return crc, order
+
+    active = numpy.searchsorted(-ln, -numpy.arange(ln[0]), 'left')
+    for j in range(ln[0]):
+        k = active[j]
+        crc[:k] = update(crc[:k], buf[off[:k] + j], table)
+    return crc, order
+
+
+def _crc16_update(crc, byte, table):
+    return (crc >> 8) ^ table[(crc ^ byte) & 0xff]
+
+
+def _sos_crc_update(crc, byte, table):
+    return ((crc << 8) & 0xff00) ^ table[(crc >> 8) ^ byte]
+
+
+def check_fcs(buf, offsets, lengths):
+    """
+    Check the FCS of many IEEE 802.15.4 frames at once.
+
+    Each frame is the PSDU as delivered by ieee802_15_4_packet_sink,
+    i.e. the MPDU followed by its 2 byte FCS. The CRC is the same one
+    make_ieee802_15_4_packet uses (crc16.CRC16_TABLE).
+
+    @param buf: packed frames
+    @type buf: string or numpy array
+    @param offsets: start of every frame in buf
+    @type offsets: sequence of int
+    @param lengths: length of every frame including the FCS
+    @type lengths: sequence of int
+    @returns numpy bool array, True where the FCS is correct
+    """
+    buf, offsets, lengths = _as_index(buf, offsets, lengths)
+    crc, order = _crc_batch(buf, offsets, lengths, _CRC16_TABLE, _crc16_update)
+
+    # the CRC over data plus FCS leaves a zero remainder
+    valid = numpy.zeros(len(offsets), numpy.bool_)
+    valid[order] = (crc == 0) & (lengths[order] > 2)
+    return valid
+
+
+def check_sos_crc(buf, offsets, lengths):
+    """
+    Check the CRC of many SOS frames at once.
+
+    Each frame is the message as delivered by sos_packet_sink: the 9
+    byte header, the payload and the CRC in the last 2 bytes (low byte
+    first). Like the cc1k packet watcher the CRC (crc8.sos_crc) runs
+    from the second header byte to the end of the payload, so the
+    result is the same as checking every frame with crc8.
+
+    @param buf: packed frames
+    @type buf: string or numpy array
+    @param offsets: start of every frame in buf
+    @type offsets: sequence of int
+    @param lengths: length of every frame including the CRC
+    @type lengths: sequence of int
+    @returns numpy bool array, True where the CRC is correct
+    """
+    buf, offsets, lengths = _as_index(buf, offsets, lengths)
+    complete = lengths >= SOS_HEADER_LEN + 2
+
+    # the length byte is the last one of the header
+    msg_len = numpy.zeros(len(offsets), numpy.int64)
+    msg_len[complete] = buf[offsets[complete] + SOS_HEADER_LEN - 1]
+    data_len = numpy.minimum(SOS_HEADER_LEN + msg_len, lengths) - 1
+    data_len[~complete] = 0
+
+    crc, order = _crc_batch(buf, offsets + 1, data_len, _SOS_CRC_TABLE, _sos_crc_update)
+
+    received = numpy.zeros(len(offsets), numpy.uint16)
+    end = offsets[complete] + lengths[complete]
+    received[complete] = buf[end - 2] | (buf[end - 1].astype(numpy.uint16) << 8)
+
+    valid = numpy.zeros(len(offsets), numpy.bool_)
+    valid[order] = crc == received[order]
+    return valid & complete
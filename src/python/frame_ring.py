@@ -0,0 +1,83 @@
+#
+# Copyright 2005 Free Software Foundation, Inc.
+# 
+# This file is part of GNU Radio
+# 
+# GNU Radio is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2, or (at your option)
+# any later version.
+# 
+# GNU Radio is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with GNU Radio; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+# Boston, MA 02111-1307, USA.
+# 
+
+#
+# Ring of preallocated frame buffers for the ring_buffer mode of the
+# demod_pkts blocks. The payload of a message from a packet sink is
+# copied straight into the next slot of the ring, no string is made
+# of it, and handed out as a memoryview, so slicing a frame in the
+# callback does not allocate new strings either.
+#
+# Lifetime: a view stays valid until nslots further frames were put
+# into the ring, after that the slot is overwritten. Callbacks which
+# keep a frame around longer have to copy it, e.g. with bytes(view).
+#
+
+from gnuradio import ucla
+
+MAX_FRAME_SIZE = 128
+
+
+class frame_ring(object):
+    """
+    Ring of nslots buffers of slot_size bytes each.
+    """
+    def __init__(self, nslots=64, slot_size=MAX_FRAME_SIZE):
+        if nslots < 1:
+            raise ValueError, "nslots must be >= 1"
+        self.slot_size = slot_size
+        self._slots = [bytearray(slot_size) for i in range(nslots)]
+        self._views = [memoryview(s) for s in self._slots]
+        self._next = 0
+
+    def __len__(self):
+        return len(self._slots)
+
+    def put(self, data):
+        """
+        Copy data into the next slot.
+
+        @param data: frame
+        @type data: string
+        @returns: memoryview of the frame in the slot
+        """
+        n = len(data)
+        if n > self.slot_size:
+            raise ValueError, "frame of %d bytes does not fit into a slot of %d" % (n, self.slot_size)
+        i = self._next
+        self._next = (i + 1) % len(self._slots)
+        self._slots[i][:n] = data
+        return self._views[i][:n]
+
+    def put_message(self, msg):
+        """
+        Copy the payload of msg into the next slot.
+
+        @param msg: message of a packet sink
+        @type msg: gr.message
+        @returns: memoryview of the frame in the slot
+        """
+        if msg.length() > self.slot_size:
+            raise ValueError, "frame of %d bytes does not fit into a slot of %d" % (msg.length(), self.slot_size)
+        i = self._next
+        self._next = (i + 1) % len(self._slots)
+        n = ucla.copy_message(msg, self._slots[i])
+        return self._views[i][:n]
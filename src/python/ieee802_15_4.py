@@ -33,35 +33,44 @@ from math import pi
 
 class ieee802_15_4_mod(gr.hier_block2):
 
-    def __init__(self, spb = 2):
+    def __init__(self, spb = 2, fused = True):
         """
-	Hierarchical block for cc1k FSK modulation.
+	Hierarchical block for 802.15.4 O-QPSK modulation.
 
 	The input is a byte stream (unsigned char) and the
 	output is the complex modulated signal at baseband.
 
-	@param spb: samples per baud >= 2
+	@param spb: samples per baud >= 1
 	@type spb: integer
+	@param fused: use the table driven ucla.oqpsk_modulator_bc instead
+	of the chain of symbols_to_chips_bb, chunks_to_symbols_bc,
+	qpsk_modulator_cc and delay_cc
+	@type fused: bool
 	"""
 	gr.hier_block2.__init__(self, "ieee802_15_4_mod",
-				gr.io_signature(0, 0, 0),  # Input
-				gr.io_signature(0, 0, 0))  # Output
+				gr.io_signature(1, 1, gr.sizeof_char),        # Input
+				gr.io_signature(1, 1, gr.sizeof_gr_complex))  # Output
 
-        if not isinstance(spb, int) or spb < 2:
-            raise TypeError, "sbp must be an integer >= 2"
+        if not isinstance(spb, int) or spb < 1:
+            raise TypeError, "sbp must be an integer >= 1"
         self.spb = spb
 
-        self.symbolsToChips = ucla.symbols_to_chips_bi()
-        self.chipsToSymbols = gr.packed_to_unpacked_ii(2, gr.GR_MSB_FIRST)
-        self.symbolsToConstellation = gr.chunks_to_symbols_ic((-1-1j, -1+1j, 1-1j, 1+1j))
+        if fused:
+            # one block, the waveform of each symbol is precomputed
+            self.oqpskmod = ucla.oqpsk_modulator_bc(self.spb)
+            self.connect(self, self.oqpskmod, self)
+        else:
+            # symbols_to_chips_bb gives the 2 bit chip pairs directly,
+            # no packed_to_unpacked_ii needed
+            self.symbolsToChips = ucla.symbols_to_chips_bb()
+            self.symbolsToConstellation = gr.chunks_to_symbols_bc((-1-1j, -1+1j, 1-1j, 1+1j))
 
-        self.pskmod = ucla.qpsk_modulator_cc()
-        self.delay = ucla.delay_cc(self.spb)
+            self.pskmod = ucla.qpsk_modulator_cc(self.spb)
+            self.delay = ucla.delay_cc(self.spb)
 
-
-	# Connect
-	self.connect(self.symbolsToChips, self.chipsToSymbols,
-                   self.symbolsToConstellation, self.pskmod, self.delay)
+            # Connect
+            self.connect(self, self.symbolsToChips,
+                         self.symbolsToConstellation, self.pskmod, self.delay, self)
 
 class ieee802_15_4_demod(gr.hier_block2):
     def __init__(self, *args, **kwargs):
@@ -27,12 +27,20 @@
 from math import pi
 import Numeric
 
-from gnuradio import gr, packet_utils, gru
+from gnuradio import gr, packet_utils, gru, blks2
 from gnuradio import ucla
 import crc16
-import gnuradio.gr.gr_threading as _threading
+import pkt_watcher
+import pkt_async
+import pkt_queue
+import waveform_cache
 import ieee802_15_4
+from channel_stats import channel_stats
+from frame_ring import frame_ring
 import struct
+import logging
+
+_logger = logging.getLogger('ucla_blks.ieee802_15_4_pkt')
 
 #import pdb
 
@@ -158,16 +166,17 @@ class ieee802_15_4_mod_pkts(gr.hier_block2):
         See 802_15_4_mod for remaining parameters
         """
 	gr.hier_block2.__init__(self, "ieee802_15_4_mod_pkts",
-				gr.io_signature(0, 0, 0),  # Input
-				gr.io_signature(0, 0, 0))  # Output
+				gr.io_signature(0, 0, 0),                     # Input
+				gr.io_signature(1, 1, gr.sizeof_gr_complex))  # Output
         self.pad_for_usrp = pad_for_usrp
 
         # accepts messages from the outside world
-        self.pkt_input = gr.message_source(gr.sizeof_char, msgq_limit)
-        self.ieee802_15_4_mod = ieee802_15_4.ieee802_15_4_mod(self, *args, **kwargs)
-        self.connect(self.pkt_input, self.ieee802_15_4_mod)
+        self.pkt_input = gr.message_source(gr.sizeof_char, pkt_queue.SOURCE_LIMIT)
+        self._sender = pkt_queue.msgq_sender(self.pkt_input.msgq(), msgq_limit)
+        self.ieee802_15_4_mod = ieee802_15_4.ieee802_15_4_mod(*args, **kwargs)
+        self.connect(self.pkt_input, self.ieee802_15_4_mod, self)
 
-    def send_pkt(self, seqNr, addressInfo, payload='', eof=False):
+    def send_pkt(self, seqNr, addressInfo, payload='', eof=False, block=True, timeout=None):
         """
         Send the payload.
 
@@ -177,21 +186,115 @@ class ieee802_15_4_mod_pkts(gr.hier_block2):
         @type addressInfo: string
         @param payload: data to send
         @type payload: string
+        @param block: wait while msgq_limit packets are queued
+        @type block: bool
+        @param timeout: longest time to wait in seconds (None -> forever)
+        @type timeout: float
+        @returns: True if the packet was queued, False if the queue stayed full
         """
         
         if eof:
             msg = gr.message(1) # tell self.pkt_input we're not sending any more packets
         else:
-            FCF = make_FCF()
-            
-            pkt = make_ieee802_15_4_packet(FCF,
-                                           seqNr,
-                                           addressInfo,
-                                           payload,
-                                           self.pad_for_usrp)
-             #print "pkt =", packet_utils.string_to_hex_list(pkt), len(pkt)
-            msg = gr.message_from_string(pkt)
-        self.pkt_input.msgq().insert_tail(msg)
+            msg = gr.message_from_string(self._message_data(seqNr, addressInfo, payload))
+        return self._sender.insert_tail(msg, block, timeout)
+
+    def send_pkts(self, pkts, block=True, timeout=None):
+        """
+        Send many packets in one message, so they take a single slot of
+        the message queue and go out back to back.
+
+        @param pkts: (seqNr, addressInfo, payload) tuples
+        @type pkts: iterable
+        @param block: wait while msgq_limit messages are queued
+        @type block: bool
+        @param timeout: longest time to wait in seconds (None -> forever)
+        @type timeout: float
+        @returns: number of packets queued, 0 if the queue stayed full
+        """
+        data = [self._message_data(seqNr, addressInfo, payload)
+                for (seqNr, addressInfo, payload) in pkts]
+        if not data:
+            return 0
+        msg = gr.message_from_string(''.join(data))
+        if self._sender.insert_tail(msg, block, timeout):
+            return len(data)
+        return 0
+
+    def _make_pkt(self, seqNr, addressInfo, payload):
+        FCF = make_FCF()
+        return make_ieee802_15_4_packet(FCF,
+                                        seqNr,
+                                        addressInfo,
+                                        payload,
+                                        self.pad_for_usrp)
+
+    def _message_data(self, seqNr, addressInfo, payload):
+        # what goes into the message for pkt_input
+        return self._make_pkt(seqNr, addressInfo, payload)
+
+    def send_pkt_async(self, *args, **kwargs):
+        """
+        Like send_pkt, but returns a future instead of blocking while
+        the message queue is full. See pkt_async.send_pkt_async.
+        """
+        return pkt_async.send_pkt_async(self, *args, **kwargs)
+
+
+class ieee802_15_4_cached_mod_pkts(ieee802_15_4_mod_pkts):
+    """
+    IEEE 802.15.4 modulator that is a GNU Radio source and keeps the
+    baseband samples of the frames it sent.
+
+    The message queue carries baseband samples instead of frames, so
+    sending a frame that is still in the cache does not run the
+    modulator at all. Frames which are not cached are modulated with
+    oqpsk_modulator_bc.modulate, from the tables of the block and
+    without a flow graph.
+
+    Every frame is modulated on its own: the first half chip of Q is
+    zero and the frame ends with the second half of the last Q chip,
+    so it is spb samples longer than on the live path where this half
+    chip overlaps the next frame.
+    """
+    def __init__(self, msgq_limit=2, pad_for_usrp=True, spb=2,
+                 cache_bytes=waveform_cache.DEFAULT_MAX_BYTES):
+        """
+        @param msgq_limit: maximum number of messages in message queue
+        @type msgq_limit: int
+        @param pad_for_usrp: If true, packets are padded such that they end up a multiple of 128 samples
+        @param spb: samples per baud >= 1
+        @type spb: integer
+        @param cache_bytes: memory bound of the cached samples
+        @type cache_bytes: int
+        """
+        # not ieee802_15_4_mod_pkts.__init__, there is no modulator here
+	gr.hier_block2.__init__(self, "ieee802_15_4_cached_mod_pkts",
+				gr.io_signature(0, 0, 0),                     # Input
+				gr.io_signature(1, 1, gr.sizeof_gr_complex))  # Output
+        self.pad_for_usrp = pad_for_usrp
+        self.spb = spb
+        self.cache = waveform_cache.waveform_cache(cache_bytes)
+        self.modulator = ucla.oqpsk_modulator_bc(spb)
+
+        # accepts baseband samples from the outside world
+        self.pkt_input = gr.message_source(gr.sizeof_gr_complex, pkt_queue.SOURCE_LIMIT)
+        self._sender = pkt_queue.msgq_sender(self.pkt_input.msgq(), msgq_limit)
+        self.connect(self.pkt_input, self)
+
+    def _message_data(self, seqNr, addressInfo, payload):
+        return self.cache.lookup(self._make_pkt(seqNr, addressInfo, payload),
+                                 self.modulate)
+
+    def modulate(self, pkt):
+        """
+        Modulate a frame outside of the cache.
+
+        @param pkt: frame as built by make_ieee802_15_4_packet
+        @type pkt: string
+        @returns: baseband samples as a string of gr_complex
+        """
+        return self.modulator.modulate(pkt)
 
 
 class ieee802_15_4_demod_pkts(gr.hier_block2):
@@ -213,14 +316,29 @@ class ieee802_15_4_demod_pkts(gr.hier_block2):
         @type callback: ok: bool; payload: string
         @param threshold: detect access_code with up to threshold bits wrong (-1 -> use default)
         @type threshold: int
+        @param drop_bad_frames: if true, packets with a bad FCS are dropped by the packet sink
+        @type drop_bad_frames: bool
+        @param soft_decision: if true, chips are correlated without slicing them first
+        @type soft_decision: bool
+        @param ring_buffer: if true, payload is a memoryview into a frame_ring instead of
+                            a string. It is only valid until the ring wraps, see frame_ring.
+        @type ring_buffer: bool
+        @param batch: if true, callback gets one arg, a list of (ok, payload)
+        @type batch: bool
+        @param max_batch: most frames per list in batch mode
+        @type max_batch: int
 
         See ieee802_15_4_demod for remaining parameters.
 	"""
-	try:
-		self.callback = kwargs.pop('callback')
-		self.threshold = kwargs.pop('threshold')
-	except KeyError:
-		pass
+	self.callback = kwargs.pop('callback', None)
+	self.threshold = kwargs.pop('threshold', -1)
+	self.drop_bad_frames = kwargs.pop('drop_bad_frames', False)
+	self.soft_decision = kwargs.pop('soft_decision', False)
+	self.ring_buffer = kwargs.pop('ring_buffer', False)
+	watcher_args = {}
+	for key in ('batch', 'max_batch'):
+		if kwargs.has_key(key):
+			watcher_args[key] = kwargs.pop(key)
 
 	gr.hier_block2.__init__(self, "ieee802_15_4_demod_pkts",
 				gr.io_signature(1, 1, gr.sizeof_gr_complex),  # Input
@@ -228,11 +346,19 @@ class ieee802_15_4_demod_pkts(gr.hier_block2):
 
         self._rcvd_pktq = gr.msg_queue()          # holds packets from the PHY
         self.ieee802_15_4_demod = ieee802_15_4.ieee802_15_4_demod(self, *args, **kwargs)
-        self._packet_sink = ucla.ieee802_15_4_packet_sink(self._rcvd_pktq, self.threshold)
+        self._packet_sink = ucla.ieee802_15_4_packet_sink(self._rcvd_pktq, self.threshold,
+                                                          self.drop_bad_frames,
+                                                          self.soft_decision)
 
         self.connect(self,self.ieee802_15_4_demod, self._packet_sink)
       
-        self._watcher = _queue_watcher_thread(self._rcvd_pktq, self.callback)
+        if self.ring_buffer:
+            # a whole batch has to fit into the ring
+            self._ring = frame_ring(max(64, 2 * watcher_args.get('max_batch', 64)))
+        else:
+            self._ring = None
+        self._watcher = _queue_watcher_thread(self._rcvd_pktq, self.callback, self._ring,
+                                              **watcher_args)
 
     def carrier_sensed(self):
         """
@@ -240,33 +366,164 @@ class ieee802_15_4_demod_pkts(gr.hier_block2):
         """
         return self._packet_sink.carrier_sensed()
 
+    def frames(self, loop=None):
+        """
+        Deliver the packets to an event loop instead of the callback.
+
+        @returns: pkt_async.frame_stream of (ok, payload)
+        """
+        stream = pkt_async.frame_stream(loop)
+        self._watcher.set_callback(stream.put_batch, batch=True)
+        return stream
+
+
+def channel_frequency(channel):
+    """
+    Center frequency of an IEEE 802.15.4 channel in the 2.4 GHz band.
+
+    @param channel: channel number in [11, 26]
+    @type channel: int
+    @returns: frequency in Hz
+    """
+    if channel < 11 or channel > 26:
+        raise ValueError, "channel must be in [11, 26]"
+    return 2405e6 + 5e6 * (channel - 11)
+
+def center_frequency(channels):
+    """
+    Center frequency for ieee802_15_4_multichannel_demod_pkts which puts
+    all channels on the filterbank grid, the frequency of the channel
+    in the middle of them.
+
+    @param channels: 802.15.4 channel numbers
+    @type channels: list of int
+    @returns: frequency in Hz
+    """
+    return channel_frequency((min(channels) + max(channels)) // 2)
+
+
+class ieee802_15_4_multichannel_demod_pkts(gr.hier_block2):
+    """
+    802_15_4 demodulator for several channels at once that is a GNU Radio sink.
 
-class _queue_watcher_thread(_threading.Thread):
-    def __init__(self, rcvd_pktq, callback):
-        _threading.Thread.__init__(self)
-        self.setDaemon(1)
-        self.rcvd_pktq = rcvd_pktq
+    The input is a wideband complex baseband stream. A polyphase analysis
+    filterbank splits it into bins 5 MHz apart, the 802.15.4 channel
+    spacing, and each requested channel is fed into its own
+    ieee802_15_4_demod_pkts. Packets are passed to the app via the callback
+    together with the channel number they were received on.
+    """
+
+    CHANNEL_SPACING = 5e6
+
+    def __init__(self, sample_rate, center_freq, channels, callback=None,
+                 symbol_rate=2000000, threshold=-1, drop_bad_frames=False,
+                 soft_decision=False):
+        """
+	Hierarchical block for multichannel O-QPSK demodulation.
+
+        @param sample_rate: sample rate of the input, a multiple of 5 MHz
+        @type sample_rate: float
+        @param center_freq: frequency the input is centered at, on the
+                            5 MHz grid of the channels, see center_frequency
+        @type center_freq: float
+        @param channels: 802.15.4 channel numbers to demodulate
+        @type channels: list of int
+        @param callback:  function of three args: channel, ok, payload
+        @type callback: channel: int; ok: bool; payload: string
+        @param symbol_rate: chips per second of one channel
+        @type symbol_rate: float
+
+        See ieee802_15_4_demod_pkts for the remaining parameters.
+        """
+	gr.hier_block2.__init__(self, "ieee802_15_4_multichannel_demod_pkts",
+				gr.io_signature(1, 1, gr.sizeof_gr_complex),  # Input
+				gr.io_signature(0, 0, 0))  # Output
+
+        mpoints = int(round(sample_rate / self.CHANNEL_SPACING))
+        if mpoints < 1 or abs(mpoints * self.CHANNEL_SPACING - sample_rate) > 1:
+            raise ValueError, "sample_rate must be a multiple of %d" % (self.CHANNEL_SPACING,)
+        if len(set(channels)) != len(channels):
+            raise ValueError, "channels must be unique"
+
+        # filterbank output i is centered at center_freq + i * 5 MHz,
+        # outputs above mpoints/2 are the negative frequencies
+        bins = {}
+        for channel in channels:
+            offset = (channel_frequency(channel) - center_freq) / self.CHANNEL_SPACING
+            b = int(round(offset))
+            if abs(offset - b) > 1e-6 or 2 * abs(b) >= mpoints:
+                raise ValueError, "channel %d is not on the filterbank grid" % (channel,)
+            bins[b % mpoints] = channel
+
+        self.sample_rate = sample_rate
+        self.center_freq = center_freq
+        self.channels = list(channels)
         self.callback = callback
-        self.keep_running = True
-        self.start()
-
-    def run(self):
-        while self.keep_running:
-            print "802_15_4_pkt: waiting for packet"
-            msg = self.rcvd_pktq.delete_head()
-            ok = 0
-            payload = msg.to_string()
-            
-            print "received packet "
-	    crc = crc16.CRC16()
-	    crc.update(payload[:-2])
-
-	    crc_check = crc.intchecksum()
-	    print "checksum: %s, received: %s"%(crc_check, str(ord(payload[-2]) + ord(payload[-1])*256))
-	    if len(payload) > 2:
-                ok = (crc_check == ord(payload[-2]) + ord(payload[-1])*256)
-            msg_payload = payload
-            
+        self.sps = sample_rate / mpoints / symbol_rate
+
+        # pass the 2 MHz wide main lobe, stop before the next bin aliases
+        taps = gr.firdes.low_pass(1.0, sample_rate, 1.5e6, 1e6, gr.firdes.WIN_HANN)
+        self.filterbank = blks2.analysis_filterbank(mpoints, taps)
+        self.connect(self, self.filterbank)
+
+        self.stats = {}
+        self.receivers = {}
+        for i in range(mpoints):
+            if not bins.has_key(i):
+                self.connect((self.filterbank, i), gr.null_sink(gr.sizeof_gr_complex))
+                continue
+            channel = bins[i]
+            self.stats[channel] = channel_stats()
+            self.receivers[channel] = ieee802_15_4_demod_pkts(callback=self._make_callback(channel),
+                                                              sps=self.sps,
+                                                              symbol_rate=symbol_rate,
+                                                              threshold=threshold,
+                                                              drop_bad_frames=drop_bad_frames,
+                                                              soft_decision=soft_decision)
+            self.connect((self.filterbank, i), self.receivers[channel])
+
+    def _make_callback(self, channel):
+        # every channel has its own watcher thread, so its stats are only
+        # touched from there
+        def rx_callback(ok, payload):
+            st = self.stats[channel]
+            st.npkts += 1
+            if ok:
+                st.nright += 1
             if self.callback:
-                self.callback(ok, msg_payload)
+                self.callback(channel, ok, payload)
+        return rx_callback
+
+    def reset_stats(self):
+        """
+        Restart the packet counts and the frame rate measurement.
+        """
+        for st in self.stats.values():
+            st.reset()
+
+    def throughput(self):
+        """
+        Return a list of (channel, npkts, nright, frames per second).
+        """
+        return [(c, self.stats[c].npkts, self.stats[c].nright,
+                 self.stats[c].frames_per_second()) for c in self.channels]
+
+    def carrier_sensed(self, channel):
+        """
+        Return True if we detect carrier on channel.
+        """
+        return self.receivers[channel].carrier_sensed()
+
+
+class _queue_watcher_thread(pkt_watcher.queue_watcher_thread):
+    def __init__(self, rcvd_pktq, callback, ring=None, **kwargs):
+        self.ring = ring
+        pkt_watcher.queue_watcher_thread.__init__(self, rcvd_pktq, callback,
+                                                  logger=_logger, **kwargs)
 
+    def decode(self, msg):
+        # the packet sink checked the FCS, the result is in arg1
+        ok = msg.arg1() != 0
+        if self.ring is not None:
+            return (ok, self.ring.put_message(msg))
+        return (ok, msg.to_string())
@@ -0,0 +1,160 @@
+#
+# Copyright 2005 Free Software Foundation, Inc.
+# 
+# This file is part of GNU Radio
+# 
+# GNU Radio is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2, or (at your option)
+# any later version.
+# 
+# GNU Radio is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with GNU Radio; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+# Boston, MA 02111-1307, USA.
+# 
+
+#
+# Event loop interface of the packet blocks.
+#
+# frame_stream is an asynchronous iterator of received frames. The
+# watcher thread of a demod_pkts block runs in batched mode and hands
+# every batch to the event loop with one call_soon_threadsafe, so a
+# burst of frames costs a single thread switch.
+#
+#   stream = rx.frames()
+#   async for (ok, payload) in stream:    # python 3
+#       ...
+#   frame = yield From(stream.get())      # trollius
+#
+# send_pkt_async runs the blocking send_pkt of a mod_pkts block in the
+# default executor. send_pkt blocks while the message queue holds
+# msgq_limit packets, so awaiting the result honours the backpressure
+# without blocking the loop.
+#
+
+import collections
+import functools
+
+try:
+    import asyncio
+except ImportError:
+    try:
+        import trollius as asyncio
+    except ImportError:
+        asyncio = None
+
+try:
+    StopAsyncIteration = StopAsyncIteration
+except NameError:
+    class StopAsyncIteration(Exception):
+        pass
+
+
+def _check_asyncio():
+    if asyncio is None:
+        raise ImportError("pkt_async needs asyncio (or trollius on python 2)")
+
+
+def _new_future(loop):
+    if hasattr(loop, 'create_future'):
+        return loop.create_future()
+    return asyncio.Future(loop=loop)
+
+
+class frame_stream(object):
+    """
+    Asynchronous iterator of the frames of a demod_pkts block.
+
+    Frames are the tuples the callback of the block would get, e.g.
+    (ok, payload) for ieee802_15_4_demod_pkts. They are queued in the
+    stream until get() or the iteration asks for them, so a slow
+    consumer does not block the watcher thread.
+    """
+    def __init__(self, loop=None):
+        _check_asyncio()
+        self.loop = loop or asyncio.get_event_loop()
+        self._frames = collections.deque()
+        self._waiter = None
+        self._closed = False
+
+    # -- called from the watcher thread
+
+    def put_batch(self, frames):
+        """
+        Queue a list of frames, safe to call from any thread.
+        """
+        self.loop.call_soon_threadsafe(self._deliver, frames)
+
+    def close(self):
+        """
+        End the iteration after the queued frames, safe to call from any thread.
+        """
+        self.loop.call_soon_threadsafe(self._close)
+
+    # -- called in the event loop
+
+    def _deliver(self, frames):
+        self._frames.extend(frames)
+        self._wakeup()
+
+    def _close(self):
+        self._closed = True
+        self._wakeup()
+
+    def _wakeup(self):
+        waiter = self._waiter
+        if waiter is None:
+            return
+        self._waiter = None
+        if waiter.done():               # cancelled
+            return
+        if self._frames:
+            waiter.set_result(self._frames.popleft())
+        elif self._closed:
+            waiter.set_exception(StopAsyncIteration())
+        else:
+            self._waiter = waiter
+
+    def __len__(self):
+        return len(self._frames)
+
+    def get(self):
+        """
+        Return a future of the next frame. It raises StopAsyncIteration
+        once the stream is closed and empty.
+        """
+        if self._waiter is not None and not self._waiter.done():
+            raise RuntimeError("only one get() may wait at a time")
+        f = _new_future(self.loop)
+        if self._frames:
+            f.set_result(self._frames.popleft())
+        elif self._closed:
+            f.set_exception(StopAsyncIteration())
+        else:
+            self._waiter = f
+        return f
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        return self.get()
+
+
+def send_pkt_async(mod_pkts, *args, **kwargs):
+    """
+    Call mod_pkts.send_pkt(*args, **kwargs) in the default executor.
+
+    The keyword loop selects the event loop, default is the current one.
+
+    @returns: future which is done once the packet is queued
+    """
+    _check_asyncio()
+    loop = kwargs.pop('loop', None) or asyncio.get_event_loop()
+    return loop.run_in_executor(None, functools.partial(mod_pkts.send_pkt, *args, **kwargs))
@@ -0,0 +1,127 @@
+#
+# Copyright 2005 Free Software Foundation, Inc.
+# 
+# This file is part of GNU Radio
+# 
+# GNU Radio is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2, or (at your option)
+# any later version.
+# 
+# GNU Radio is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with GNU Radio; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+# Boston, MA 02111-1307, USA.
+# 
+
+#
+# Sending side of the packet blocks: put a message into the queue of a
+# gr.message_source with a choice of blocking, non-blocking or timeout.
+#
+# gr.msg_queue can only wait forever for room, and there is no way to
+# learn when the message source takes a message out. So the senders of
+# a block share a msgq_sender which counts the free slots itself under
+# a condition variable, and one feeder thread moves the messages on
+# into the message source, waiting in msg_queue.insert_tail. Any number
+# of threads may send through the same msgq_sender.
+#
+
+import collections
+import time
+import gnuradio.gr.gr_threading as _threading
+
+# limit of the queue of the message source itself, the messages wait
+# in the msgq_sender
+SOURCE_LIMIT = 1
+
+
+class msgq_sender(object):
+    """
+    Bounded queue in front of the msgq of a gr.message_source.
+
+    At most limit messages wait here, plus SOURCE_LIMIT in the message
+    source if it was created with that limit.
+    """
+    def __init__(self, msgq, limit=2):
+        """
+        @param msgq: queue of a message_source
+        @type msgq: gr.msg_queue
+        @param limit: number of messages which may wait
+        @type limit: int
+        """
+        if limit < 1:
+            raise ValueError, "limit must be >= 1"
+        self.msgq = msgq
+        self.limit = limit
+        self._pending = collections.deque()     # the first one is being fed
+        self._cond = _threading.Condition()
+        self._feeder = None
+
+    def insert_tail(self, msg, block=True, timeout=None):
+        """
+        Append msg.
+
+        With block=False the message is only queued if there is room
+        right now, this never waits. With block=True we wait for room,
+        at most timeout seconds unless timeout is None.
+
+        @param msg: message to queue
+        @type msg: gr.message
+        @param block: wait for room in the queue
+        @type block: bool
+        @param timeout: longest time to wait in seconds (None -> forever)
+        @type timeout: float
+        @returns: True if msg was queued, False if the queue stayed full
+        """
+        self._cond.acquire()
+        try:
+            if len(self._pending) >= self.limit:
+                if not block:
+                    return False
+                if timeout is None:
+                    while len(self._pending) >= self.limit:
+                        self._cond.wait()
+                else:
+                    deadline = time.time() + timeout
+                    while len(self._pending) >= self.limit:
+                        left = deadline - time.time()
+                        if left <= 0:
+                            return False
+                        self._cond.wait(left)
+            self._pending.append(msg)
+            if self._feeder is None:
+                self._feeder = _threading.Thread(target=self._feed)
+                self._feeder.setDaemon(1)
+                self._feeder.start()
+            self._cond.notifyAll()
+            return True
+        finally:
+            self._cond.release()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def _feed(self):
+        while True:
+            self._cond.acquire()
+            try:
+                while not self._pending:
+                    self._cond.wait()
+                msg = self._pending[0]
+            finally:
+                self._cond.release()
+
+            # waits for room in the message source without the GIL
+            self.msgq.insert_tail(msg)
+
+            self._cond.acquire()
+            try:
+                self._pending.popleft()
+                self._cond.notifyAll()
+            finally:
+                self._cond.release()
@@ -0,0 +1,104 @@
+#
+# Copyright 2005 Free Software Foundation, Inc.
+# 
+# This file is part of GNU Radio
+# 
+# GNU Radio is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2, or (at your option)
+# any later version.
+# 
+# GNU Radio is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with GNU Radio; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+# Boston, MA 02111-1307, USA.
+# 
+
+#
+# Thread which passes packets from the queue of a packet sink to the
+# callback of the app. The demod_pkts blocks subclass it and implement
+# decode(msg), which turns one message into the callback arguments.
+#
+
+import logging
+import gnuradio.gr.gr_threading as _threading
+
+
+class queue_watcher_thread(_threading.Thread):
+    """
+    Watch rcvd_pktq and pass the decoded messages to callback.
+
+    By default callback(*decode(msg)) is called for every message. In
+    batched mode callback(frames) is called with a list of decode(msg)
+    tuples instead: after a message arrived the frames which are already
+    queued are taken along, up to max_batch of them, so a burst of
+    frames costs one wakeup and one callback. The thread never waits for
+    more frames, a list is delivered as soon as the queue is empty.
+    """
+    def __init__(self, rcvd_pktq, callback, batch=False, max_batch=64, logger=None):
+        """
+        @param rcvd_pktq: queue of the packet sink
+        @type rcvd_pktq: gr.msg_queue
+        @param callback: function called with the decoded frames
+        @param batch: if true, deliver lists of frames
+        @type batch: bool
+        @param max_batch: most frames per list
+        @type max_batch: int
+        @param logger: where to log, default is the ucla_blks logger
+        @type logger: logging.Logger
+        """
+        _threading.Thread.__init__(self)
+        self.setDaemon(1)
+        self.rcvd_pktq = rcvd_pktq
+        self.set_callback(callback, batch)
+        self.max_batch = max(1, max_batch)
+        self.logger = logger or logging.getLogger('ucla_blks')
+        self.keep_running = True
+        self.start()
+
+    def set_callback(self, callback, batch=False):
+        """
+        Replace the callback and the delivery mode, also while running.
+        """
+        # a single assignment, so the thread never pairs a callback
+        # with the wrong mode
+        self._delivery = (callback, batch)
+
+    def decode(self, msg):
+        """
+        Return the tuple of callback arguments for one message.
+        """
+        raise NotImplementedError
+
+    def run(self):
+        while self.keep_running:
+            self.logger.debug("waiting for packet")
+            frames = [self.decode(self.rcvd_pktq.delete_head())]
+
+            callback, batch = self._delivery
+            if batch:
+                self.drain(frames)
+            self.logger.debug("received %d packets", len(frames))
+
+            if not callback:
+                continue
+            if batch:
+                callback(frames)
+            else:
+                callback(*frames[0])
+
+    def drain(self, frames):
+        """
+        Append the decoded messages which are already queued to frames,
+        until there are max_batch of them.
+        """
+        while len(frames) < self.max_batch:
+            msg = self.rcvd_pktq.delete_head_nowait()
+            if not msg:
+                break
+            frames.append(self.decode(msg))
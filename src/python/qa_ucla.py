@@ -22,8 +22,25 @@
 
 from gnuradio import gr, gr_unittest
 import ucla
+import crc16
+import crc8
+import frame_check
+import frame_ring
+import waveform_cache
+import ieee802_15_4
+import ieee802_15_4_pkt
+import cc1k_sos_pkt
+import pkt_queue
+import pkt_watcher
+import pkt_async
+import capture_decoder
+import time
+import struct
+import random
+import tempfile
+import os
 
-class ucla (gr_unittest.TestCase):
+class qa_ucla (gr_unittest.TestCase):
 
     def setUp (self):
         self.fg = gr.flow_graph ()
@@ -31,7 +48,265 @@ class ucla (gr_unittest.TestCase):
     def tearDown (self):
         self.fg = None
 
-# currently we do nothing. might add a test here...
+    def test_001_crc16_table (self):
+        for data in ('', '\x00', '123456789', ''.join(map(chr, range(256)))):
+            self.assertEqual (crc16.crcbitbybit(data), crc16.crc16(data))
+
+    def test_002_crc16_update (self):
+        data = '123456789'
+        crc = crc16.CRC16()
+        crc.update(data[:4])
+        crc.update(data[4:])
+        self.assertEqual (0x2189, crc.intchecksum())
+
+    def test_003_crc16_check_frames (self):
+        good = '\x41\x88\x01' + '\x10\x20'
+        good += crc16.CRC16(good).checksum()[::-1]
+        bad = good[:-1] + chr(ord(good[-1]) ^ 1)
+        self.assertEqual ([True, False, False],
+                          crc16.check_frames([good, bad, '\x00\x00']))
+
+    def test_004_frame_check_fcs (self):
+        frames = []
+        for n in range(1, 40):
+            f = ''.join([chr((i * 7 + n) & 0xff) for i in range(n)])
+            frames.append(f + crc16.CRC16(f).checksum()[::-1])
+        frames[5] = frames[5][:-1] + '\xff'
+        frames.append('\x01')
+        buf, offsets, lengths = frame_check.pack_frames(frames)
+        self.assertEqual (crc16.check_frames(frames),
+                          list(frame_check.check_fcs(buf, offsets, lengths)))
+
+    def test_005_frame_ring (self):
+        ring = frame_ring.frame_ring(nslots=2, slot_size=8)
+        a = ring.put('abc')
+        b = ring.put('defgh')
+        self.assertEqual ('abc', a.tobytes())
+        self.assertEqual ('efg', b[1:4].tobytes())
+        ring.put('xy')                  # reuses the slot of a
+        self.assertEqual ('xy', a[:2].tobytes())
+        self.assertRaises (ValueError, ring.put, 'x' * 9)
+
+    def test_006_waveform_cache (self):
+        cache = waveform_cache.waveform_cache(max_bytes=10)
+        cache.put('a', 'x' * 4)
+        cache.put('b', 'y' * 4)
+        self.assertEqual ('x' * 4, cache.get('a'))
+        cache.put('c', 'z' * 4)         # drops b, a was used last
+        self.assertEqual (None, cache.get('b'))
+        self.assertEqual (8, cache.nbytes)
+        self.assertEqual ('zz', cache.lookup('d', lambda k: 'zz'))
+        self.assertEqual (3, len(cache))
+        cache.put('e', 'w' * 11)        # too large to cache
+        self.assertFalse ('e' in cache)
+
+    def test_007_frame_check_sos_crc (self):
+        frames = []
+        for n in range(0, 30):
+            header = ''.join([chr((i * 5 + n) & 0xff) for i in range(8)]) + chr(n)
+            payload = ''.join([chr((i * 3 + n) & 0xff) for i in range(n)])
+            crc = crc8.sos_crc(header[1:] + payload)
+            frames.append(header + payload + chr(crc & 0xff) + chr(crc >> 8))
+        frames[7] = frames[7][:-1] + chr(ord(frames[7][-1]) ^ 4)
+        frames.append('\x01\x02')
+        frames.append(frames[3][:8] + chr(50) + frames[3][9:])    # length beyond the frame
+        expected = [len(f) >= 11 and
+                    crc8.crc8().crc(f[1:9+ord(f[8])]) == ord(f[-2]) + ord(f[-1])*256
+                    for f in frames]
+        buf, offsets, lengths = frame_check.pack_frames(frames)
+        self.assertEqual (expected, list(frame_check.check_sos_crc(buf, offsets, lengths)))
+        self.assertFalse (expected[7])
+        crc = crc8.crc8('1234')
+        crc.update('56789')
+        self.assertEqual (crc8.crc8().crc('123456789'), crc.intchecksum())
+
+    def test_008_multichannel_defaults (self):
+        # the defaults of examples/cc2420_multichannel_rx.py
+        channels = [15, 16, 17]
+        center = ieee802_15_4_pkt.center_frequency(channels)
+        self.assertEqual (2430e6, center)
+        rx = ieee802_15_4_pkt.ieee802_15_4_multichannel_demod_pkts(20e6, center, channels)
+        self.assertEqual (channels, sorted(rx.receivers.keys()))
+        self.assertRaises (ValueError, ieee802_15_4_pkt.ieee802_15_4_multichannel_demod_pkts,
+                           20e6, 2.4575e9, channels)
+
+    def test_009_cc1k_correlator_frame (self):
+        # one SOS frame, 8 samples per Manchester chip
+        payload = 'hello world'
+        pkt = cc1k_sos_pkt.make_sos_packet(1, 128, 129, 0xffff, 2, 32, payload, 8,
+                                           '\x33\xcc', False)
+        frame = pkt[22:-20]             # header to CRC
+        samples = []
+        for c in map(ord, pkt):
+            for k in range(8):
+                chips = (c >> (7 - k)) & 1 and (1.0, -1.0) or (-1.0, 1.0)
+                for chip in chips:
+                    samples.extend([chip] * 8)
+        src = gr.vector_source_f(samples)
+        corr = ucla.cc1k_correlator_cb(64, 0x33, 0xcc, 1)
+        dst = gr.vector_sink_f()
+        self.fg.connect(src, corr, dst)
+        self.fg.run()
+
+        chips = dst.data()
+        self.assertEqual (len(frame) * 16, len(chips))
+        decoded = ''.join([chr(sum([int(chips[i + j]) << (7 - j // 2) for j in range(0, 16, 2)]))
+                           for i in range(0, len(chips), 16)])
+        self.assertEqual (frame, decoded)
+        self.assertEqual (1, corr.nframes())
+        self.assertRaises (ValueError, ucla.cc1k_correlator_cb, 10, 0x33, 0xcc, 1)
+
+    def test_010_msgq_sender (self):
+        q = gr.msg_queue(1)
+        sender = pkt_queue.msgq_sender(q, 2)
+        self.assertTrue (sender.insert_tail(gr.message(0)))
+        deadline = time.time() + 5
+        while q.count() < 1 and time.time() < deadline:   # fed into q
+            time.sleep(0.001)
+        self.assertTrue (sender.insert_tail(gr.message(1), block=False))
+        self.assertTrue (sender.insert_tail(gr.message(2), block=False))
+        self.assertFalse (sender.insert_tail(gr.message(9), block=False))
+        start = time.time()
+        self.assertFalse (sender.insert_tail(gr.message(9), timeout=0.05))
+        self.assertTrue (time.time() - start >= 0.05)
+        self.assertEqual (0, q.delete_head().type())
+        self.assertTrue (sender.insert_tail(gr.message(3), timeout=5))
+        self.assertEqual ([1, 2, 3], [q.delete_head().type() for i in range(3)])
+        self.assertRaises (ValueError, pkt_queue.msgq_sender, q, 0)
+
+    def test_011_queue_watcher_batch (self):
+        class watcher(pkt_watcher.queue_watcher_thread):
+            def decode(self, msg):
+                return (msg.type(),)
+        q = gr.msg_queue()
+        for i in range(5):
+            q.insert_tail(gr.message(i))
+        batches = []
+        w = watcher(q, batches.append, batch=True, max_batch=2)
+        deadline = time.time() + 5
+        while sum(map(len, batches)) < 5 and time.time() < deadline:
+            time.sleep(0.001)
+        w.keep_running = False
+        self.assertEqual ([[(0,), (1,)], [(2,), (3,)], [(4,)]], batches)
+
+    def test_012_demod_pkts_without_callback (self):
+        rx = ieee802_15_4_pkt.ieee802_15_4_demod_pkts(sps=2, symbol_rate=2e6)
+        self.assertEqual (None, rx.callback)
+        self.assertEqual (-1, rx.threshold)
+        if pkt_async.asyncio is None:
+            self.assertRaises (ImportError, rx.frames)
+            return
+        loop = pkt_async.asyncio.new_event_loop()
+        try:
+            stream = rx.frames(loop)
+            self.assertEqual ((stream.put_batch, True), rx._watcher._delivery)
+        finally:
+            loop.close()
+
+    def test_013_capture_plan_chunks (self):
+        plan = capture_decoder.plan_chunks(2500, 1000, 300)
+        self.assertEqual ([(0, 1300), (1000, 1300), (2000, 500)], plan)
+        plan = capture_decoder.plan_chunks(2500, 1000, 300, skip=10)
+        self.assertEqual ([(10, 1300), (1010, 1300), (2010, 500)], plan)
+        # shorter than the overlap
+        self.assertEqual ([(0, 200)], capture_decoder.plan_chunks(200, 1000, 300))
+        self.assertEqual ([], capture_decoder.plan_chunks(0, 1000, 300))
+        # the chunks cover every sample and stop at the end
+        for (nsamples, chunk, overlap) in ((1000, 1000, 300), (1001, 1000, 300), (999, 100, 7)):
+            plan = capture_decoder.plan_chunks(nsamples, chunk, overlap, 5)
+            covered = set()
+            for (offset, nitems) in plan:
+                covered.update(range(offset, offset + nitems))
+            self.assertEqual (set(range(5, 5 + nsamples)), covered)
+
+    def test_014_capture_merge_frames (self):
+        # chunk 0 is [0, 1300), chunk 1 starts at 1000, 'b' straddles
+        # the boundary and is seen by both, a little off in chunk 1
+        chunk0 = [(100, True, 'a'), (1010, True, 'b'), (1200, False, 'c')]
+        chunk1 = [(1012, True, 'b'), (1200, False, 'c'), (1250, True, 'd'), (1900, True, 'a')]
+        merged = capture_decoder.merge_frames([chunk0, chunk1], 8)
+        self.assertEqual ([(100, True, 'a'), (1010, True, 'b'), (1200, False, 'c'),
+                           (1250, True, 'd'), (1900, True, 'a')], merged)
+        # further apart than the tolerance it is another frame
+        self.assertEqual (2, len(capture_decoder.merge_frames([[(0, True, 'x')], [(9, True, 'x')]], 8)))
+
+    def test_015_oqpsk_mod_spb1 (self):
+        # the Q branch of the unfused chain is delayed by delay_cc(spb),
+        # half a pulse, which has to give the waveform of the table
+        data = (0x00, 0xa7, 0x12, 0xff, 0x5c)
+        for spb in (1, 2):
+            result = []
+            for fused in (True, False):
+                tb = gr.top_block()
+                src = gr.vector_source_b(data)
+                dst = gr.vector_sink_c()
+                tb.connect(src, ieee802_15_4.ieee802_15_4_mod(spb, fused), dst)
+                tb.run()
+                result.append(dst.data())
+            self.assertEqual (len(data) * 64 * spb, len(result[0]))
+            self.assertComplexTuplesAlmostEqual (result[0], result[1], 5)
+        self.assertRaises (TypeError, ieee802_15_4.ieee802_15_4_mod, 0)
+
+    def test_016_cached_mod_waveform (self):
+        spb = 2
+        tx = ieee802_15_4_pkt.ieee802_15_4_cached_mod_pkts(spb=spb)
+        pkt = tx._make_pkt(3, '\x01\x00\x02\x00', 'hello')
+        data = tx._message_data(3, '\x01\x00\x02\x00', 'hello')
+        cached = [complex(*struct.unpack('ff', data[i:i+8])) for i in range(0, len(data), 8)]
+
+        # one more byte through the live modulator gives the tail of the
+        # last Q chip, plus the first I chip of that byte
+        tb = gr.top_block()
+        src = gr.vector_source_b(map(ord, pkt + '\x00'))
+        dst = gr.vector_sink_c()
+        tb.connect(src, ieee802_15_4.ieee802_15_4_mod(spb), dst)
+        tb.run()
+        n = len(pkt) * 64 * spb
+        live = dst.data()
+        expected = tuple(live[:n]) + tuple([complex(0, c.imag) for c in live[n:n+spb]])
+        self.assertEqual (n + spb, len(cached))
+        self.assertComplexTuplesAlmostEqual (expected, cached, 5)
+        self.assertTrue (pkt in tx.cache)
+
+    def test_017_capture_frame_in_overlap (self):
+        spb = 2
+        tx = ieee802_15_4_pkt.ieee802_15_4_cached_mod_pkts(spb=spb)
+        pkt = tx._make_pkt(7, '\x01\x00\x02\x00', 'overlap')
+        tb = gr.top_block()
+        src = gr.vector_source_b(map(ord, pkt))
+        dst = gr.vector_sink_c()
+        tb.connect(src, ieee802_15_4.ieee802_15_4_mod(spb), dst)
+        tb.run()
+        burst = dst.data()
+
+        # the frame lies in the overlap of the first two chunks and past
+        # the settling time of the second, both of them decode it
+        start = 52000
+        rng = random.Random(17)
+        noise = lambda: complex(rng.gauss(0, 0.01), rng.gauss(0, 0.01))
+        samples = [noise() for i in range(start)] + list(burst)
+        samples += [noise() for i in range(100000 - len(samples))]
+        fd, filename = tempfile.mkstemp()
+        try:
+            os.write(fd, ''.join([struct.pack('ff', c.real, c.imag) for c in samples]))
+            os.close(fd)
+            nsamples, frames = capture_decoder.decode_parallel('ieee802_15_4', filename, spb,
+                                                               jobs=1, chunk=40000)
+        finally:
+            os.unlink(filename)
+        self.assertEqual (100000, nsamples)
+        self.assertEqual (1, len(frames))
+        (offset, ok, payload) = frames[0]
+        self.assertTrue (ok)
+        self.assertTrue ('overlap' in payload)
+        self.assertTrue (start - 64 * spb <= offset < start + len(burst))
+
+    def test_018_frame_ring_message (self):
+        ring = frame_ring.frame_ring(nslots=2, slot_size=8)
+        a = ring.put_message(gr.message_from_string('hello', 0, 1, 0))
+        self.assertEqual ('hello', a.tobytes())
+        self.assertEqual ('ell', a[1:4].tobytes())
+        self.assertRaises (ValueError, ring.put_message, gr.message_from_string('x' * 9))
 
 if __name__ == '__main__':
     gr_unittest.main ()
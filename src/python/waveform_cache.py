@@ -0,0 +1,96 @@
+#
+# Copyright 2005 Free Software Foundation, Inc.
+# 
+# This file is part of GNU Radio
+# 
+# GNU Radio is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2, or (at your option)
+# any later version.
+# 
+# GNU Radio is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with GNU Radio; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+# Boston, MA 02111-1307, USA.
+# 
+
+#
+# Least recently used cache of modulated frames. Beacons and test
+# transmitters send the same frame again and again, with the cache the
+# modulator only runs the first time and later sends just copy the
+# baseband samples into a message.
+#
+
+from collections import OrderedDict
+
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+
+
+class waveform_cache(object):
+    """
+    Maps frames (strings) to their baseband samples (strings). The
+    least recently used waveforms are dropped once the cached samples
+    take more than max_bytes.
+    """
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        if max_bytes < 0:
+            raise ValueError, "max_bytes must be >= 0"
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._waveforms = OrderedDict()
+
+    def __len__(self):
+        return len(self._waveforms)
+
+    def __contains__(self, key):
+        return key in self._waveforms
+
+    def get(self, key):
+        """
+        @returns: the waveform of key, None if it is not cached
+        """
+        waveform = self._waveforms.pop(key, None)
+        if waveform is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._waveforms[key] = waveform     # most recently used again
+        return waveform
+
+    def put(self, key, waveform):
+        """
+        Cache waveform for key. A waveform larger than max_bytes is not
+        cached at all.
+        """
+        old = self._waveforms.pop(key, None)
+        if old is not None:
+            self.nbytes -= len(old)
+        if len(waveform) > self.max_bytes:
+            return
+        self._waveforms[key] = waveform
+        self.nbytes += len(waveform)
+        while self.nbytes > self.max_bytes:
+            k, w = self._waveforms.popitem(last=False)
+            self.nbytes -= len(w)
+
+    def lookup(self, key, modulate):
+        """
+        Return the waveform of key, on a miss it is made with
+        modulate(key) and cached.
+        """
+        waveform = self.get(key)
+        if waveform is None:
+            waveform = modulate(key)
+            self.put(key, waveform)
+        return waveform
+
+    def clear(self):
+        self._waveforms.clear()
+        self.nbytes = 0